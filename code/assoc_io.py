@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Shared reader for PLINK --linear output (*.assoc.linear).
+
+PLINK writes space-aligned text; we parse it once with the pandas C engine
+into typed columns and keep a sidecar <assoc>.cache.npz next to the file.
+The sidecar records the source mtime/size and is rebuilt when either
+changes, so re-reading a genome-wide assoc is a plain binary load.
+
+Set ASSOC_IO_CACHE=0 to disable the sidecar (e.g. read-only result dirs).
+
+file_sha1/file_stat/sidecar_state are the content check shared by the other
+derived files kept next to their inputs (gene_annot's store, gtf_consequence's
+<gtf>.tx.npz, manhattan_genomewide's .manh.npz): size/mtime as a fast path,
+the SHA-1 recorded at build time when those changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas is imported lazily, as in bim_index: gene_annot opens its store
+# through sidecar_state and only needs numpy.
+
+CACHE_SUFFIX = ".cache.npz"
+CACHE_VERSION = 2
+
+# columns we keep from PLINK --linear, with their in-memory dtypes.
+# floats stay float64 so printed and derived values are exactly PLINK's;
+# float32 P would also underflow below ~1e-45 (the 5q15 cis-eQTLs go lower).
+COL_DTYPES: Dict[str, str] = {
+    "CHR": "int8",
+    "SNP": "category",
+    "BP": "int32",
+    "A1": "category",
+    "NMISS": "int32",
+    "BETA": "float64",
+    "STAT": "float64",
+    "P": "float64",
+}
+ASSOC_COLS: List[str] = list(COL_DTYPES)
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("ASSOC_IO_CACHE", "1").strip().lower() not in ("0", "no", "false", "off")
+
+
+def cache_path(path: str) -> str:
+    return path + CACHE_SUFFIX
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 22), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_stat(path: str) -> Dict[str, object]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def sidecar_state(meta: Dict[str, object], path: str) -> Tuple[str, Optional[str]]:
+    """(state, sha1) of a derived file whose meta recorded path's stat and SHA-1.
+
+    "fresh": size/mtime match (sha1 is None, nothing hashed); "touched": they
+    differ but the content SHA-1 still matches, so the caller only refreshes
+    the stat in its meta; "stale": rebuild, reusing the returned sha1.
+    """
+    if all(meta.get(k) == v for k, v in file_stat(path).items()):
+        return "fresh", None
+    sha1 = file_sha1(path)
+    return ("touched" if meta.get("sha1") == sha1 else "stale"), sha1
+
+
+def _source_key(path: str, test: Optional[str]) -> Dict[str, object]:
+    return dict(file_stat(path), version=CACHE_VERSION, test=test or "")
+
+
+def _parse(path: str, test: Optional[str], columns: Sequence[str]) -> "pd.DataFrame":
+    import pandas as pd
+
+    header = pd.read_csv(path, sep=r"\s+", nrows=0).columns
+    present = [c for c in columns if c in header]
+    use_test = bool(test) and "TEST" in header
+
+    usecols = present + (["TEST"] if use_test else [])
+    dtype = {c: COL_DTYPES[c] for c in present}
+    if use_test:
+        dtype["TEST"] = "category"
+
+    df = pd.read_csv(path, sep=r"\s+", usecols=usecols, dtype=dtype, engine="c")
+    if use_test:
+        keep = (df["TEST"] == test).to_numpy()
+        df = df.loc[keep, present]
+        if not keep.all():
+            for c in present:
+                if isinstance(df[c].dtype, pd.CategoricalDtype):
+                    df[c] = df[c].cat.remove_unused_categories()
+    return df[present].reset_index(drop=True)
+
+
+def _write_cache(path: str, df: "pd.DataFrame", key: Dict[str, object]) -> None:
+    import pandas as pd
+
+    arrays: Dict[str, np.ndarray] = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            arrays[f"{c}.codes"] = s.cat.codes.to_numpy(dtype=np.int32)
+            arrays[f"{c}.categories"] = np.asarray(s.cat.categories, dtype=str)
+        else:
+            arrays[c] = s.to_numpy()
+    meta = dict(key, columns=list(df.columns), nrows=int(len(df)))
+    arrays["__meta__"] = np.array(json.dumps(meta))
+
+    out = cache_path(path)
+    tmp = f"{out}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, out)
+    except OSError:
+        # cache is best-effort (read-only dirs, full disks)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _load_cache(path: str, key: Dict[str, object], columns: Sequence[str]) -> Optional["pd.DataFrame"]:
+    import pandas as pd
+
+    try:
+        z = np.load(cache_path(path), allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    with z:
+        try:
+            meta = json.loads(str(z["__meta__"]))
+        except (KeyError, ValueError):
+            return None
+        if any(meta.get(k) != v for k, v in key.items()):
+            return None
+        cached = set(meta.get("columns", []))
+        data = {}
+        for c in columns:
+            if c not in cached:
+                continue
+            if COL_DTYPES.get(c) == "category":
+                data[c] = pd.Categorical.from_codes(z[f"{c}.codes"], z[f"{c}.categories"])
+            else:
+                data[c] = z[c]
+    return pd.DataFrame(data, columns=[c for c in columns if c in cached])
+
+
+def read_assoc_linear(path: str, test: Optional[str] = "ADD",
+                      columns: Optional[Sequence[str]] = None,
+                      cache: Optional[bool] = None) -> "pd.DataFrame":
+    """Read a PLINK .assoc.linear into typed columns (rows with TEST==test only).
+
+    Only the requested `columns` (default: all of ASSOC_COLS) are returned;
+    columns missing from the file are simply absent, so callers validate.
+    """
+    columns = list(columns) if columns is not None else list(ASSOC_COLS)
+    unknown = [c for c in columns if c not in COL_DTYPES]
+    if unknown:
+        raise ValueError(f"unsupported assoc columns {unknown}; known: {ASSOC_COLS}")
+
+    if cache is None:
+        cache = cache_enabled()
+    if not cache:
+        return _parse(path, test, columns)
+
+    key = _source_key(path, test)
+    df = _load_cache(path, key, columns)
+    if df is not None:
+        return df
+
+    # parse every known column once so the sidecar serves any later subset
+    full = _parse(path, test, ASSOC_COLS)
+    _write_cache(path, full, key)
+    return full[[c for c in columns if c in full.columns]]
+
+
+def read_at_snps(path: str, snps: Sequence[str], test: Optional[str] = "ADD",
+                 columns: Sequence[str] = ("SNP", "BP", "BETA", "STAT", "P")) -> "pd.DataFrame":
+    """Rows for `snps` only, indexed by SNP in the given order (NaN where absent).
+
+    Repeated SNPs in `snps` are kept once, so `.at[snp, col]` is always a scalar.
+
+    The first row per SNP wins, like a boolean scan + iloc[0]. The table is
+    filtered once with isin, so per-SNP lookups never rescan the window.
+    """
+    import pandas as pd
+
+    columns = list(columns)
+    if "SNP" not in columns:
+        columns = ["SNP"] + columns
+    df = read_assoc_linear(path, test=test, columns=columns)
+    if "SNP" not in df.columns:
+        raise ValueError(f"Unexpected assoc file format (no SNP column): {path}")
+    want = pd.Index(list(dict.fromkeys(map(str, snps))), name="SNP")
+    hit = df[df["SNP"].isin(want)]
+    hit = hit.assign(SNP=hit["SNP"].astype(str)).drop_duplicates("SNP").set_index("SNP")
+    return hit.reindex(want)
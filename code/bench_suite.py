@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Benchmark the pipeline's Python modules on synthetic data at several scales.
+
+For each --scales value S, synth_data.py writes inputs into <work>/x<S>/data
+(kept and reused while its meta.json matches), then every case below runs as
+its own process, the way the step scripts call it, and is timed with
+perf_ledger.measure (wall, CPU, peak RSS of the process tree):
+
+  finemap_pip                      5 loci, one prior            (window rows)
+  finemap_pip_sens                 5 loci x 5 priors, summary   (window rows)
+  collect_sig_genes_trans          trans/cis candidate files    (transcis rows)
+  collect_sig_genes_transcis_v2
+  summarize_cross_conditional      3 outcomes x 7 runs          (cross rows)
+  summarize_cross_conditional_v2
+  rank_candidates_from_vep37_v2    5 loci: LD + VEP + PIP       (LD rows)
+  locuszoom_manhattan              5 locus plots                (window rows)
+  manhattan_genomewide             3-panel genome-wide plot     (genome-wide rows)
+
+Throughput is input rows per wall second. Runs are cold by default
+(ASSOC_IO_CACHE=0, no .cache.npz / .manh.npz sidecars); --warm primes the
+sidecars with one untimed run first. Modules with a worker pool get --workers
+(default 1, so numbers compare across machines).
+
+Results go to a TSV report and to a perf ledger (one line per case and
+scale, the fastest repeat, task = <case>@x<S>), so two benchmark runs
+compare with the usual regression gate:
+
+  bench_suite.py                                  # x1 x10 x100
+  bench_suite.py --scales 1,10 --cases finemap_pip,manhattan_genomewide
+  perf_ledger.py compare bench_<old> bench_<new> --max-ratio 1.3
+
+Scale 100 is roughly real genome-wide size (5M SNPs per genome-wide assoc,
+20k trans genes) and needs a few GB of disk under <work>.
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import perf_ledger
+
+CODE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(CODE)
+
+# name -> (argv builder (data dir, out dir, workers, meta), meta count used as units)
+CASES = {
+    "finemap_pip": (
+        lambda d, o, w, m: ["finemap_pip.py", "--manifest", f"{d}/finemap_manifest.tsv",
+                         "--outdir", o, "--jobs", str(w)],
+        "window_rows"),
+    "finemap_pip_sens": (
+        lambda d, o, w, m: ["finemap_pip.py", "--manifest", f"{d}/finemap_sens_manifest.tsv",
+                         "--outdir", o, "--jobs", str(w),
+                         "--summary", f"{o}/prior_sensitivity_summary.tsv", "--summary-only"],
+        "window_rows"),
+    "collect_sig_genes_trans": (
+        lambda d, o, w, m: ["collect_sig_genes_trans.py", "--dir", f"{d}/transcis",
+                         "--out-all", f"{o}/all.tsv", "--out-sig", f"{o}/sig.tsv",
+                         "--out-top", f"{o}/top.tsv"],
+        "transcis_rows"),
+    "collect_sig_genes_transcis_v2": (
+        lambda d, o, w, m: ["collect_sig_genes_transcis_v2.py", "--dir", f"{d}/transcis",
+                         "--out-all", f"{o}/all.tsv", "--out-sig", f"{o}/sig.tsv",
+                         "--workers", str(w)],
+        "transcis_rows"),
+    "summarize_cross_conditional": (
+        lambda d, o, w, m: ["summarize_cross_conditional.py", "--signals", f"{d}/signals.tsv",
+                         "--runs", f"{d}/runs.tsv", "--out", f"{o}/summary.tsv", "--workers", str(w)],
+        "cross_rows"),
+    "summarize_cross_conditional_v2": (
+        lambda d, o, w, m: ["summarize_cross_conditional_v2.py", "--signals", f"{d}/signals.tsv",
+                         "--runs", f"{d}/runs.tsv", "--out", f"{o}/summary.tsv", "--workers", str(w)],
+        "cross_rows"),
+    "rank_candidates_from_vep37_v2": (
+        lambda d, o, w, m: ["rank_candidates_from_vep37_v2.py", "--manifest", f"{d}/rank_manifest.tsv",
+                         "--top", "20"],
+        "ld_rows"),
+    "locuszoom_manhattan": (
+        lambda d, o, w, m: ["locuszoom_manhattan.py", "--manifest", f"{d}/locuszoom_manifest.tsv",
+                         "--workers", str(w)],
+        "window_rows"),
+    "manhattan_genomewide": (
+        lambda d, o, w, m: ["manhattan_genomewide.py",
+                         "--assoc", ",".join(m["files"]["genomewide"]),
+                         "--titles", ",".join(os.path.basename(p).split("_")[0] for p in m["files"]["genomewide"]),
+                         "--out-png", f"{o}/manhattan.png"],
+        "gw_rows"),
+}
+SIDECARS = ("*.cache.npz", "*.manh.npz")
+REPORT_COLS = ["scale", "case", "units", "wall_s", "cpu_s", "max_rss_mb", "units_per_s", "rc"]
+
+
+def parse_scales(text: str):
+    out = []
+    for tok in text.split(","):
+        tok = tok.strip().lower().lstrip("x")
+        if tok:
+            v = float(tok)
+            out.append(int(v) if v.is_integer() else v)
+    return out
+
+
+def ensure_data(data: str, scale, seed: int) -> dict:
+    """synth_data.py in its own process: the harness stays small, and a child's
+    peak RSS on Linux starts from its parent's (kept across fork + exec)."""
+    cmd = [sys.executable, os.path.join(CODE, "synth_data.py"), "--out", data,
+           "--scale", str(scale), "--seed", str(seed)]
+    if subprocess.run(cmd).returncode != 0:
+        raise SystemExit(f"[ERR] synth_data.py failed for x{scale}")
+    with open(os.path.join(data, "meta.json")) as f:
+        return json.load(f)
+
+
+def clear_sidecars(data: str) -> None:
+    for pat in SIDECARS:
+        for p in glob.glob(os.path.join(data, "**", pat), recursive=True):
+            os.remove(p)
+
+
+def run_case(argv, log: str, env: dict):
+    cmd = [sys.executable, os.path.join(CODE, argv[0])] + argv[1:]
+    with open(log, "a") as f:
+        f.write(f"$ {' '.join(cmd)}\n")
+        f.flush()
+        rc, usage = perf_ledger.measure(cmd, stdout=f, stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+    if rc is None:
+        raise SystemExit(f"[ERR] cannot start {cmd[1]}")
+    if rc == -signal.SIGINT:
+        raise KeyboardInterrupt
+    return cmd, rc, usage
+
+
+def main():
+    ap = argparse.ArgumentParser(description="time the Python modules on synthetic data")
+    ap.add_argument("--scales", default="1,10,100", help="comma list of data scales (x1 = base size)")
+    ap.add_argument("--cases", default=None, help=f"comma list (default all): {','.join(CASES)}")
+    ap.add_argument("--repeat", type=int, default=1, help="timed runs per case (report keeps the fastest)")
+    ap.add_argument("--warm", action="store_true", help="time with assoc sidecars primed (default cold)")
+    ap.add_argument("--workers", type=int, default=1, help="--workers/--jobs for modules that have one")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--work", default=os.path.join(ROOT, "result", "bench"), help="data + outputs root")
+    ap.add_argument("--report", default=None, help="TSV report (default <work>/<run>.tsv)")
+    ap.add_argument("--ledger", default=None,
+                    help="perf ledger to append to (default $PERF_DIR/<run>.jsonl; '' = none)")
+    ap.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = ap.parse_args()
+
+    if args.list:
+        for name, (_, units) in CASES.items():
+            print(f"{name}\t{units}")
+        return
+    cases = list(CASES) if not args.cases else [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise SystemExit(f"[ERR] unknown case(s): {unknown} (see --list)")
+
+    run_id = "bench_" + time.strftime("%Y%m%d_%H%M%S")
+    report = args.report or os.path.join(args.work, f"{run_id}.tsv")
+    ledger = args.ledger
+    if ledger is None:
+        ledger = os.path.join(perf_ledger.default_dir(), f"{run_id}.jsonl")
+    env = dict(os.environ, MPLBACKEND="Agg", ASSOC_IO_CACHE="1" if args.warm else "0")
+
+    rows = []
+    for scale in parse_scales(args.scales):
+        base = os.path.abspath(os.path.join(args.work, f"x{scale}"))
+        data = os.path.join(base, "data")
+        t0 = time.monotonic()
+        meta = ensure_data(data, scale, args.seed)
+        print(f"[OK] x{scale} data ready ({time.monotonic() - t0:.1f}s): {data}", file=sys.stderr)
+        if not args.warm:
+            clear_sidecars(data)
+        log = os.path.join(base, f"{run_id}.log")
+
+        for case in cases:
+            build, unit_key = CASES[case]
+            out = os.path.join(base, "out", case)
+            os.makedirs(out, exist_ok=True)
+            argv = build(data, out, args.workers, meta)
+            if args.warm:
+                run_case(argv, log, env)
+
+            units = meta["counts"][unit_key]
+            best = None
+            for _ in range(max(1, args.repeat)):
+                start = time.time()
+                cmd, rc, usage = run_case(argv, log, env)
+                if best is None or (rc != 0, usage["wall_s"]) < (best[1] != 0, best[2]["wall_s"]):
+                    best = (start, rc, usage)
+
+            start, rc, usage = best
+            if ledger:
+                rec = {"run": run_id, "step": f"x{scale}", "tool": "bench", "task": f"{case}@x{scale}",
+                       "cmd": " ".join(cmd)[:2000],
+                       "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start)),
+                       "host": socket.gethostname(), "rc": rc, "units": units, "repeat": args.repeat}
+                rec.update(usage)
+                perf_ledger.append(ledger, rec)
+            wall = usage["wall_s"]
+            rows.append([scale, case, units, f"{wall:.3f}", f"{usage['user_s'] + usage['sys_s']:.3f}",
+                         f"{usage['max_rss_mb']:.1f}", f"{units / wall:.0f}" if wall > 0 else "NA", rc])
+            tag = "[OK]" if rc == 0 else "[ERR]"
+            print(f"{tag} x{scale} {case}: {wall:.2f}s  {usage['max_rss_mb']:.0f} MB  "
+                  f"{rows[-1][6]} rows/s" + ("" if rc == 0 else f"  rc={rc} (see {log})"), file=sys.stderr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(report)), exist_ok=True)
+    with open(report, "w") as f:
+        f.write("\n".join("\t".join(map(str, r)) for r in [REPORT_COLS] + rows) + "\n")
+    widths = [max(len(str(r[i])) for r in rows + [REPORT_COLS]) for i in range(len(REPORT_COLS))]
+    for r in [REPORT_COLS] + rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(r, widths)))
+    print(f"[OK] report: {report}", file=sys.stderr)
+    if ledger:
+        print(f"[OK] ledger: {ledger}", file=sys.stderr)
+    if any(r[-1] != 0 for r in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""On-disk rsID -> (CHR, BP, row) index for a PLINK .bim.
+
+Built once per BFILE into <bfile>.bim.idx/ as plain .npy arrays that are
+memory-mapped on open:
+
+  names.npy   rsIDs sorted (fixed-width bytes), for binary search
+  order.npy   .bim row of each sorted name (first occurrence wins, like awk)
+  chr.npy     CHR per .bim row (bytes, as written in the .bim)
+  bp.npy      BP per .bim row
+  offset.npy  byte offset of each .bim line (n+1 entries), so a window's
+              SNP/A1/A2 can be parsed without reading the whole .bim
+
+meta.json records the .bim size/mtime; the index is rebuilt when they change.
+Builds hold an exclusive flock on <index>.lock and readers open under a
+shared one, so an index is never replaced while another process is opening
+it (steps run side by side and all look up leads on their first run).
+BIM_INDEX_DIR=<dir> keeps indexes elsewhere (read-only genotype dirs).
+
+CLI:
+  bim_index.py build  BFILE
+  bim_index.py lookup BFILE rs1 [rs2 ...] [--fields chr,bp]
+  bim_index.py window BFILE CHR FROM TO          (prints rsIDs in range)
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import io
+import json
+import os
+import shutil
+import sys
+from typing import TYPE_CHECKING, Dict, Iterable, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas is imported lazily: the shell lookups (get_chr_bp) only need numpy,
+# and the pandas import costs more than the lookup itself.
+
+INDEX_SUFFIX = ".bim.idx"
+INDEX_VERSION = 1
+FIELDS = ["snp", "chr", "bp", "row"]
+
+
+def index_dir(bfile: str) -> str:
+    root = os.environ.get("BIM_INDEX_DIR", "").strip()
+    if root:
+        return os.path.join(root, os.path.basename(bfile) + INDEX_SUFFIX)
+    return bfile + INDEX_SUFFIX
+
+
+def _source_key(bim_path: str) -> Dict[str, object]:
+    st = os.stat(bim_path)
+    return {"version": INDEX_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _line_offsets(bim_path: str) -> np.ndarray:
+    raw = np.fromfile(bim_path, dtype=np.uint8)
+    ends = np.flatnonzero(raw == ord("\n")) + 1
+    if len(raw) and raw[-1] != ord("\n"):
+        ends = np.append(ends, len(raw))
+    return np.concatenate([[0], ends]).astype(np.int64)
+
+
+@contextlib.contextmanager
+def dir_lock(path: str, exclusive: bool):
+    """flock on <path>.lock: exclusive to build, shared to open.
+
+    Shared by the on-disk stores built next to their inputs (gene_annot,
+    pheno_store).
+    """
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+    except OSError:
+        # read-only location: nothing can rebuild anything there either
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def staged_dir(out: str):
+    """Yield an empty <out>.tmp<pid> to write into; it replaces out on success.
+
+    Call with dir_lock(out, exclusive=True) held: no reader is between open
+    and mmap then, and arrays already mapped survive the unlink.
+    """
+    tmp = f"{out}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        yield tmp
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+
+
+def _is_fresh(path: str, bfile: str) -> bool:
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    key = _source_key(bfile + ".bim")
+    return all(meta.get(k) == v for k, v in key.items())
+
+
+def build_index(bfile: str) -> str:
+    """(Re)build the index for bfile; returns the index directory.
+
+    Call with the exclusive lock held (open_index does).
+    """
+    import pandas as pd
+
+    bim_path = bfile + ".bim"
+    key = _source_key(bim_path)
+    bim = pd.read_csv(bim_path, sep=r"\s+", header=None, usecols=[0, 1, 3],
+                      names=["CHR", "SNP", "BP"], dtype={"CHR": str, "SNP": str, "BP": np.int64},
+                      engine="c")
+    offsets = _line_offsets(bim_path)
+    if len(offsets) != len(bim) + 1:
+        raise SystemExit(f"[ERR] blank or malformed lines in {bim_path}")
+
+    names = bim["SNP"].to_numpy().astype(bytes)
+    order = np.argsort(names, kind="stable")
+
+    out = index_dir(bfile)
+    with staged_dir(out) as tmp:
+        np.save(os.path.join(tmp, "names.npy"), names[order])
+        np.save(os.path.join(tmp, "order.npy"), order.astype(np.int64))
+        np.save(os.path.join(tmp, "chr.npy"), bim["CHR"].to_numpy().astype(bytes))
+        np.save(os.path.join(tmp, "bp.npy"), bim["BP"].to_numpy(dtype=np.int64))
+        np.save(os.path.join(tmp, "offset.npy"), offsets)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(dict(key, n=int(len(bim))), f)
+    return out
+
+
+class BimIndex:
+    """Memory-mapped view of a built index; use open_index() to get one."""
+
+    def __init__(self, bfile: str, path: str):
+        self.bfile = bfile
+        self.path = path
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.names = load("names.npy")
+        self.order = load("order.npy")
+        self.chr = load("chr.npy")
+        self.bp = load("bp.npy")
+        self.offset = load("offset.npy")
+        self.n = len(self.chr)
+
+    def rows(self, snps: Iterable[str]) -> np.ndarray:
+        """.bim row per rsID (-1 where absent)."""
+        q = np.asarray(list(snps), dtype=object).astype(bytes)
+        if len(q) == 0:
+            return np.zeros(0, dtype=np.int64)
+        pos = np.searchsorted(self.names, q)
+        pos_c = np.minimum(pos, len(self.names) - 1)
+        hit = (pos < len(self.names)) & (np.asarray(self.names[pos_c]) == q)
+        return np.where(hit, np.asarray(self.order[pos_c]), -1).astype(np.int64)
+
+    def lookup(self, snps: Sequence[str]) -> "pd.DataFrame":
+        """SNP/CHR/BP/ROW for the rsIDs found (input order, absent ones dropped)."""
+        import pandas as pd
+
+        snps = list(snps)
+        rows = self.rows(snps)
+        found = rows >= 0
+        r = rows[found]
+        return pd.DataFrame({
+            "SNP": np.asarray(snps, dtype=object)[found],
+            "CHR": np.asarray(self.chr[r]).astype(str),
+            "BP": np.asarray(self.bp[r]),
+            "ROW": r,
+        })
+
+    def window_rows(self, chrom: str, from_bp: int, to_bp: int) -> np.ndarray:
+        """.bim rows on chrom with from_bp <= BP <= to_bp, in .bim order."""
+        m = (self.chr == str(chrom).encode()) & (self.bp >= from_bp) & (self.bp <= to_bp)
+        return np.flatnonzero(m)
+
+    def bim_rows(self, rows: Sequence[int]) -> "pd.DataFrame":
+        """Full .bim records (CHR SNP CM BP A1 A2 + ROW) for `rows`, read by byte offset."""
+        import pandas as pd
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = ["CHR", "SNP", "CM", "BP", "A1", "A2"]
+        if len(rows) == 0:
+            return pd.DataFrame({c: [] for c in cols + ["ROW"]})
+        lo, hi = int(rows.min()), int(rows.max())
+        with open(self.bfile + ".bim", "rb") as f:
+            f.seek(int(self.offset[lo]))
+            chunk = f.read(int(self.offset[hi + 1]) - int(self.offset[lo]))
+        df = pd.read_csv(io.BytesIO(chunk), sep=r"\s+", header=None, names=cols,
+                         dtype={"CHR": str, "SNP": str, "A1": str, "A2": str,
+                                "CM": "float64", "BP": "int64"}, engine="c")
+        df["ROW"] = np.arange(lo, hi + 1, dtype=np.int64)
+        return df.iloc[rows - lo].reset_index(drop=True)
+
+
+def open_index(bfile: str, rebuild: bool = False) -> BimIndex:
+    """Index for bfile, building it first if missing or stale."""
+    path = index_dir(bfile)
+    if not rebuild:
+        with dir_lock(path, exclusive=False):
+            if _is_fresh(path, bfile):
+                return BimIndex(bfile, path)
+    with dir_lock(path, exclusive=True):
+        # re-check: another process may have built it while we waited
+        if rebuild or not _is_fresh(path, bfile):
+            build_index(bfile)
+        return BimIndex(bfile, path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="rsID -> CHR/BP/row index for a PLINK .bim")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="(re)build the index")
+    b.add_argument("bfile")
+
+    lk = sub.add_parser("lookup", help="print SNP CHR BP ROW per rsID (exit 1 if any missing)")
+    lk.add_argument("bfile")
+    lk.add_argument("snps", nargs="*")
+    lk.add_argument("--snps-file", default=None, help="one rsID per line (in addition to args)")
+    lk.add_argument("--fields", default=",".join(FIELDS),
+                    help=f"comma list from {FIELDS} (default: all)")
+
+    w = sub.add_parser("window", help="print rsIDs with CHR==chr and FROM<=BP<=TO")
+    w.add_argument("bfile")
+    w.add_argument("chrom")
+    w.add_argument("from_bp", type=int)
+    w.add_argument("to_bp", type=int)
+
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        print(f"[OK] wrote {open_index(args.bfile, rebuild=True).path}")
+        return
+
+    idx = open_index(args.bfile)
+    if args.cmd == "window":
+        rows = idx.window_rows(args.chrom, args.from_bp, args.to_bp)
+        sys.stdout.write("".join(f"{s}\n" for s in idx.bim_rows(rows)["SNP"]))
+        return
+
+    snps = list(args.snps)
+    if args.snps_file:
+        with open(args.snps_file) as f:
+            snps += [line.split()[0] for line in f if line.strip()]
+    fields = [x.strip().lower() for x in args.fields.split(",") if x.strip()]
+    bad = [x for x in fields if x not in FIELDS]
+    if bad:
+        raise SystemExit(f"[ERR] unknown --fields {bad}; choose from {FIELDS}")
+
+    rows = idx.rows(snps)
+    found = [(s, r) for s, r in zip(snps, rows) if r >= 0]
+    for s, r in found:
+        rec = {"snp": s, "chr": idx.chr[r].decode(), "bp": int(idx.bp[r]), "row": int(r)}
+        print("\t".join(str(rec[x]) for x in fields))
+    missing = sorted(set(snps) - {s for s, _ in found})
+    if missing:
+        print(f"[WARN] not in {args.bfile}.bim: {' '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import sys
-import pandas as pd
+
+from pheno_store import open_store, read_text, store_enabled
 
 def main():
     if len(sys.argv) < 3:
@@ -10,13 +11,23 @@ def main():
     pheno = sys.argv[1]
     genes = sys.argv[2:]
 
-    df = pd.read_csv(pheno, sep=r"\s+|\t", engine="python")
-    # expect FID IID + gene columns
-    out = []
+    # expect FID IID + gene columns; only the requested ones are read (pheno_store.py)
+    if store_enabled():
+        store = open_store(pheno)
+        names = store.genes
+    else:
+        store = None
+        df = read_text(pheno)
+        names = list(df.columns[2:])
     for g in genes:
-        if g not in df.columns:
+        if g not in names:
             raise SystemExit(f"[ERR] gene column not found: {g}")
-        x = pd.to_numeric(df[g], errors="coerce").dropna()
+    if store is not None:
+        df = store.table(genes)
+
+    out = []
+    for g in genes:
+        x = df[g].dropna()
         out.append((g, float(x.std(ddof=1))))
     print("gene\tsd")
     for g, sd in out:
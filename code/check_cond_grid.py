@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Check cond_grid.py's one-factorization grid against full per-run refits.
+
+On a small synth_data.py --geno set (chr5 window, the planted leads), one
+cross-conditional grid is fitted twice:
+
+  grid    cond_grid.run_grid: one base fit per sample set + low-rank updates
+  refit   eqtl_linear.run_window per run, as the plink-style steps call it:
+          --condition <lead>, --condition-list <ERAP1 sig1-3 file>, or
+          --covar <make_covar_plus_expr.py file> --covar-name C1..C10 expr_<GENE>
+
+Every outcome gets a baseline, a --condition run per lead, a
+--condition-list run and a covar+expr run per other gene. Some ERAP1 and
+ERAP2 values are blanked in a copy of the phenotype table, so the expr and
+outcome sample masks differ from the base fit; window SNPs with missing
+calls exercise the per-SNP refit. Rows must agree on SNP/A1/NMISS, on which
+values are NA, and on BETA/STAT/P to --rtol; any mismatch exits 1.
+
+  check_cond_grid.py                      # work dir result/bench/check_cond_grid
+  check_cond_grid.py --work /tmp/cg --samples 200 --rtol 1e-8
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import synth_data
+from cond_grid import run_grid
+from eqtl_linear import read_condition_list, run_window
+
+CODE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(CODE)
+COVAR_NAMES = [f"C{i}" for i in range(1, 11)]
+OUTCOMES = ["ERAP2", "ERAP1", "LNPEP"]
+# outcome / expr columns blanked every k-th sample (offset keeps the masks apart)
+BLANK = {"ERAP1": (9, 0), "ERAP2": (13, 5)}
+STATS = ["BETA", "STAT", "P"]
+
+
+def masked_pheno(src: str, dst: str) -> None:
+    df = pd.read_csv(src, sep=" ", dtype=str)
+    for gene, (k, off) in BLANK.items():
+        df.loc[np.arange(len(df)) % k == off, gene] = "NA"
+    df.to_csv(dst, sep=" ", index=False)
+
+
+def grid_spec(leads: dict, work: str) -> pd.DataFrame:
+    """outcome/run_id/assoc/condition/expr + the refit's condition list and covar."""
+    sig_list = os.path.join(work, "erap1_sig123.txt")
+    with open(sig_list, "w") as f:
+        f.write("".join(leads[f"ERAP1_sig{i}"] + "\n" for i in (1, 2, 3)))
+    rows = []
+    for outcome in OUTCOMES:
+        rows.append((outcome, "baseline", "", "", [], None))
+        for lab in ("ERAP2", "LNPEP", "ERAP1_sig1"):
+            rows.append((outcome, f"cond_snp_{leads[lab]}", leads[lab], "", [leads[lab]], None))
+        sigs = ",".join(leads[f"ERAP1_sig{i}"] for i in (1, 2, 3))
+        rows.append((outcome, "cond_erap1_sig123", sigs, "", sig_list, None))
+        for g in OUTCOMES:
+            if g != outcome:
+                rows.append((outcome, f"cov_expr_{g}", "", g, [], g))
+    spec = pd.DataFrame(rows, columns=["outcome", "run_id", "condition", "expr", "refit_cond", "refit_expr"])
+    spec["assoc"] = [os.path.join(work, "grid", o, f"{r}.assoc.linear")
+                     for o, r in zip(spec["outcome"], spec["run_id"])]
+    return spec
+
+
+def compare(a: pd.DataFrame, b: pd.DataFrame, rtol: float) -> list:
+    """mismatch messages between a grid frame and a refit frame (empty = same)."""
+    bad = []
+    for c in ("SNP", "A1", "NMISS"):
+        if not np.array_equal(a[c].to_numpy(), b[c].to_numpy()):
+            bad.append(f"{c} differs")
+    for c in STATS:
+        x = a[c].to_numpy(dtype=np.float64)
+        y = b[c].to_numpy(dtype=np.float64)
+        na = np.isnan(x) != np.isnan(y)
+        if na.any():
+            bad.append(f"{c} NA on {int(na.sum())} SNP(s) in one fit only")
+        ok = ~np.isnan(x) & ~np.isnan(y)
+        if not np.allclose(x[ok], y[ok], rtol=rtol, atol=0.0):
+            rel = np.abs(x[ok] - y[ok]) / np.maximum(np.abs(y[ok]), np.finfo(float).tiny)
+            bad.append(f"{c} max rel diff {rel.max():.3g}")
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="cond_grid.py vs per-run eqtl_linear refits")
+    ap.add_argument("--work", default=os.path.join(ROOT, "result", "bench", "check_cond_grid"))
+    ap.add_argument("--samples", type=int, default=370)
+    ap.add_argument("--window-snps", type=int, default=400)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--rtol", type=float, default=1e-6)
+    args = ap.parse_args()
+
+    data = os.path.join(args.work, "data")
+    size = synth_data.sizes(1.0, samples=args.samples, window_snps=args.window_snps,
+                            gw_snps=args.window_snps * 4, trans_genes=10, candidates=10)
+    meta = synth_data.ensure(data, size, args.seed, geno=True)
+    bfile = os.path.join(data, "geno")
+    covar = os.path.join(data, "covar_pca10.tsv")
+    pheno = os.path.join(args.work, "pheno_chr5_masked.txt")
+    masked_pheno(os.path.join(data, "pheno_chr5.txt"), pheno)
+
+    spec = grid_spec(meta["leads"], args.work)
+    expr_dir = os.path.join(args.work, "covar_expr")
+    subprocess.run([sys.executable, os.path.join(CODE, "make_covar_plus_expr.py"),
+                    "--covar", covar, "--pheno", pheno, "--gene"] + OUTCOMES + ["--out-dir", expr_dir],
+                   check=True)
+
+    lo, hi = synth_data.WINDOW
+    grid = run_grid(bfile, "5", lo, hi, pheno, covar, COVAR_NAMES, spec)
+
+    n_bad = 0
+    for i, r in spec.iterrows():
+        cond = r["refit_cond"]
+        if isinstance(cond, str):
+            cond = read_condition_list(cond)
+        if r["refit_expr"]:
+            run_covar = os.path.join(expr_dir, f"covar_plus_expr_{r['refit_expr']}.tsv")
+            names = COVAR_NAMES + [f"expr_{r['refit_expr']}"]
+        else:
+            run_covar, names = covar, COVAR_NAMES
+        ref = run_window(bfile, "5", lo, hi, pheno, r["outcome"], run_covar, names, condition=cond)
+        bad = compare(grid[i], ref, args.rtol)
+        n_bad += bool(bad)
+        nmiss = ref["NMISS"].to_numpy()
+        print(f"[{'FAIL' if bad else 'OK'}] {r['outcome']} {r['run_id']} "
+              f"(NMISS {nmiss.min()}-{nmiss.max()})" + (": " + "; ".join(bad) if bad else ""))
+
+    if n_bad:
+        raise SystemExit(f"[ERR] {n_bad}/{len(spec)} grid runs differ from their refit")
+    print(f"[OK] {len(spec)} grid runs match eqtl_linear refits (rtol={args.rtol:g})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,38 +3,39 @@ import argparse
 import os
 import re
 import glob
+import numpy as np
 import pandas as pd
 
-def bh_fdr(pvals):
-    """Benjamini-Hochberg FDR; returns q-values aligned to input order."""
-    p = pd.Series(pvals, dtype="float64")
-    m = p.notna().sum()
-    q = pd.Series([float("nan")] * len(p), index=p.index, dtype="float64")
-    if m == 0:
-        return q
+import assoc_io
+from gene_annot import open_store
+from multitest import METHODS, fdr
 
-    p_non = p[p.notna()]
-    order = p_non.sort_values().index
-    ranks = pd.Series(range(1, len(order) + 1), index=order, dtype="float64")
-    q_raw = (p_non.loc[order] * m / ranks)
+# <prefix>.<GENE>.assoc.linear, as written by plink --all-pheno (no PHENO column)
+GENE_RE = re.compile(r"\.([^.]+)\.assoc\.linear$")
 
-    # enforce monotonicity
-    q_mon = q_raw.copy()
-    for i in range(len(q_mon) - 2, -1, -1):
-        q_mon.iloc[i] = min(q_mon.iloc[i], q_mon.iloc[i + 1])
-
-    q.loc[order] = q_mon.clip(upper=1.0).values
-    return q
+def cis_trans_labels(pheno_chr, snp_chr: pd.Series) -> np.ndarray:
+    """'cis' / 'trans' per row, 'NA' where either chromosome is unknown"""
+    snp_na = snp_chr.isna().to_numpy()
+    if pheno_chr is None or pheno_chr == "":
+        return np.full(len(snp_na), "NA", dtype=object)
+    snp = snp_chr.astype(str).to_numpy()
+    lab = np.where(snp == str(pheno_chr), "cis", "trans").astype(object)
+    lab[snp_na] = "NA"
+    return lab
 
 def parse_chr_from_path(path: str):
     m = re.search(r"chr(\d+)", os.path.basename(path))
     return int(m.group(1)) if m else None
 
+def parse_gene_from_path(path: str):
+    m = GENE_RE.search(os.path.basename(path))
+    return m.group(1) if m else None
+
 def read_assoc_linear(path: str):
     if os.path.getsize(path) == 0:
         return None
     try:
-        df = pd.read_csv(path, sep=r"\s+", dtype=str, engine="python")
+        df = assoc_io.read_assoc_linear(path, test="ADD")
     except Exception:
         return None
     if df is None or df.empty:
@@ -47,6 +48,9 @@ def main():
     ap.add_argument("--pattern", default="*.assoc.linear", help="glob pattern")
     ap.add_argument("--p-raw", default="5e-6")
     ap.add_argument("--q-fdr", default="0.1")
+    ap.add_argument("--fdr-method", choices=METHODS, default="bh",
+                    help="bh -> q_bh; storey -> q_storey; hierarchical -> q_gene + q_local (per pheno_gene)")
+    ap.add_argument("--gtf", default=None, help="(optional) gtf: gene chr for cis_trans, adds TSS_DIST (|BP-TSS|, same-chr rows)")
     ap.add_argument("--out-all", required=True)
     ap.add_argument("--out-sig", required=True)
     ap.add_argument("--out-top", required=True)
@@ -59,6 +63,8 @@ def main():
     if not files:
         raise SystemExit(f"[ERR] no assoc files in: {args.dir}")
 
+    genes = open_store(args.gtf) if args.gtf else None
+
     rows = []
     for f in files:
         df = read_assoc_linear(f)
@@ -72,25 +78,22 @@ def main():
                 # tolerate missing STAT/BETA in some cases? but usually exist
                 pass
 
-        # PHENO column appears when --all-pheno used
-        if "PHENO" not in df.columns:
-            df["PHENO"] = "PHENO"
-
-        # filter ADD
-        if "TEST" in df.columns:
-            df = df[df["TEST"].astype(str) == "ADD"]
-        if df.empty:
-            continue
-
-        # numeric P
-        df["P"] = pd.to_numeric(df["P"], errors="coerce")
+        # TEST==ADD already applied by the reader; P is numeric
         df = df[df["P"].notna()]
         if df.empty:
             continue
 
+        # the phenotype is in the file name; the gene store's chromosome wins over chrN
+        pheno_gene = parse_gene_from_path(f) or os.path.basename(f)
         pheno_chr = parse_chr_from_path(f)
+        if genes is not None:
+            # one gene per file: a single store lookup, then array compares
+            gchr, tss = genes.gene_chr_tss([pheno_gene])
+            gchr, tss = gchr[0], tss[0]
+            if gchr:
+                pheno_chr = int(gchr) if gchr.isdigit() else gchr
         df["pheno_chr"] = pheno_chr
-        df["pheno_gene"] = df["PHENO"].astype(str)
+        df["pheno_gene"] = pheno_gene
 
         # normalize SNP_CHR
         if "CHR" in df.columns:
@@ -99,15 +102,16 @@ def main():
             df["SNP_CHR"] = pd.NA
 
         # cis/trans label (pheno_chr 없으면 NA)
-        def cis_trans(row):
-            if pd.isna(row.get("pheno_chr")) or pd.isna(row.get("SNP_CHR")):
-                return "NA"
-            return "cis" if int(row["pheno_chr"]) == int(row["SNP_CHR"]) else "trans"
-
-        df["cis_trans"] = df.apply(cis_trans, axis=1)
+        df["cis_trans"] = cis_trans_labels(pheno_chr, df["SNP_CHR"])
+        if genes is not None:
+            bp = df["BP"].to_numpy(dtype=np.float64)
+            with np.errstate(invalid="ignore"):
+                df["TSS_DIST"] = np.where(df["SNP_CHR"].astype(str).to_numpy() == gchr, np.abs(bp - tss), np.nan)
         df["source_file"] = os.path.basename(f)
 
         keep_cols = ["pheno_gene","pheno_chr","cis_trans","SNP_CHR","SNP","BP","A1","BETA","STAT","P","NMISS","source_file"]
+        if genes is not None:
+            keep_cols.insert(keep_cols.index("NMISS") + 1, "TSS_DIST")
         for c in keep_cols:
             if c not in df.columns:
                 df[c] = pd.NA
@@ -118,13 +122,16 @@ def main():
 
     out = pd.concat(rows, ignore_index=True)
 
-    out["q_bh"] = bh_fdr(out["P"].values)
+    qcols, passed = fdr(out["P"].to_numpy(dtype="float64"), args.fdr_method,
+                        groups=out["pheno_gene"].to_numpy(), alpha=q_fdr)
+    for c, q in qcols.items():
+        out[c] = q
 
     # write all
     out.to_csv(args.out_all, sep="\t", index=False)
 
     # significant
-    sig = out[(out["P"] <= p_raw) & (out["q_bh"] <= q_fdr)].copy()
+    sig = out[(out["P"] <= p_raw).to_numpy() & passed].copy()
     sig.to_csv(args.out_sig, sep="\t", index=False)
 
     # top1 per phenotype among significant
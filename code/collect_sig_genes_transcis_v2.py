@@ -4,10 +4,22 @@
 # - keeps TEST=ADD
 # - outputs columns like your old format:
 #   pheno_gene pheno_chr SNP_CHR SNP BP A1 BETA STAT P NMISS q_bh
-# - BH-FDR is computed across ALL collected rows (after optional trans-only filters)
+#   (q_storey, or q_gene q_local, instead of q_bh with --fdr-method storey|hierarchical)
+# - FDR is computed across ALL collected rows (after optional trans-only filters)
+# - streams: pass 1 keeps only P (float64) per kept row for the exact FDR; pass 2
+#   re-reads each file (from the assoc_io sidecar), appends it to --out-all and
+#   keeps only the sig rows, so memory does not grow with the number of phenotypes
 import argparse, glob, os, re, sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from assoc_io import read_assoc_linear
+from gene_annot import open_store
+from multitest import METHODS, fdr
+
 PATTERNS = [
     re.compile(r"_chr(\d+)\.([^.]+)\.assoc\.linear$"),
     re.compile(r"chr(\d+)\.([^.]+)\.assoc\.linear$"),
@@ -21,47 +33,85 @@ def parse_meta(path: str):
             return m.group(1), m.group(2)
     return None, None
 
-def load_gene_tss_from_gtf(gtf: str):
-    import gzip
-    op = gzip.open if gtf.endswith(".gz") else open
-    out = {}
-    with op(gtf, "rt", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if line.startswith("#"):
-                continue
-            toks = line.rstrip("\n").split("\t")
-            if len(toks) < 9:
-                continue
-            if toks[2] != "gene":
-                continue
-            chrom = toks[0].replace("chr", "")
-            start = int(toks[3]); end = int(toks[4])
-            strand = toks[6]
-            attrs = toks[8]
-            gname = None
-            for seg in attrs.split(";"):
-                seg = seg.strip()
-                if seg.startswith("gene_name"):
-                    q = seg.split('"')
-                    if len(q) >= 2:
-                        gname = q[1].upper()
-                        break
-            if not gname:
-                continue
-            tss = start if strand == "+" else end
-            out[gname] = (chrom, tss)
-    return out
+OUT_COLS = ["pheno_gene", "pheno_chr", "SNP_CHR", "SNP", "BP", "A1", "BETA", "STAT", "P", "NMISS"]
+
+def keep_mask(df: pd.DataFrame, pheno_chr: str, pheno_gene: str, args, genes) -> np.ndarray:
+    """rows that enter the FDR: P present, and trans (or far same-chr) when --trans-only"""
+    keep = df["P"].notna().to_numpy()
+    if not args.trans_only:
+        return keep
+    snp_chr = df["CHR"].astype(str).to_numpy()
+    trans = snp_chr != str(pheno_chr)
+    if genes is not None and "BP" in df.columns:
+        # one gene per file: a single store lookup, then array compares
+        gchr, tss = genes.gene_chr_tss([pheno_gene])
+        bp = df["BP"].to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            trans |= (snp_chr == gchr[0]) & (np.abs(bp - tss[0]) >= int(args.samechr_min_mb * 1_000_000))
+    return keep & trans
+
+def read_one(path: str, args, genes, columns=None):
+    """(pheno_chr, pheno_gene, df, keep) or None for unusable files"""
+    pheno_chr, pheno_gene = parse_meta(path)
+    if not pheno_chr or not pheno_gene:
+        # skip files that don't match expected naming
+        return None
+    try:
+        df = read_assoc_linear(path, test=args.test, columns=columns)
+    except Exception:
+        return None
+    if df.empty or "CHR" not in df.columns or "SNP" not in df.columns or "P" not in df.columns:
+        return None
+    return pheno_chr, pheno_gene, df, keep_mask(df, pheno_chr, pheno_gene, args, genes)
+
+def ordered_map(ex, fn, items, ahead: int):
+    """executor.map in input order, with at most `ahead` results in flight"""
+    it = iter(items)
+    q = deque()
+    for x in it:
+        q.append(ex.submit(fn, x))
+        if len(q) >= ahead:
+            break
+    while q:
+        yield q.popleft().result()
+        for x in it:
+            q.append(ex.submit(fn, x))
+            break
+
+def p_pass(path: str, args, genes):
+    r = read_one(path, args, genes, columns=["CHR", "SNP", "BP", "P"])
+    if r is None:
+        return None
+    _, pheno_gene, df, keep = r
+    return pheno_gene, df["P"].to_numpy(dtype=np.float64)[keep]
+
+def rows_pass(path: str, args, genes):
+    r = read_one(path, args, genes)
+    if r is None:
+        return None
+    pheno_chr, pheno_gene, df, keep = r
+    df = df.loc[keep].rename(columns={"CHR": "SNP_CHR"})
+    df["pheno_gene"] = pheno_gene
+    df["pheno_chr"] = str(pheno_chr)
+    for c in OUT_COLS:
+        if c not in df.columns:
+            df[c] = pd.NA
+    return df[OUT_COLS]
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dir", required=True, help="folder containing many *.assoc.linear (can be nested)")
     ap.add_argument("--p-raw", type=float, default=5e-6)
     ap.add_argument("--q-fdr", type=float, default=0.10)
+    ap.add_argument("--fdr-method", choices=METHODS, default="bh",
+                    help="bh -> q_bh; storey -> q_storey; hierarchical -> q_gene + q_local (per pheno_gene)")
     ap.add_argument("--test", default="ADD", help="which TEST to keep (default ADD)")
     ap.add_argument("--trans-only", action="store_true", help="keep only trans (pheno_chr != SNP_CHR)")
     ap.add_argument("--gtf", default=None, help="(optional) gtf for same-chr distance filter")
     ap.add_argument("--samechr-min-mb", type=float, default=None,
                     help="treat same-chr as 'trans-like' if |BP-TSS| >= this many Mb (requires --gtf)")
+    ap.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1),
+                    help="parallel file readers (default min(8, cpus))")
     ap.add_argument("--out-all", required=True)
     ap.add_argument("--out-sig", required=True)
     args = ap.parse_args()
@@ -71,98 +121,58 @@ def main():
         print(f"[ERR] no assoc.linear found under: {args.dir}", file=sys.stderr)
         sys.exit(1)
 
-    frames = []
-    for p in paths:
-        pheno_chr, pheno_gene = parse_meta(p)
-        if not pheno_chr or not pheno_gene:
-            # skip files that don't match expected naming
-            continue
-        try:
-            df = pd.read_table(p, sep=r"\s+", dtype=str, engine="python")
-        except Exception:
-            continue
-        if df.empty:
-            continue
-        if "TEST" in df.columns:
-            df = df[df["TEST"] == args.test].copy()
-        if df.empty:
-            continue
-
-        # standardize columns
-        if "CHR" not in df.columns or "SNP" not in df.columns or "P" not in df.columns:
-            continue
-        df = df.rename(columns={"CHR": "SNP_CHR"})
-        df["pheno_gene"] = pheno_gene
-        df["pheno_chr"] = str(pheno_chr)
-
-        keep_cols = ["pheno_gene", "pheno_chr", "SNP_CHR", "SNP", "BP", "A1", "BETA", "STAT", "P", "NMISS"]
-        for c in keep_cols:
-            if c not in df.columns:
-                df[c] = pd.NA
-        df = df[keep_cols].copy()
-        frames.append(df)
-
-    if not frames:
-        print("[ERR] no usable ADD rows parsed (check filename patterns and PLINK outputs)", file=sys.stderr)
-        sys.exit(1)
+    genes = None
+    if args.trans_only and args.samechr_min_mb is not None and args.gtf:
+        genes = open_store(args.gtf)
 
-    all_df = pd.concat(frames, ignore_index=True)
-
-    # numeric casting for filtering/FDR
-    all_df["P"] = pd.to_numeric(all_df["P"], errors="coerce")
-    all_df = all_df.dropna(subset=["P"]).copy()
-
-    # trans-only filter
-    if args.trans_only:
-        all_df["pheno_chr"] = all_df["pheno_chr"].astype(str)
-        all_df["SNP_CHR"] = all_df["SNP_CHR"].astype(str)
-        trans_mask = (all_df["pheno_chr"] != all_df["SNP_CHR"])
-
-        if args.samechr_min_mb is not None and args.gtf:
-            gene_tss = load_gene_tss_from_gtf(args.gtf)
-            min_bp = int(args.samechr_min_mb * 1_000_000)
-
-            def far_samechr(row):
-                g = str(row["pheno_gene"]).upper()
-                if g not in gene_tss:
-                    return False
-                gchr, tss = gene_tss[g]
-                if str(gchr) != str(row["SNP_CHR"]):
-                    return False
-                try:
-                    bp = int(float(row["BP"]))
-                except Exception:
-                    return False
-                return abs(bp - int(tss)) >= min_bp
-
-            far_mask = all_df.apply(far_samechr, axis=1)
-            all_df = all_df[trans_mask | far_mask].copy()
-        else:
-            all_df = all_df[trans_mask].copy()
-
-    # BH-FDR
-    try:
-        from statsmodels.stats.multitest import multipletests
-    except Exception:
-        print("[ERR] statsmodels needed: pip install statsmodels", file=sys.stderr)
+    workers = max(1, args.workers)
+    ahead = 4 * workers
+
+    # pass 1: P of every kept row, in file order
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = [x for x in ordered_map(ex, lambda p: p_pass(p, args, genes), paths, ahead)
+                 if x is not None]
+    if not parts:
+        print("[ERR] no usable ADD rows parsed (check filename patterns and PLINK outputs)", file=sys.stderr)
         sys.exit(1)
+    pvals = np.concatenate([p for _, p in parts])
+    groups = None
+    if args.fdr_method == "hierarchical":
+        groups = np.repeat(np.array([g for g, _ in parts], dtype=object), [len(p) for _, p in parts])
+    del parts
 
-    all_df["q_bh"] = multipletests(all_df["P"].values, method="fdr_bh")[1]
+    # FDR
+    qcols, passed = fdr(pvals, args.fdr_method, groups=groups, alpha=args.q_fdr)
+    del pvals, groups
+    cols = OUT_COLS + list(qcols)
 
-    # output ALL
     os.makedirs(os.path.dirname(args.out_all) or ".", exist_ok=True)
     os.makedirs(os.path.dirname(args.out_sig) or ".", exist_ok=True)
 
-    out_cols = ["pheno_gene", "pheno_chr", "SNP_CHR", "SNP", "BP", "A1", "BETA", "STAT", "P", "NMISS", "q_bh"]
-    # keep order + stable formatting
-    all_df[out_cols].to_csv(args.out_all, sep="\t", index=False, float_format="%.12g")
+    # pass 2: stream ALL (same order as pass 1), keep the SIG subset
+    sig_parts = []
+    n_all = 0
+    with open(args.out_all, "w") as fout, ThreadPoolExecutor(max_workers=workers) as ex:
+        fout.write("\t".join(cols) + "\n")
+        for df in ordered_map(ex, lambda p: rows_pass(p, args, genes), paths, ahead):
+            if df is None or df.empty:
+                continue
+            for c, q in qcols.items():
+                df[c] = q[n_all:n_all + len(df)]
+            hit = (df["P"] <= args.p_raw).to_numpy() & passed[n_all:n_all + len(df)]
+            n_all += len(df)
+            df.to_csv(fout, sep="\t", index=False, header=False, float_format="%.12g")
+            if hit.any():
+                sig_parts.append(df.loc[hit].astype({"SNP": str, "A1": str}))
+    if n_all != len(passed):
+        raise SystemExit(f"[ERR] inputs changed between passes ({n_all} vs {len(passed)} rows)")
 
     # SIG subset
-    sig = all_df[(all_df["P"] <= args.p_raw) & (all_df["q_bh"] <= args.q_fdr)].copy()
-    sig = sig.sort_values(["q_bh", "P", "pheno_gene", "SNP"], kind="mergesort")
-    sig[out_cols].to_csv(args.out_sig, sep="\t", index=False, float_format="%.12g")
+    sig = pd.concat(sig_parts, ignore_index=True) if sig_parts else pd.DataFrame(columns=cols)
+    sig = sig.sort_values(list(qcols) + ["P", "pheno_gene", "SNP"], kind="mergesort")
+    sig[cols].to_csv(args.out_sig, sep="\t", index=False, float_format="%.12g")
 
-    print(f"[OK] all  -> {args.out_all} (n={len(all_df)})")
+    print(f"[OK] all  -> {args.out_all} (n={n_all})")
     print(f"[OK] sig  -> {args.out_sig} (n={len(sig)})")
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Every run of a cross-conditional grid on one window, in one process.
+
+06_cross_conditional.sh / 07_make_crossconditional_table_figs.sh fit the
+same window many times: per outcome a baseline, --condition on each lead,
+--condition-list on ERAP1 sig1-3 and the base covariates plus another gene's
+expression. Here the window genotypes, the phenotype table and the base
+covariates are read once, the base model is factorized once per sample set,
+and each run only adds its few extra columns:
+
+  RG0 = G - Q0 Q0'G                   (base covariates, shared by all runs)
+  Z~  = Z - Q0 Q0'Z,  Q1 = qr(Z~)     (the run's conditioning SNPs / expression)
+  RG  = RG0 - Q1 Q1'RG0               (Frisch-Waugh-Lovell update)
+
+so a run costs O(n m k) for k extra columns instead of a full refit, and
+runs sharing the same extra columns (e.g. one conditioning SNP for every
+outcome) share the update. Outcomes are fitted together as columns of Y.
+
+Runs spec (TSV, one row per run):
+  outcome    phenotype column of --pheno
+  run_id     label
+  assoc      output path (PLINK-format .assoc.linear, as eqtl_linear writes)
+  condition  optional: comma-separated rsIDs (= --condition / --condition-list)
+  expr       optional: comma-separated --pheno columns used as covariates
+             (= the expr_<GENE> column of make_covar_plus_expr.py)
+Any other columns are passed through to --runs-out together with assoc,
+which gives the runs.tsv the summarizers and the R grid plots read.
+
+Statistics match eqtl_linear.py run by run (same missing-sample, VIF and
+collinearity rules; check_cond_grid.py compares the two on a synthetic grid);
+an existing non-empty assoc is kept unless --force.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bim_index import open_index
+from eqtl_linear import (align_to_fam, assoc_frame, base_covariates, condition_dosages,
+                         covariate_rank, fit_one_snp, ols_from_residuals,
+                         read_pheno_table, window_genotypes, write_assoc_linear)
+from plink_bed import BedReader, read_fam
+
+SPEC_COLS = ["outcome", "run_id", "assoc"]
+ENGINE_COLS = ["condition", "expr"]
+NONE_TOKENS = ("", "NA", "na", "none", "-")
+
+
+def _split(raw: object) -> Tuple[str, ...]:
+    if raw is None or (isinstance(raw, float) and np.isnan(raw)) or str(raw).strip() in NONE_TOKENS:
+        return ()
+    return tuple(t.strip() for t in str(raw).split(",") if t.strip())
+
+
+def read_runs_spec(path: str) -> pd.DataFrame:
+    spec = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+    miss = [c for c in SPEC_COLS if c not in spec.columns]
+    if miss:
+        raise SystemExit(f"[ERR] runs spec missing columns {miss}: {path}")
+    for c in ENGINE_COLS:
+        if c not in spec.columns:
+            spec[c] = ""
+    return spec
+
+
+class BaseFit:
+    """Base covariates factorized on one sample set, and the window residualized on them."""
+
+    def __init__(self, C0: np.ndarray, G: np.ndarray):
+        self.C0 = C0
+        self.Q, _ = np.linalg.qr(C0)
+        self.miss = np.isnan(G)
+        self.complete = np.flatnonzero(~self.miss.any(axis=0))
+        self.G = G[:, self.complete].astype(np.float64)
+        self.RG = self.project_out(self.G)
+
+    def project_out(self, X: np.ndarray) -> np.ndarray:
+        return X - self.Q @ (self.Q.T @ X)
+
+
+def conditional_assoc(base: BaseFit, G: np.ndarray, Y: np.ndarray, Z: np.ndarray,
+                      max_vif: float = 50.0) -> Tuple[np.ndarray, ...]:
+    """NMISS/BETA/STAT/P (m, p) of Y ~ g + C0 + Z for every window SNP g.
+
+    base holds C0 and the window G on the same samples as Y (n, p) and
+    Z (n, k); all three must be complete there.
+    """
+    n, p = Y.shape
+    m = G.shape[1]
+    nmiss = np.full((m, p), n, dtype=np.int64)
+    beta = np.full((m, p), np.nan)
+    stat = np.full((m, p), np.nan)
+    pval = np.full((m, p), np.nan)
+
+    C = np.column_stack([base.C0, Z]) if Z.shape[1] else base.C0
+    k = covariate_rank(C)
+    if k < C.shape[1]:
+        print("[WARN] covariates are collinear; all SNPs NA", file=sys.stderr)
+        return nmiss, beta, stat, pval
+
+    RY = base.project_out(Y)
+    RG = base.RG
+    if Z.shape[1]:
+        # second pass keeps Q1 orthogonal to Q0 when Z is close to the base span
+        Q1, _ = np.linalg.qr(base.project_out(base.project_out(Z)))
+        RY = RY - Q1 @ (Q1.T @ RY)
+        RG = RG - Q1 @ (Q1.T @ RG)
+
+    df = n - k - 1
+    cpl = base.complete
+    if len(cpl) and df > 0:
+        beta[cpl], stat[cpl], pval[cpl] = ols_from_residuals(RY, RG, base.G, df, max_vif)
+
+    # SNPs with missing calls: refit on their own sample subset, as eqtl_linear
+    for j in np.flatnonzero(base.miss.any(axis=0)):
+        keep = ~base.miss[:, j]
+        nmiss[j] = int(keep.sum())
+        beta[j], stat[j], pval[j] = fit_one_snp(Y[keep], G[keep, j], C[keep], max_vif)
+    return nmiss, beta, stat, pval
+
+
+def run_grid(bfile: str, chrom: str, from_bp: int, to_bp: int, pheno: str,
+             covar: str, covar_names: Sequence[str], spec: pd.DataFrame,
+             keep_allele_order: bool = False, max_vif: float = 50.0) -> Dict[int, pd.DataFrame]:
+    """assoc.linear frame per spec row index."""
+    fam = read_fam(bfile)
+    index = open_index(bfile)
+    bed = BedReader(bfile, n_samples=len(fam), n_variants=index.n)
+
+    win, geno, a1 = window_genotypes(bed, index, fam, chrom, from_bp, to_bp, keep_allele_order)
+    Gt = geno.T                                                   # (n_fam, m)
+    C0 = base_covariates(fam, covar, covar_names)
+
+    # one pheno parse for every outcome and expression covariate
+    conds = [_split(x) for x in spec["condition"]]
+    exprs = [_split(x) for x in spec["expr"]]
+    cols = sorted(set(spec["outcome"]) | {g for e in exprs for g in e})
+    P = align_to_fam(fam, read_pheno_table(pheno, cols), cols)
+    pcol = {c: i for i, c in enumerate(cols)}
+    snps = sorted({s for c in conds for s in c})
+    D = condition_dosages(bed, index, snps).T if snps else np.empty((len(fam), 0))
+    dcol = {s: i for i, s in enumerate(snps)}
+
+    # runs sharing their extra columns and sample set are fitted together
+    groups: Dict[Tuple, List[int]] = {}
+    for i, (outcome, cond, expr) in enumerate(zip(spec["outcome"], conds, exprs)):
+        Z = np.column_stack([D[:, [dcol[s] for s in cond]], P[:, [pcol[g] for g in expr]]])
+        use = np.isfinite(P[:, pcol[outcome]]) & np.isfinite(C0).all(axis=1) & np.isfinite(Z).all(axis=1)
+        groups.setdefault((cond, expr, use.tobytes()), []).append(i)
+
+    bases: Dict[bytes, BaseFit] = {}
+    out: Dict[int, pd.DataFrame] = {}
+    for (cond, expr, key), rows in groups.items():
+        samples = np.flatnonzero(np.frombuffer(key, dtype=bool))
+        if key not in bases:
+            bases[key] = BaseFit(C0[samples], Gt[samples])
+        Z = np.column_stack([D[np.ix_(samples, [dcol[s] for s in cond])],
+                             P[np.ix_(samples, [pcol[g] for g in expr])]])
+        outcomes = [spec["outcome"].iat[i] for i in rows]
+        Y = P[np.ix_(samples, [pcol[o] for o in outcomes])]
+        nmiss, beta, stat, pval = conditional_assoc(bases[key], Gt[samples], Y, Z, max_vif)
+        for o, i in enumerate(rows):
+            stats = pd.DataFrame({"NMISS": nmiss[:, o], "BETA": beta[:, o],
+                                  "STAT": stat[:, o], "P": pval[:, o]})
+            out[i] = assoc_frame(win, a1, stats)
+    print(f"  [OK] {len(spec)} runs, {len(groups)} updates on {len(bases)} base fit(s), "
+          f"{len(win)} SNPs", file=sys.stderr)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="cross-conditional window runs from one base fit")
+    ap.add_argument("--bfile", required=True)
+    ap.add_argument("--chr", required=True, dest="chrom")
+    ap.add_argument("--from-bp", type=int, required=True)
+    ap.add_argument("--to-bp", type=int, required=True)
+    ap.add_argument("--pheno", required=True)
+    ap.add_argument("--covar", default=None)
+    ap.add_argument("--covar-name", nargs="+", default=[])
+    ap.add_argument("--runs", required=True, help="runs spec TSV (see module docstring)")
+    ap.add_argument("--runs-out", default=None, help="write runs.tsv (spec minus condition/expr)")
+    ap.add_argument("--keep-allele-order", action="store_true")
+    ap.add_argument("--vif", type=float, default=50.0)
+    ap.add_argument("--force", action="store_true", help="recompute existing assoc files")
+    args = ap.parse_args()
+
+    spec = read_runs_spec(args.runs)
+    todo = spec if args.force else spec[[not (os.path.exists(p) and os.path.getsize(p) > 0)
+                                         for p in spec["assoc"]]]
+    for _, r in spec.drop(todo.index).iterrows():
+        print(f"[SKIP] {r['outcome']} {r['run_id']}")
+
+    if len(todo):
+        res = run_grid(args.bfile, args.chrom, args.from_bp, args.to_bp, args.pheno,
+                       args.covar, args.covar_name, todo.reset_index(drop=True),
+                       keep_allele_order=args.keep_allele_order, max_vif=args.vif)
+        for i, path in enumerate(todo["assoc"]):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            write_assoc_linear(res[i], path)
+            print(f"[OK] {path}")
+
+    if args.runs_out:
+        spec.drop(columns=ENGINE_COLS).to_csv(args.runs_out, sep="\t", index=False)
+        print(f"[OK] runs: {args.runs_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""In-process replacement for `plink --linear hide-covar` on a bp window.
+
+The window's genotypes are read from a memory-mapped .bed, the phenotype and
+the genotype block are residualized on the covariates (plus any --condition
+SNPs) once, and BETA/STAT/P for every SNP come from a few matrix products
+(Frisch-Waugh-Lovell). The output is a PLINK-format <out>.assoc.linear, so
+finemap/locuszoom/summarize read it unchanged.
+
+PLINK behaviour kept on purpose:
+  - A1 is the minor allele among founders unless --keep-allele-order
+  - samples with a missing genotype are dropped per SNP (NMISS varies)
+  - SNPs failing the VIF check (default 50, e.g. the --condition SNP itself)
+    or with no variance print NA
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.special import stdtr
+
+from bim_index import BimIndex, open_index
+from pheno_store import MISSING_VALUES, read_pheno, store_enabled
+from plink_bed import BedReader, a1_is_major, founder_mask, read_fam
+
+ASSOC_HEADER = ["CHR", "SNP", "BP", "A1", "TEST", "NMISS", "BETA", "STAT", "P"]
+
+
+# ---------------------------------------------------------------- inputs
+
+def read_sample_table(path: str, columns: Sequence[str]) -> pd.DataFrame:
+    """FID/IID + `columns` from a PLINK --pheno/--covar style table (float, NaN = missing)."""
+    header = pd.read_csv(path, sep=r"\s+", nrows=0).columns
+    miss = [c for c in list(columns) + ["FID", "IID"] if c not in header]
+    if miss:
+        raise SystemExit(f"[ERR] columns not found in {path}: {miss}")
+    df = pd.read_csv(path, sep=r"\s+", usecols=["FID", "IID"] + list(columns),
+                     dtype={"FID": str, "IID": str}, na_values=MISSING_VALUES,
+                     keep_default_na=True, engine="c")
+    for c in columns:
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype(np.float64)
+    return df.drop_duplicates(subset=["FID", "IID"], keep="first")
+
+
+def read_pheno_table(path: str, columns: Sequence[str]) -> pd.DataFrame:
+    """read_sample_table for --pheno files, served from the binary pheno store."""
+    if not store_enabled():
+        return read_sample_table(path, columns)
+    try:
+        df = read_pheno(path, columns)
+    except KeyError as e:
+        raise SystemExit(f"[ERR] columns not found in {path}: {e.args[0]}")
+    return df.drop_duplicates(subset=["FID", "IID"], keep="first")
+
+
+def read_condition_list(path: str) -> List[str]:
+    with open(path) as f:
+        return [tok for line in f for tok in line.split()[:1]]
+
+
+def align_to_fam(fam: pd.DataFrame, table: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """(n_fam, len(columns)) values of `table` in .fam order, NaN where absent."""
+    keyed = table.set_index(["FID", "IID"])[list(columns)]
+    idx = pd.MultiIndex.from_frame(fam[["FID", "IID"]])
+    return keyed.reindex(idx).to_numpy(dtype=np.float64)
+
+
+# ---------------------------------------------------------------- maths
+
+def residualize(C: np.ndarray, X: np.ndarray) -> np.ndarray:
+    """X minus its projection on the column space of C (QR, no normal equations)."""
+    Q, _ = np.linalg.qr(C)
+    return X - Q @ (Q.T @ X)
+
+
+def covariate_rank(C: np.ndarray) -> int:
+    return int(np.linalg.matrix_rank(C))
+
+
+def ols_from_residuals(ry: np.ndarray, RG: np.ndarray, G: np.ndarray, df: int,
+                       max_vif: float = 50.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """BETA/STAT/P of y ~ g + C for every column g of G, given residuals on C.
+
+    ry: (n,) or (n, p) residualized phenotype(s); RG: (n, m) residualized
+    genotypes; G: (n, m) raw genotypes (for the VIF check). Returns arrays of
+    shape (m,) or (m, p); NaN where PLINK prints NA.
+    """
+    sgg = np.einsum("ij,ij->j", RG, RG)
+    Gc = G - G.mean(axis=0)
+    sst = np.einsum("ij,ij->j", Gc, Gc)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vif = sst / sgg
+    ok = (sst > 0) & (sgg > 0) & np.isfinite(vif) & (vif <= max_vif)
+
+    sgy = RG.T @ ry
+    syy = np.einsum("i...,i...->...", ry, ry)
+    if sgy.ndim == 2:
+        sgg = sgg[:, None]
+        ok = ok[:, None] & np.ones(sgy.shape, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = sgy / sgg
+        rss = np.maximum(syy - beta * sgy, 0.0)
+        se = np.sqrt(rss / df / sgg)
+        stat = beta / se
+    p = 2.0 * stdtr(df, -np.abs(stat))
+
+    beta = np.where(ok, beta, np.nan)
+    stat = np.where(ok, stat, np.nan)
+    p = np.where(ok & np.isfinite(stat), p, np.nan)
+    return beta, stat, p
+
+
+def linear_assoc(y: np.ndarray, G: np.ndarray, C: np.ndarray,
+                 max_vif: float = 50.0) -> pd.DataFrame:
+    """PLINK --linear ADD rows for genotype columns G (n, m) with covariates C.
+
+    y and C must be complete; NaN in G drops that sample for that SNP only.
+    C should already contain the intercept column.
+    """
+    n, m = G.shape
+    nmiss = np.full(m, n, dtype=np.int64)
+    beta = np.full(m, np.nan)
+    stat = np.full(m, np.nan)
+    p = np.full(m, np.nan)
+
+    k = covariate_rank(C)
+    if k < C.shape[1]:
+        print("[WARN] covariates are collinear; all SNPs NA", file=sys.stderr)
+        return pd.DataFrame({"NMISS": nmiss, "BETA": beta, "STAT": stat, "P": p})
+
+    miss = np.isnan(G)
+    complete = ~miss.any(axis=0)
+    df = n - k - 1
+    if complete.any() and df > 0:
+        Gc = G[:, complete].astype(np.float64)
+        ry = residualize(C, y)
+        RG = residualize(C, Gc)
+        beta[complete], stat[complete], p[complete] = ols_from_residuals(ry, RG, Gc, df, max_vif)
+
+    # SNPs with missing calls: refit on their own sample subset (few per window)
+    for j in np.flatnonzero(~complete):
+        keep = ~miss[:, j]
+        nmiss[j] = int(keep.sum())
+        beta[j], stat[j], p[j] = fit_one_snp(y[keep], G[keep, j], C[keep], max_vif)
+
+    return pd.DataFrame({"NMISS": nmiss, "BETA": beta, "STAT": stat, "P": p})
+
+
+def fit_one_snp(y: np.ndarray, g: np.ndarray, C: np.ndarray,
+                max_vif: float = 50.0) -> Tuple[float, float, float]:
+    """BETA/STAT/P of y ~ g + C for one SNP on complete samples (NaN if C is collinear).
+
+    y may be (n, p) for several phenotypes on the same samples; values are then (p,).
+    """
+    k = covariate_rank(C)
+    df = len(y) - k - 1
+    if k < C.shape[1] or df <= 0:
+        return np.nan, np.nan, np.nan
+    g = g.reshape(-1, 1).astype(np.float64)
+    b, s, pv = ols_from_residuals(residualize(C, y), residualize(C, g), g, df, max_vif)
+    return b[0], s[0], pv[0]
+
+
+# ---------------------------------------------------------------- driver
+
+def base_covariates(fam: pd.DataFrame, covar: Optional[str], covar_names: Sequence[str]) -> np.ndarray:
+    """(n_fam, 1 + len(covar_names)) intercept + covariates in .fam order (NaN = missing)."""
+    cols = [np.ones(len(fam))]
+    if covar_names:
+        if not covar:
+            raise SystemExit("[ERR] --covar-name needs --covar")
+        cols += list(align_to_fam(fam, read_sample_table(covar, covar_names), covar_names).T)
+    return np.column_stack(cols)
+
+
+def condition_dosages(bed: BedReader, index: BimIndex, condition: Sequence[str]) -> np.ndarray:
+    """(len(condition), n_fam) A1 counts of the --condition SNPs, as .bim codes them."""
+    cond_rows = index.rows(condition)
+    absent = [s for s, r in zip(condition, cond_rows) if r < 0]
+    if absent:
+        raise SystemExit(f"[ERR] --condition SNPs not in .bim: {absent}")
+    return bed.dosage(cond_rows).astype(np.float64)
+
+
+def window_genotypes(bed: BedReader, index: BimIndex, fam: pd.DataFrame, chrom: str,
+                     from_bp: int, to_bp: int,
+                     keep_allele_order: bool = False) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """(.bim rows, A1 counts (m, n_fam), A1 alleles) of the window, A1 = minor unless kept."""
+    win = index.bim_rows(index.window_rows(chrom, from_bp, to_bp))
+    geno = bed.dosage(win["ROW"].to_numpy())                      # (m, n_fam)
+    a1 = win["A1"].to_numpy(dtype=object).copy()
+    if not keep_allele_order:
+        swap = a1_is_major(geno, founder_mask(fam))
+        geno[swap] = 2.0 - geno[swap]
+        a1[swap] = win["A2"].to_numpy(dtype=object)[swap]
+    return win, geno, a1
+
+
+def assoc_frame(win: pd.DataFrame, a1: np.ndarray, stats: pd.DataFrame) -> pd.DataFrame:
+    """assoc.linear columns from the window rows and NMISS/BETA/STAT/P."""
+    out = pd.DataFrame({
+        "CHR": win["CHR"].to_numpy(),
+        "SNP": win["SNP"].to_numpy(),
+        "BP": win["BP"].to_numpy(),
+        "A1": a1,
+        "TEST": "ADD",
+    })
+    return pd.concat([out, stats.reset_index(drop=True)], axis=1)[ASSOC_HEADER]
+
+
+def run_window(bfile: str, chrom: str, from_bp: int, to_bp: int,
+               pheno: str, pheno_name: str, covar: Optional[str] = None,
+               covar_names: Sequence[str] = (), condition: Sequence[str] = (),
+               keep_allele_order: bool = False, max_vif: float = 50.0,
+               index: Optional[BimIndex] = None, fam: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Association for every SNP of bfile in chrom:from_bp-to_bp (assoc.linear columns)."""
+    fam = read_fam(bfile) if fam is None else fam
+    index = open_index(bfile) if index is None else index
+    bed = BedReader(bfile, n_samples=len(fam), n_variants=index.n)
+
+    y = align_to_fam(fam, read_pheno_table(pheno, [pheno_name]), [pheno_name])[:, 0]
+    C = base_covariates(fam, covar, covar_names)
+    if condition:
+        C = np.column_stack([C, condition_dosages(bed, index, condition).T])
+
+    use = np.isfinite(y) & np.isfinite(C).all(axis=1)
+    samples = np.flatnonzero(use)
+
+    win, geno, a1 = window_genotypes(bed, index, fam, chrom, from_bp, to_bp, keep_allele_order)
+    stats = linear_assoc(y[samples], geno[:, samples].T, C[samples], max_vif=max_vif)
+    return assoc_frame(win, a1, stats)
+
+
+def _fmt_g4(x: float) -> str:
+    return "NA" if not np.isfinite(x) else f"{x:.4g}"
+
+
+def write_assoc_linear(df: pd.DataFrame, path: str) -> None:
+    """Write rows in PLINK 1.9's fixed-width --linear layout."""
+    w = max([10] + [len(s) for s in df["SNP"]]) + 1
+    with open(path, "w") as f:
+        f.write(f" CHR {'SNP':>{w}}         BP   A1       TEST    NMISS       BETA         STAT            P \n")
+        for r in zip(df["CHR"], df["SNP"], df["BP"], df["A1"], df["TEST"],
+                     df["NMISS"], df["BETA"], df["STAT"], df["P"]):
+            f.write(f"{r[0]:>4} {r[1]:>{w}} {r[2]:>10} {r[3]:>4} {r[4]:>10} {r[5]:>8} "
+                    f"{_fmt_g4(r[6]):>10} {_fmt_g4(r[7]):>12} {_fmt_g4(r[8]):>12}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="plink --linear hide-covar for one window, in NumPy")
+    ap.add_argument("--bfile", required=True)
+    ap.add_argument("--chr", required=True, dest="chrom")
+    ap.add_argument("--from-bp", type=int, required=True)
+    ap.add_argument("--to-bp", type=int, required=True)
+    ap.add_argument("--pheno", required=True)
+    ap.add_argument("--pheno-name", required=True)
+    ap.add_argument("--covar", default=None)
+    ap.add_argument("--covar-name", nargs="+", default=[])
+    cond = ap.add_mutually_exclusive_group()
+    cond.add_argument("--condition", default=None, help="rsID to add as a covariate")
+    cond.add_argument("--condition-list", default=None, help="file of rsIDs to add as covariates")
+    ap.add_argument("--keep-allele-order", action="store_true")
+    ap.add_argument("--vif", type=float, default=50.0)
+    ap.add_argument("--out", required=True, help="output prefix (writes <out>.assoc.linear)")
+    args = ap.parse_args()
+
+    if args.condition:
+        condition = [args.condition]
+    elif args.condition_list:
+        condition = read_condition_list(args.condition_list)
+    else:
+        condition = []
+
+    res = run_window(args.bfile, args.chrom, args.from_bp, args.to_bp,
+                     args.pheno, args.pheno_name, args.covar, args.covar_name,
+                     condition=condition, keep_allele_order=args.keep_allele_order,
+                     max_vif=args.vif)
+    out = args.out + ".assoc.linear"
+    write_assoc_linear(res, out)
+    print(f"[OK] wrote {out} (n_snps={len(res)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,33 @@
 #!/usr/bin/env python3
 import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
 import numpy as np
 import pandas as pd
 
-def logsumexp(a: np.ndarray) -> float:
-    m = np.nanmax(a)
-    if not np.isfinite(m):
-        return float("nan")
-    return float(m + np.log(np.nansum(np.exp(a - m))))
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="inp", required=True, help="PLINK .assoc.linear")
-    ap.add_argument("--out", dest="out", required=True, help="output pip table tsv")
-    ap.add_argument("--prefix", dest="prefix", required=True, help="prefix for credible set")
-    ap.add_argument("--prior-sd", dest="prior_sd", type=float, required=True, help="prior SD in phenotype units")
-    ap.add_argument("--credible", dest="credible", type=float, default=0.95, help="credible set threshold")
-    args = ap.parse_args()
+from assoc_io import read_assoc_linear
 
-    df = pd.read_csv(args.inp, sep=r"\s+|\t", engine="python", dtype=str)
-    # normalize columns
-    for col in ["CHR","SNP","BP","A1","TEST","NMISS","BETA","STAT","P"]:
-        if col not in df.columns:
-            raise SystemExit(f"[ERR] missing column {col} in {args.inp}")
+OUT_COLS = ["SNP","CHR","BP","A1","BETA","SE","STAT","P","logABF","ABF","PIP","CUM_PIP"]
+SENS_COLS = ["prior_mult","label","lead_snp","prior_sd","lead_pip","top_snp","top_pip","credible_n"]
 
-    # keep ADD only if present
-    if "TEST" in df.columns:
-        df = df[df["TEST"] == "ADD"].copy()
+def logsumexp_rows(a: np.ndarray) -> np.ndarray:
+    # row-wise logsumexp of a (priors x SNPs) matrix; NaN for an all-NaN/-inf row
+    if a.shape[1] == 0:
+        return np.full(a.shape[0], np.nan)
+    m = np.nanmax(a, axis=1)
+    with np.errstate(invalid="ignore"):
+        lse = m + np.log(np.nansum(np.exp(a - m[:, None]), axis=1))
+    return np.where(np.isfinite(m), lse, np.nan)
 
-    # numeric
-    for c in ["CHR","BP","NMISS","BETA","STAT","P"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
+def load_assoc(path: str) -> pd.DataFrame:
+    df = read_assoc_linear(path, test="ADD",
+                           columns=["CHR","SNP","BP","A1","BETA","STAT","P"])
+    for col in ["CHR","SNP","BP","A1","BETA","STAT","P"]:
+        if col not in df.columns:
+            raise SystemExit(f"[ERR] missing column {col} in {path}")
 
     # drop rows where plink prints NA for conditioned SNPs etc.
     df = df.dropna(subset=["SNP","CHR","BP","A1","BETA","STAT","P"])
@@ -43,41 +40,228 @@ def main():
 
     # Z
     df["Z"] = df["BETA"] / df["SE"]
+    return df.reset_index(drop=True)
 
-    W = float(args.prior_sd) ** 2
-    V = df["SE"].values ** 2
+def log_abf_matrix(z: np.ndarray, se: np.ndarray, prior_sds: np.ndarray) -> np.ndarray:
+    # (priors x SNPs); each row is contiguous so row reductions match the 1-D path
+    W = np.asarray(prior_sds, dtype=float)[:, None] ** 2
+    V = np.asarray(se, dtype=float)[None, :] ** 2
     r = W / V
-
-    z = df["Z"].values
+    zz = (np.asarray(z, dtype=float) ** 2)[None, :]
     # Wakefield log(ABF): -0.5*log(1+r) + (z^2*r)/(2*(1+r))
-    logabf = -0.5 * np.log1p(r) + (z*z*r) / (2.0*(1.0 + r))
-    df["logABF"] = logabf
+    return -0.5 * np.log1p(r) + (zz*r) / (2.0*(1.0 + r))
+
+def pip_matrix(logabf: np.ndarray) -> np.ndarray:
+    return np.exp(logabf - logsumexp_rows(logabf)[:, None])
 
-    lse = logsumexp(logabf)
-    pip = np.exp(logabf - lse)
-    df["PIP"] = pip
+def pip_table(df: pd.DataFrame, logabf: np.ndarray, pip: np.ndarray) -> pd.DataFrame:
+    d = df.copy()
+    d["logABF"] = logabf
+    d["PIP"] = pip
 
     # sort by PIP desc
-    df = df.sort_values("PIP", ascending=False).reset_index(drop=True)
-    df["CUM_PIP"] = df["PIP"].cumsum()
+    d = d.sort_values("PIP", ascending=False).reset_index(drop=True)
+    d["CUM_PIP"] = d["PIP"].cumsum()
 
     # ABF (optional) - clip to avoid inf printing mess, but PIP uses logABF anyway
-    df["ABF"] = np.exp(np.clip(df["logABF"].values, -700, 700))
+    d["ABF"] = np.exp(np.clip(d["logABF"].values, -700, 700))
+    return d
 
-    out_cols = ["SNP","CHR","BP","A1","BETA","SE","STAT","P","logABF","ABF","PIP","CUM_PIP"]
-    df[out_cols].to_csv(args.out, sep="\t", index=False)
-
-    cred = df[df["CUM_PIP"] <= args.credible].copy()
+def credible_set(d: pd.DataFrame, level: float) -> pd.DataFrame:
+    cred = d[d["CUM_PIP"] <= level].copy()
     # ensure the first row that crosses threshold is included
-    if len(df) > 0 and (len(cred) == 0 or cred["CUM_PIP"].max() < args.credible):
-        k = int(np.searchsorted(df["CUM_PIP"].values, args.credible, side="left"))
-        cred = df.iloc[:k+1].copy()
+    if len(d) > 0 and (len(cred) == 0 or cred["CUM_PIP"].max() < level):
+        k = int(np.searchsorted(d["CUM_PIP"].values, level, side="left"))
+        cred = d.iloc[:k+1].copy()
+    return cred
+
+def write_outputs(d: pd.DataFrame, cred: pd.DataFrame, out_pip: str, prefix: str) -> str:
+    d[OUT_COLS].to_csv(out_pip, sep="\t", index=False)
+    cred_path = f"{prefix}_credible95.tsv"
+    cred[OUT_COLS].to_csv(cred_path, sep="\t", index=False)
+    return cred_path
+
+def sensitivity_row(mult: str, label: str, lead: str, prior_sd: float,
+                    d: pd.DataFrame, cred: pd.DataFrame) -> List[str]:
+    # same fields the old awk pip_stats_line read back from the written tables
+    hit = d.loc[d["SNP"] == lead, "PIP"]
+    lead_pip = repr(float(hit.iloc[0])) if len(hit) else "NA"
+    top_snp = str(d["SNP"].iloc[0]) if len(d) else ""
+    top_pip = repr(float(d["PIP"].iloc[0])) if len(d) else ""
+    return [mult, label, lead, repr(float(prior_sd)), lead_pip, top_snp, top_pip, str(len(cred))]
+
+def split_list(raw: str) -> List[str]:
+    return [x for x in re.split(r"[,\s]+", raw.strip()) if x]
+
+def prior_grid(mult_raw: Optional[str], sd_raw: Optional[str],
+               pheno_sd: Optional[float]) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+    # returns (subdir tags, prior_mult labels, prior SDs)
+    if mult_raw:
+        if pheno_sd is None:
+            raise SystemExit("[ERR] prior multipliers need a phenotype SD (--pheno-sd / pheno_sd)")
+        mults = split_list(mult_raw)
+        sds = np.array([float(pheno_sd) * float(m) for m in mults])
+        return [f"mult_{m.replace('.', 'p')}" for m in mults], list(mults), sds
+    vals = split_list(sd_raw or "")
+    return [f"sd_{v.replace('.', 'p')}" for v in vals], [None] * len(vals), np.array([float(v) for v in vals])
+
+def grid_outputs(outdir: str, tags: List[str], label: str, summary_only: bool):
+    if summary_only:
+        return [None] * len(tags)
+    return [(os.path.join(outdir, t, f"{label}_pip.tsv"), os.path.join(outdir, t, label)) for t in tags]
+
+def finemap_priors(inp: str, sds: np.ndarray, credible: float, outputs, label: str = "",
+                   lead: Optional[str] = None, mults: Optional[List[Optional[str]]] = None) -> List[List[str]]:
+    # outputs[i]: (pip_tsv, credible prefix) for prior i, or None to skip the tables
+    df = load_assoc(inp)
+    # all priors at once: one (priors x SNPs) logABF/PIP matrix
+    logabf = log_abf_matrix(df["Z"].values, df["SE"].values, sds)
+    pip = pip_matrix(logabf)
+
+    rows = []
+    for i in range(len(sds)):
+        d = pip_table(df, logabf[i], pip[i])
+        cred = credible_set(d, credible)
+        if outputs[i] is not None:
+            out_pip, prefix = outputs[i]
+            os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+            write_outputs(d, cred, out_pip, prefix)
+        mult = mults[i] if mults and mults[i] is not None else "NA"
+        rows.append(sensitivity_row(mult, label, lead or "NA", sds[i], d, cred))
+    return rows
+
+def append_summary(path: str, rows: List[List[str]]) -> None:
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a") as f:
+        if new:
+            f.write("\t".join(SENS_COLS) + "\n")
+        for r in rows:
+            f.write("\t".join(r) + "\n")
+
+def read_manifest(path: str, outdir: str, credible: float, summary_only: bool) -> List[dict]:
+    """Manifest TSV -> fine-mapping jobs.
+
+    Columns: label, assoc (required); prior_sd (one value -> <outdir>/<label>_*,
+    several -> <outdir>/sd_<sd>/) or prior_mult + pheno_sd (-> <outdir>/mult_<m>/);
+    optional credible, lead.
+    """
+    m = pd.read_csv(path, sep="\t", dtype=str, comment="#").fillna("")
+    for c in ["label", "assoc"]:
+        if c not in m.columns:
+            raise SystemExit(f"[ERR] manifest missing column '{c}': {path}")
+
+    jobs = []
+    for r in m.to_dict("records"):
+        label = r["label"].strip()
+        mult_raw = r.get("prior_mult", "").strip()
+        sd_raw = r.get("prior_sd", "").strip()
+        pheno_sd = r.get("pheno_sd", "").strip()
+        if not mult_raw and not sd_raw:
+            raise SystemExit(f"[ERR] manifest row {label}: needs prior_sd or prior_mult+pheno_sd")
+
+        tags, mults, sds = prior_grid(mult_raw, sd_raw, float(pheno_sd) if pheno_sd else None)
+        if not mult_raw and len(sds) == 1:
+            prefix = os.path.join(outdir, label)
+            outputs = [None if summary_only else (f"{prefix}_pip.tsv", prefix)]
+        else:
+            outputs = grid_outputs(outdir, tags, label, summary_only)
+
+        jobs.append({
+            "label": label,
+            "assoc": r["assoc"].strip(),
+            "sds": sds,
+            "mults": mults,
+            "outputs": outputs,
+            "credible": float(r["credible"]) if r.get("credible", "").strip() else credible,
+            "lead": r.get("lead", "").strip() or None,
+        })
+    return jobs
+
+def run_job(job: dict) -> Tuple[str, List[List[str]]]:
+    rows = finemap_priors(job["assoc"], job["sds"], job["credible"], job["outputs"],
+                          job["label"], job["lead"], job["mults"])
+    return job["label"], rows
+
+def run_manifest(args) -> None:
+    if not args.outdir:
+        raise SystemExit("[ERR] --manifest needs --outdir")
+    if args.summary_only and not args.summary:
+        raise SystemExit("[ERR] --summary-only needs --summary")
+    jobs = read_manifest(args.manifest, args.outdir, args.credible, args.summary_only)
+    if not jobs:
+        raise SystemExit(f"[ERR] empty manifest: {args.manifest}")
+
+    # one interpreter + pandas import for every locus; loci fan out over a process pool
+    n_jobs = args.jobs if args.jobs > 0 else min(len(jobs), os.cpu_count() or 1)
+    if n_jobs <= 1:
+        results = [run_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            results = list(ex.map(run_job, jobs, chunksize=max(1, len(jobs) // (n_jobs * 4))))
+
+    for label, rows in results:
+        print(f"[OK] {label}: {len(rows)} priors (credible n={rows[0][-1] if rows else 'NA'})")
+    if args.summary:
+        append_summary(args.summary, [r for _, rows in results for r in rows])
+        print(f"[OK] appended to {args.summary}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", help="PLINK .assoc.linear")
+    ap.add_argument("--out", dest="out", help="output pip table tsv (single prior)")
+    ap.add_argument("--prefix", dest="prefix", help="prefix for credible set (single prior)")
+    ap.add_argument("--credible", dest="credible", type=float, default=0.95, help="credible set threshold")
+
+    pg = ap.add_mutually_exclusive_group()
+    pg.add_argument("--prior-sd", dest="prior_sd", type=float, help="prior SD in phenotype units")
+    pg.add_argument("--prior-sd-list", dest="prior_sd_list",
+                    help="comma/space-separated prior SDs; writes <outdir>/sd_<sd>/")
+    pg.add_argument("--prior-mult-list", dest="prior_mult_list",
+                    help="comma/space-separated SD multipliers (with --pheno-sd); writes <outdir>/mult_<m>/")
+    ap.add_argument("--pheno-sd", dest="pheno_sd", type=float, default=None, help="phenotype SD for --prior-mult-list")
+
+    ap.add_argument("--manifest", default=None,
+                    help="batch mode: TSV with label, assoc, prior_sd | prior_mult+pheno_sd [, credible, lead]")
+    ap.add_argument("--jobs", type=int, default=0, help="batch mode worker processes (0 = one per CPU)")
+
+    ap.add_argument("--outdir", default=None, help="output root (list and batch modes)")
+    ap.add_argument("--label", default=None, help="output file label, e.g. ERAP1_sig1 (list modes)")
+    ap.add_argument("--lead", default=None, help="lead SNP reported in the sensitivity summary")
+    ap.add_argument("--summary", default=None, help="append prior_sensitivity_summary rows here")
+    ap.add_argument("--summary-only", action="store_true", help="skip per-prior tables (dense grids)")
+    args = ap.parse_args()
+
+    if args.manifest:
+        if args.inp or args.prior_sd is not None or args.prior_sd_list or args.prior_mult_list:
+            raise SystemExit("[ERR] --manifest replaces --in and the prior options")
+        run_manifest(args)
+        return
+    if not args.inp:
+        raise SystemExit("[ERR] need --in (or --manifest)")
+
+    if args.prior_sd is not None:
+        if not args.out or not args.prefix:
+            raise SystemExit("[ERR] --prior-sd needs --out and --prefix")
+        rows = finemap_priors(args.inp, np.array([args.prior_sd]), args.credible, [(args.out, args.prefix)])
+        print(f"[OK] wrote {args.out}")
+        print(f"[OK] wrote {args.prefix}_credible95.tsv (n={rows[0][-1]})")
+        return
+
+    if not args.prior_sd_list and not args.prior_mult_list:
+        raise SystemExit("[ERR] need one of --prior-sd, --prior-sd-list, --prior-mult-list")
+    if not args.label or (not args.outdir and not args.summary_only):
+        raise SystemExit("[ERR] list modes need --label and --outdir")
+    if args.summary_only and not args.summary:
+        raise SystemExit("[ERR] --summary-only needs --summary")
 
-    cred_path = f"{args.prefix}_credible95.tsv"
-    cred[out_cols].to_csv(cred_path, sep="\t", index=False)
+    tags, mults, sds = prior_grid(args.prior_mult_list, args.prior_sd_list, args.pheno_sd)
+    outputs = grid_outputs(args.outdir or "", tags, args.label, args.summary_only)
+    rows = finemap_priors(args.inp, sds, args.credible, outputs, args.label, args.lead, mults)
 
-    print(f"[OK] wrote {args.out}")
-    print(f"[OK] wrote {cred_path} (n={cred.shape[0]})")
+    if args.summary:
+        append_summary(args.summary, rows)
+        print(f"[OK] appended {len(rows)} rows to {args.summary}")
+    print(f"[OK] {args.label}: {len(tags)} priors")
 
 if __name__ == "__main__":
     main()
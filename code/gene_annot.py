@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""On-disk gene annotation store built once from a GTF (gene records only).
+
+Built into <gtf>.genes.idx/ (or GENE_ANNOT_DIR=<dir>) as .npy arrays that
+are memory-mapped on open:
+
+  chr/start/end/strand/tss.npy   one entry per gene record, GTF order
+  gene.npy                       upper-case gene_name per record
+  names.npy, name_row.npy        upper-case gene_name sorted for searchsorted,
+                                 and the row it maps to (last record wins,
+                                 like the old dict-based loader)
+  iv_row.npy                     rows sorted by (chr, start): per-chromosome
+                                 interval index, chromosome slices in meta.json
+
+Chromosome names drop a leading "chr" so they compare with .bim CHR.
+meta.json records the GTF SHA-1 (plus size/mtime as a fast path); the store
+is rebuilt only when the content changes. Builds hold an exclusive flock on
+<store>.lock and readers open under a shared one (bim_index.dir_lock), so
+a store is never replaced while another step is opening it.
+
+CLI:
+  gene_annot.py build  GTF
+  gene_annot.py lookup GTF GENE [GENE ...]
+  gene_annot.py window GTF CHR FROM TO      (genes overlapping the range)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, Tuple
+
+import numpy as np
+
+from assoc_io import file_sha1, file_stat, sidecar_state
+from bim_index import dir_lock, staged_dir
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas is imported lazily, as in bim_index: opening the store and the
+# vectorized lookups only need numpy.
+
+STORE_SUFFIX = ".genes.idx"
+STORE_VERSION = 1
+ARRAYS = ["chr", "start", "end", "strand", "tss", "gene", "names", "name_row", "iv_row"]
+
+
+def store_dir(gtf: str) -> str:
+    root = os.environ.get("GENE_ANNOT_DIR", "").strip()
+    if root:
+        return os.path.join(root, os.path.basename(gtf) + STORE_SUFFIX)
+    return gtf + STORE_SUFFIX
+
+
+def _stat_key(path: str) -> Dict[str, object]:
+    return dict(file_stat(path), version=STORE_VERSION)
+
+
+def _read_meta(path: str):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def parse_gtf_genes(gtf: str):
+    """DataFrame chr/start/end/strand/name of `gene` records (GTF order)."""
+    import pandas as pd
+
+    df = pd.read_csv(gtf, sep="\t", header=None, comment="#", usecols=[0, 2, 3, 4, 6, 8],
+                     names=["chr", "feature", "start", "end", "strand", "attrs"],
+                     dtype={"chr": str, "feature": str, "strand": str, "attrs": str},
+                     engine="c", quoting=3, encoding_errors="ignore")
+    df = df[df["feature"] == "gene"]
+    df = df.assign(name=df["attrs"].str.extract(r'(?:^|;)\s*gene_name[^"]*"([^"]*)"', expand=False))
+    df = df[df["name"].notna() & (df["name"] != "")]
+    df["chr"] = df["chr"].str.replace("chr", "", n=1, regex=False)
+    df["name"] = df["name"].str.upper()
+    return df[["chr", "start", "end", "strand", "name"]].reset_index(drop=True)
+
+
+def build_store(gtf: str, sha1: str = "") -> str:
+    """(Re)build the store for gtf; returns the store directory.
+
+    Call with the exclusive lock held (open_store does).
+    """
+    key = _stat_key(gtf)
+    sha1 = sha1 or file_sha1(gtf)
+    genes = parse_gtf_genes(gtf)
+
+    chr_ = genes["chr"].to_numpy().astype(bytes)
+    start = genes["start"].to_numpy(dtype=np.int64)
+    end = genes["end"].to_numpy(dtype=np.int64)
+    strand = genes["strand"].to_numpy().astype(bytes)
+    tss = np.where(strand == b"+", start, end)
+
+    # last record per name wins: stable sort, then keep the last of each run
+    names = genes["name"].to_numpy().astype(bytes)
+    order = np.argsort(names, kind="stable")
+    sorted_names = names[order]
+    last = np.r_[sorted_names[1:] != sorted_names[:-1], True]
+
+    iv_row = np.lexsort((start, chr_))
+    chr_sorted = chr_[iv_row]
+    bounds = np.flatnonzero(np.r_[True, chr_sorted[1:] != chr_sorted[:-1], True])
+    chroms = {chr_sorted[lo].decode(): [int(lo), int(hi)] for lo, hi in zip(bounds[:-1], bounds[1:])}
+
+    out = store_dir(gtf)
+    arrays = {"chr": chr_, "start": start, "end": end, "strand": strand, "tss": tss, "gene": names,
+              "names": sorted_names[last], "name_row": order[last].astype(np.int64),
+              "iv_row": iv_row.astype(np.int64)}
+    max_len = int((end - start).max()) + 1 if len(start) else 0
+    with staged_dir(out) as tmp:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(dict(key, sha1=sha1, n=int(len(genes)), max_len=max_len, chroms=chroms), f)
+    return out
+
+
+class GeneStore:
+    """Memory-mapped view of a built store; use open_store() to get one."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.n = len(self.chr)
+
+    def rows(self, genes: Iterable[str]) -> np.ndarray:
+        """Row per gene name (case-insensitive, -1 where absent)."""
+        q = np.char.upper(np.asarray(list(genes), dtype=str)).astype(bytes)
+        if len(q) == 0 or len(self.names) == 0:
+            return np.full(len(q), -1, dtype=np.int64)
+        pos = np.searchsorted(self.names, q)
+        pos_c = np.minimum(pos, len(self.names) - 1)
+        hit = (pos < len(self.names)) & (np.asarray(self.names[pos_c]) == q)
+        return np.where(hit, np.asarray(self.name_row[pos_c]), -1).astype(np.int64)
+
+    def gene_chr_tss(self, genes: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(chr as str, TSS as float) per gene; '' / NaN where the gene is unknown."""
+        rows = self.rows(genes)
+        found = rows >= 0
+        r = np.where(found, rows, 0)
+        chr_ = np.where(found, np.asarray(self.chr[r]).astype(str), "")
+        tss = np.where(found, np.asarray(self.tss[r], dtype=np.float64), np.nan)
+        return chr_, tss
+
+    def tss_distance(self, genes, snp_chr, bp) -> np.ndarray:
+        """|BP - TSS| where the SNP is on its gene's chromosome, NaN otherwise."""
+        gchr, tss = self.gene_chr_tss(genes)
+        snp_chr = np.asarray(snp_chr).astype(str)
+        bp = np.asarray(bp, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            return np.where(gchr == snp_chr, np.abs(bp - tss), np.nan)
+
+    def window_rows(self, chrom: str, from_bp: int, to_bp: int) -> np.ndarray:
+        """Rows of genes on chrom overlapping [from_bp, to_bp], by start."""
+        span = self.meta["chroms"].get(str(chrom).replace("chr", "", 1))
+        if span is None:
+            return np.zeros(0, dtype=np.int64)
+        lo, hi = span
+        rows = np.asarray(self.iv_row[lo:hi])
+        starts = np.asarray(self.start[rows])
+        # genes starting more than max_len before the window cannot reach it
+        a = np.searchsorted(starts, from_bp - self.meta["max_len"], side="left")
+        b = np.searchsorted(starts, to_bp, side="right")
+        cand = rows[a:b]
+        return cand[np.asarray(self.end[cand]) >= from_bp]
+
+    def records(self, rows) -> "pd.DataFrame":
+        import pandas as pd
+
+        rows = np.asarray(rows, dtype=np.int64)
+        return pd.DataFrame({
+            "gene": np.asarray(self.gene[rows]).astype(str), "chr": np.asarray(self.chr[rows]).astype(str),
+            "start": np.asarray(self.start[rows]), "end": np.asarray(self.end[rows]),
+            "strand": np.asarray(self.strand[rows]).astype(str), "tss": np.asarray(self.tss[rows]),
+        })
+
+
+def open_store(gtf: str, rebuild: bool = False) -> GeneStore:
+    """Store for gtf, building it first if missing or if the GTF content changed."""
+    path = store_dir(gtf)
+    key = _stat_key(gtf)
+    if not rebuild:
+        with dir_lock(path, exclusive=False):
+            meta = _read_meta(path)
+            if meta and all(meta.get(k) == v for k, v in key.items()):
+                return GeneStore(path)
+    with dir_lock(path, exclusive=True):
+        # re-read: another process may have built or refreshed it while we waited
+        meta = _read_meta(path)
+        if not rebuild and meta and meta.get("version") == STORE_VERSION:
+            state, sha1 = sidecar_state(meta, gtf)
+            if state == "fresh":
+                return GeneStore(path)
+            if state == "touched":
+                # content unchanged: refresh the fast-path key only
+                meta.update(key)
+                meta_path = os.path.join(path, "meta.json")
+                tmp = f"{meta_path}.tmp{os.getpid()}"
+                with open(tmp, "w") as f:
+                    json.dump(meta, f)
+                os.replace(tmp, meta_path)
+                return GeneStore(path)
+            return GeneStore(build_store(gtf, sha1))
+        return GeneStore(build_store(gtf))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="gene annotation store built from a GTF")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="(re)build the store")
+    b.add_argument("gtf")
+
+    lk = sub.add_parser("lookup", help="print gene chr start end strand tss")
+    lk.add_argument("gtf")
+    lk.add_argument("genes", nargs="+")
+
+    w = sub.add_parser("window", help="genes overlapping CHR:FROM-TO")
+    w.add_argument("gtf")
+    w.add_argument("chrom")
+    w.add_argument("from_bp", type=int)
+    w.add_argument("to_bp", type=int)
+
+    args = ap.parse_args()
+    if args.cmd == "build":
+        print(f"[OK] wrote {open_store(args.gtf, rebuild=True).path}")
+        return
+
+    store = open_store(args.gtf)
+    if args.cmd == "lookup":
+        rows = store.rows(args.genes)
+        missing = [g for g, r in zip(args.genes, rows) if r < 0]
+        df = store.records(rows[rows >= 0])
+    else:
+        missing = []
+        df = store.records(store.window_rows(args.chrom, args.from_bp, args.to_bp))
+    print(df.to_csv(sep="\t", index=False), end="")
+    if missing:
+        raise SystemExit(f"[WARN] not in {args.gtf}: {' '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
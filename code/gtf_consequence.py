@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Offline VEP-style consequences from a local GTF and the .bim alleles.
+
+Writes the same TSV as quick_vep_grch37_v2.py (write_tsv), so
+rank_candidates_from_vep37_v2.py runs unchanged, without Ensembl REST.
+
+Transcripts (exon extents), exons and CDS segments are parsed once from the
+GTF into <gtf>.tx.npz (keyed by the GTF SHA-1 like gene_annot, or under
+GENE_ANNOT_DIR). Variants are joined to features with a binned interval
+join, all in NumPy, and each (variant, transcript) pair gets a bit set of
+terms whose bit order is the Ensembl severity order:
+
+  splice_acceptor/donor     intronic 1-2 bp at a splice site       HIGH
+  frameshift_variant        CDS indel, length change % 3 != 0      HIGH
+  inframe_insertion/_deletion                                      MODERATE
+  splice_region_variant     exonic 1-3 / intronic 3-8 bp           LOW
+  coding_sequence_variant   CDS SNV (no reference sequence here)   MODIFIER
+  5'/3'_prime_UTR_variant, non_coding_transcript_exon_variant,
+  intron_variant, upstream/downstream_gene_variant (5 kb)          MODIFIER
+
+Without the reference sequence, CDS SNVs cannot be split into missense,
+synonymous or stop changes; they are reported as coding_sequence_variant.
+Per variant, most_severe_consequence spans all transcripts. gene, biotype,
+impact and consequence_terms come from one transcript, picked by impact and
+then canonical tag, as flatten_one does. Variants with no transcript within
+5 kb are intergenic_variant with empty transcript fields.
+
+Usage:
+  gtf_consequence.py --gtf GTF --bfile BFILE --rsids rsids.txt --out out.tsv
+  gtf_consequence.py --gtf GTF --bfile BFILE --window CHR FROM TO --out out.tsv
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bim_index import open_index
+from assoc_io import file_sha1, file_stat, sidecar_state
+
+STORE_SUFFIX = ".tx.npz"
+STORE_VERSION = 1
+
+FLANK = 5000          # up/downstream_gene_variant distance (VEP default)
+SPLICE_REGION = 8     # intronic splice_region extent
+BIN_BITS = 16         # 64 kb bins for the interval join
+
+# (term, impact), most severe first; the index is the term's bit
+TERMS: List[Tuple[str, str]] = [
+    ("splice_acceptor_variant", "HIGH"),
+    ("splice_donor_variant", "HIGH"),
+    ("frameshift_variant", "HIGH"),
+    ("inframe_insertion", "MODERATE"),
+    ("inframe_deletion", "MODERATE"),
+    ("splice_region_variant", "LOW"),
+    ("coding_sequence_variant", "MODIFIER"),
+    ("5_prime_UTR_variant", "MODIFIER"),
+    ("3_prime_UTR_variant", "MODIFIER"),
+    ("non_coding_transcript_exon_variant", "MODIFIER"),
+    ("intron_variant", "MODIFIER"),
+    ("upstream_gene_variant", "MODIFIER"),
+    ("downstream_gene_variant", "MODIFIER"),
+]
+BIT = {t: np.int64(1) << i for i, (t, _) in enumerate(TERMS)}
+IMPACT_RANK = {"HIGH": 4, "MODERATE": 3, "LOW": 2, "MODIFIER": 1}
+_TERM_IMPACT = np.array([IMPACT_RANK[i] for _, i in TERMS])
+
+# helper bits above the term bits (not reported)
+_EXONIC = np.int64(1) << 40
+_CDS = np.int64(1) << 41
+_TERM_MASK = (np.int64(1) << len(TERMS)) - 1
+
+
+# ---------------------------------------------------------------- GTF store
+
+def store_path(gtf: str) -> str:
+    root = os.environ.get("GENE_ANNOT_DIR", "").strip()
+    if root:
+        return os.path.join(root, os.path.basename(gtf) + STORE_SUFFIX)
+    return gtf + STORE_SUFFIX
+
+
+def _attr(attrs: pd.Series, key: str) -> pd.Series:
+    return attrs.str.extract(rf'(?:^|;)\s*{key} "([^"]*)"', expand=False)
+
+
+def parse_gtf_features(gtf: str) -> Dict[str, np.ndarray]:
+    """Transcript table (from exon extents) plus exon and CDS segments."""
+    df = pd.read_csv(gtf, sep="\t", header=None, comment="#", usecols=[0, 2, 3, 4, 6, 8],
+                     names=["chr", "feature", "start", "end", "strand", "attrs"],
+                     dtype={"chr": str, "feature": str, "strand": str, "attrs": str},
+                     engine="c", quoting=3, encoding_errors="ignore")
+    df = df[df["feature"].isin(["exon", "CDS"])]
+    df = df.assign(tx=_attr(df["attrs"], "transcript_id"))
+    df = df[df["tx"].notna()]
+
+    ex = df[df["feature"] == "exon"]
+    codes_ex, tx_ids = pd.factorize(ex["tx"])
+    n_tx = len(tx_ids)
+    head = ex[~ex["tx"].duplicated()]            # first exon record per transcript, code order
+    biotype = _attr(head["attrs"], "transcript_biotype")
+    for alt in ("transcript_type", "gene_biotype", "gene_type"):
+        biotype = biotype.fillna(_attr(head["attrs"], alt))
+    tx_chr = head["chr"].str.replace("chr", "", n=1, regex=False).to_numpy().astype(str)
+    gene = _attr(head["attrs"], "gene_name").fillna("").to_numpy().astype(str)
+    canonical = head["attrs"].str.contains('tag "Ensembl_canonical"', regex=False).to_numpy()
+    strand = np.where(head["strand"].to_numpy() == "-", -1, 1).astype(np.int8)
+
+    ex_start = ex["start"].to_numpy(dtype=np.int64)
+    ex_end = ex["end"].to_numpy(dtype=np.int64)
+    tx_start = np.full(n_tx, np.iinfo(np.int64).max)
+    tx_end = np.full(n_tx, -1, dtype=np.int64)
+    np.minimum.at(tx_start, codes_ex, ex_start)
+    np.maximum.at(tx_end, codes_ex, ex_end)
+
+    cds = df[df["feature"] == "CDS"]
+    codes_cds = tx_ids.get_indexer(cds["tx"])
+    cds = cds[codes_cds >= 0]
+    codes_cds = codes_cds[codes_cds >= 0]
+    cds_start = cds["start"].to_numpy(dtype=np.int64)
+    cds_end = cds["end"].to_numpy(dtype=np.int64)
+    cds_min = np.full(n_tx, np.iinfo(np.int64).max)
+    cds_max = np.full(n_tx, -1, dtype=np.int64)
+    np.minimum.at(cds_min, codes_cds, cds_start)
+    np.maximum.at(cds_max, codes_cds, cds_end)
+    cds_min[cds_max < 0] = -1
+
+    return {
+        "tx_id": np.asarray(tx_ids, dtype=str), "tx_chr": tx_chr, "tx_start": tx_start,
+        "tx_end": tx_end, "tx_strand": strand, "tx_gene": gene,
+        "tx_biotype": biotype.fillna("").to_numpy().astype(str),
+        "tx_canonical": canonical, "cds_min": cds_min, "cds_max": cds_max,
+        "ex_tx": codes_ex.astype(np.int64), "ex_start": ex_start, "ex_end": ex_end,
+        "cds_tx": codes_cds.astype(np.int64), "cds_start": cds_start, "cds_end": cds_end,
+    }
+
+
+def open_features(gtf: str) -> Dict[str, np.ndarray]:
+    """Parsed GTF features, from <gtf>.tx.npz when its SHA-1 still matches."""
+    path = store_path(gtf)
+    key = dict(file_stat(gtf), version=STORE_VERSION)
+    sha1 = None
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["__meta__"]))
+            if meta.get("version") == STORE_VERSION:
+                state, sha1 = sidecar_state(meta, gtf)
+                if state != "stale":
+                    return {k: z[k] for k in z.files if k != "__meta__"}
+
+    feats = parse_gtf_features(gtf)
+    meta = dict(key, sha1=sha1 or file_sha1(gtf))
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **feats)
+        os.replace(tmp, path)
+    except OSError:
+        # the store is best-effort (read-only annotation dirs)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return feats
+
+
+# ---------------------------------------------------------------- join
+
+def overlap_pairs(v_chr: np.ndarray, v_pos: np.ndarray, f_chr: np.ndarray,
+                  f_lo: np.ndarray, f_hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(variant idx, feature idx) for every f_lo <= pos <= f_hi on the same chr.
+
+    Chromosomes are integer codes. Features are exploded into the 64 kb bins
+    they cover, so the join is one sort plus searchsorted.
+    """
+    f_lo = np.maximum(f_lo, 0)
+    b0, b1 = f_lo >> BIN_BITS, f_hi >> BIN_BITS
+    nb = (b1 - b0 + 1).astype(np.int64)
+    f_idx = np.repeat(np.arange(len(f_lo)), nb)
+    within = np.arange(nb.sum()) - np.repeat(np.cumsum(nb) - nb, nb)
+    f_key = (f_chr[f_idx].astype(np.int64) << 32) | (b0[f_idx] + within)
+    order = np.argsort(f_key, kind="stable")
+    f_key, f_idx = f_key[order], f_idx[order]
+
+    v_key = (v_chr.astype(np.int64) << 32) | (v_pos >> BIN_BITS)
+    lo = np.searchsorted(f_key, v_key, side="left")
+    cnt = np.searchsorted(f_key, v_key, side="right") - lo
+    vi = np.repeat(np.arange(len(v_pos)), cnt)
+    fi = f_idx[np.repeat(lo, cnt) + np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)]
+    keep = (f_lo[fi] <= v_pos[vi]) & (v_pos[vi] <= f_hi[fi])
+    return vi[keep], fi[keep]
+
+
+def _indel_len_change(a1: np.ndarray, a2: np.ndarray) -> np.ndarray:
+    """|len(A1) - len(A2)| for ACGT alleles; 0 for SNVs and symbolic/unknown alleles."""
+    a1 = pd.Series(a1, dtype=str).str.upper()
+    a2 = pd.Series(a2, dtype=str).str.upper()
+    acgt = a1.str.fullmatch("[ACGT]+") & a2.str.fullmatch("[ACGT]+")
+    d = (a1.str.len() - a2.str.len()).abs().to_numpy()
+    return np.where(acgt.to_numpy(), d, 0)
+
+
+# ---------------------------------------------------------------- consequences
+
+def consequences(chrom: Sequence[str], pos: Sequence[int], a1: Sequence[str], a2: Sequence[str],
+                 feats: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Per variant: most_severe_consequence plus the chosen transcript's fields."""
+    chrom = np.asarray([str(c).replace("chr", "", 1) for c in chrom], dtype=str)
+    pos = np.asarray(pos, dtype=np.int64)
+    n = len(pos)
+    dlen = _indel_len_change(np.asarray(a1), np.asarray(a2))
+
+    names, codes = np.unique(np.concatenate([chrom, feats["tx_chr"]]), return_inverse=True)
+    v_chr, tx_chr = codes[:n], codes[n:]
+
+    tx_start, tx_end = feats["tx_start"], feats["tx_end"]
+    strand = feats["tx_strand"]
+
+    # (variant, transcript) pairs within FLANK
+    pv, pt = overlap_pairs(v_chr, pos, tx_chr, tx_start - FLANK, tx_end + FLANK)
+    flags = np.zeros(len(pv), dtype=np.int64)
+    pair_key = pv.astype(np.int64) * len(tx_start) + pt
+    order = np.argsort(pair_key)
+    pair_key = pair_key[order]
+    pv, pt = pv[order], pt[order]
+
+    def pair_index(v, t):
+        return np.searchsorted(pair_key, v.astype(np.int64) * len(tx_start) + t)
+
+    # exons (with splice flanks)
+    ex_tx = feats["ex_tx"]
+    ex_s, ex_e = feats["ex_start"], feats["ex_end"]
+    ev, ei = overlap_pairs(v_chr, pos, tx_chr[ex_tx], ex_s - SPLICE_REGION, ex_e + SPLICE_REGION)
+    et = ex_tx[ei]
+    p = pos[ev]
+    s, e = ex_s[ei], ex_e[ei]
+    left_site = s != tx_start[et]          # exon start is an intron boundary
+    right_site = e != tx_end[et]
+    plus = strand[et] > 0
+    bits = np.zeros(len(ev), dtype=np.int64)
+
+    exonic = (p >= s) & (p <= e)
+    bits |= np.where(exonic, _EXONIC, 0)
+    kl = s - p                              # intronic distance left of the exon
+    kr = p - e                              # intronic distance right of the exon
+    site_l = left_site & (kl >= 1) & (kl <= 2)
+    site_r = right_site & (kr >= 1) & (kr <= 2)
+    # + strand: exon start = acceptor side, exon end = donor side
+    bits |= np.where((site_l & plus) | (site_r & ~plus), BIT["splice_acceptor_variant"], 0)
+    bits |= np.where((site_r & plus) | (site_l & ~plus), BIT["splice_donor_variant"], 0)
+    region = ((left_site & (kl >= 3) & (kl <= SPLICE_REGION))
+              | (right_site & (kr >= 3) & (kr <= SPLICE_REGION))
+              | (exonic & left_site & (p - s <= 2))
+              | (exonic & right_site & (e - p <= 2)))
+    bits |= np.where(region, BIT["splice_region_variant"], 0)
+    np.bitwise_or.at(flags, pair_index(ev, et), bits)
+
+    # CDS
+    cv, ci = overlap_pairs(v_chr, pos, tx_chr[feats["cds_tx"]], feats["cds_start"], feats["cds_end"])
+    np.bitwise_or.at(flags, pair_index(cv, feats["cds_tx"][ci]), _CDS)
+
+    # transcript-level terms
+    p = pos[pv]
+    inside = (p >= tx_start[pt]) & (p <= tx_end[pt])
+    plus = strand[pt] > 0
+    in_exon = (flags & _EXONIC) != 0
+    in_cds = (flags & _CDS) != 0
+    coding = feats["cds_min"][pt] >= 0
+    d = dlen[pv]
+
+    upstream = ~inside & ((plus & (p < tx_start[pt])) | (~plus & (p > tx_end[pt])))
+    flags |= np.where(upstream, BIT["upstream_gene_variant"], 0)
+    flags |= np.where(~inside & ~upstream, BIT["downstream_gene_variant"], 0)
+    flags |= np.where(inside & ~in_exon, BIT["intron_variant"], 0)
+    flags |= np.where(in_exon & ~coding, BIT["non_coding_transcript_exon_variant"], 0)
+
+    cds_hit = in_exon & in_cds
+    flags |= np.where(cds_hit & (d % 3 != 0), BIT["frameshift_variant"], 0)
+    a1_len = pd.Series(np.asarray(a1)[pv], dtype=str).str.len().to_numpy()
+    a2_len = pd.Series(np.asarray(a2)[pv], dtype=str).str.len().to_numpy()
+    inframe = cds_hit & (d > 0) & (d % 3 == 0)
+    # PLINK A1 is usually the minor allele; insertion = A1 longer than A2
+    flags |= np.where(inframe & (a1_len > a2_len), BIT["inframe_insertion"], 0)
+    flags |= np.where(inframe & (a1_len < a2_len), BIT["inframe_deletion"], 0)
+    flags |= np.where(cds_hit & (d == 0), BIT["coding_sequence_variant"], 0)
+
+    utr = in_exon & ~in_cds & coding
+    before_cds = np.where(plus, p < feats["cds_min"][pt], p > feats["cds_max"][pt])
+    flags |= np.where(utr & before_cds, BIT["5_prime_UTR_variant"], 0)
+    flags |= np.where(utr & ~before_cds, BIT["3_prime_UTR_variant"], 0)
+
+    flags &= _TERM_MASK
+    keep = flags != 0
+    pv, pt, flags = pv[keep], pt[keep], flags[keep]
+
+    # most severe term per pair = lowest set bit
+    sev = np.log2((flags & -flags).astype(np.float64)).astype(np.int64)
+    term_bits = (flags[:, None] >> np.arange(len(TERMS))) & 1
+    impact = np.max(np.where(term_bits == 1, _TERM_IMPACT[None, :], 0), axis=1)
+
+    worst = np.full(n, len(TERMS), dtype=np.int64)
+    np.minimum.at(worst, pv, sev)
+
+    # transcript per variant: impact, canonical, severity, GTF order
+    pick = np.lexsort((pt, sev, ~feats["tx_canonical"][pt], -impact, pv))
+    first = pick[np.r_[True, pv[pick][1:] != pv[pick][:-1]]] if len(pick) else pick
+    chosen = np.full(n, -1, dtype=np.int64)
+    chosen[pv[first]] = first
+
+    term_names = np.array([t for t, _ in TERMS] + ["intergenic_variant"], dtype=object)
+    impact_names = {v: k for k, v in IMPACT_RANK.items()}
+    has = chosen >= 0
+    c = chosen[has]
+    out = pd.DataFrame({
+        "most_severe_consequence": term_names[worst],
+        "impact": "", "gene": "", "biotype": "", "consequence_terms": "",
+    })
+    out.loc[has, "impact"] = [impact_names[i] for i in impact[c]]
+    out.loc[has, "gene"] = feats["tx_gene"][pt[c]]
+    out.loc[has, "biotype"] = feats["tx_biotype"][pt[c]]
+    # few distinct bit sets: join their term names once
+    uniq, inv = np.unique(flags[c], return_inverse=True)
+    joined = np.array([",".join(t for i, (t, _) in enumerate(TERMS) if (u >> i) & 1) for u in uniq],
+                      dtype=object)
+    out.loc[has, "consequence_terms"] = joined[inv.ravel()]
+    return out
+
+
+# ---------------------------------------------------------------- CLI
+
+def main():
+    from quick_vep_grch37_v2 import read_rsids, write_tsv
+
+    ap = argparse.ArgumentParser(description="offline VEP-style consequences from a GTF")
+    ap.add_argument("--gtf", required=True)
+    ap.add_argument("--bfile", required=True, help="PLINK prefix (.bim gives CHR/BP/alleles)")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--rsids", help="rsids.txt (one per line)")
+    src.add_argument("--window", nargs=3, metavar=("CHR", "FROM", "TO"),
+                     help="annotate every .bim variant in the range")
+    ap.add_argument("--out", required=True, help="TSV in quick_vep_grch37_v2.py format")
+    args = ap.parse_args()
+
+    index = open_index(args.bfile)
+    if args.rsids:
+        rsids = read_rsids(args.rsids)
+        rows = index.rows(rsids)
+        absent = [s for s, r in zip(rsids, rows) if r < 0]
+        if absent:
+            print(f"[WARN] {len(absent)} rsIDs not in {args.bfile}.bim (skipped)", file=sys.stderr)
+        rows = rows[rows >= 0]
+    else:
+        chrom, lo, hi = args.window
+        rows = index.window_rows(chrom, int(lo), int(hi))
+    bim = index.bim_rows(np.unique(rows))
+
+    feats = open_features(args.gtf)
+    cons = consequences(bim["CHR"], bim["BP"], bim["A1"], bim["A2"], feats)
+    cons.insert(0, "SNP", bim["SNP"].to_numpy())
+    records = cons.drop_duplicates("SNP").sort_values("SNP", kind="mergesort").to_dict("records")
+    write_tsv(records, args.out)
+    print(f"[OK] wrote {args.out} (n={len(records)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""In-process LD for a bp window, as a drop-in for the PLINK --r2/--r calls.
+
+The window's genotypes come from the memory-mapped .bed (plink_bed) via the
+.bim index, are decoded once, and r is computed with matrix products:
+
+  - r^2 to one or many leads      (--r2 [gz] --ld-snp / --ld-snp-list)
+  - the full signed r matrix       (--r square [gz], with --extract)
+
+Correlations are Pearson r of A1 allele counts over founders, with missing
+calls excluded pairwise, which is what PLINK 1.9 reports. Proxy sets for any
+r^2 threshold are a mask on the same array (--proxy-r2/--proxy-out), and
+--npz keeps the raw array in a compact binary file next to the text output.
+
+With --store-dir the window's full r matrix is computed once into a binary
+LD store (ld_store.py) and every later call on the same window only reads
+the rows it needs from it; values then carry the store's float16 precision.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bim_index import BimIndex, open_index
+from plink_bed import BedReader, a1_is_major, founder_mask, read_fam
+
+LD_R2_COLS = ["CHR_A", "BP_A", "SNP_A", "CHR_B", "BP_B", "SNP_B", "R2"]
+
+
+# ---------------------------------------------------------------- genotypes
+
+def load_window(bfile: str, chrom: str, from_bp: int, to_bp: int,
+                extract: Optional[Sequence[str]] = None, keep_allele_order: bool = True,
+                index: Optional[BimIndex] = None,
+                fam: Optional[pd.DataFrame] = None) -> Tuple[pd.DataFrame, np.ndarray]:
+    """(.bim rows, A1 counts (m, n_founders) float32 with NaN) for the window."""
+    fam = read_fam(bfile) if fam is None else fam
+    index = open_index(bfile) if index is None else index
+    bed = BedReader(bfile, n_samples=len(fam), n_variants=index.n)
+
+    win = index.bim_rows(index.window_rows(chrom, from_bp, to_bp))
+    if extract is not None:
+        win = win[win["SNP"].isin(set(extract))].reset_index(drop=True)
+
+    founders = founder_mask(fam)
+    geno = bed.dosage(win["ROW"].to_numpy(), samples=np.flatnonzero(founders))
+    if not keep_allele_order:
+        swap = a1_is_major(geno, np.ones(geno.shape[1], dtype=bool))
+        geno[swap] = 2.0 - geno[swap]
+        win.loc[swap, ["A1", "A2"]] = win.loc[swap, ["A2", "A1"]].to_numpy()
+    return win, geno
+
+
+# ---------------------------------------------------------------- maths
+
+def _standardize(X: np.ndarray) -> np.ndarray:
+    Xc = X - X.mean(axis=1, keepdims=True)
+    norm = np.sqrt(np.einsum("ij,ij->i", Xc, Xc))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return Xc / norm[:, None]
+
+
+def corr_rows(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """Pearson r between every row of A (ka, n) and of B (kb, n); NaN = missing.
+
+    Rows without missing calls use one product of standardized blocks; when
+    either side has NaN the pairwise-complete sums come from six products.
+    """
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    ma, mb = np.isnan(A), np.isnan(B)
+    if not ma.any() and not mb.any():
+        return _standardize(A) @ _standardize(B).T
+
+    Ma, Mb = (~ma).astype(np.float64), (~mb).astype(np.float64)
+    Xa, Xb = np.where(ma, 0.0, A), np.where(mb, 0.0, B)
+    N = Ma @ Mb.T
+    Sa = Xa @ Mb.T
+    Sb = Ma @ Xb.T
+    Saa = (Xa * Xa) @ Mb.T
+    Sbb = Ma @ (Xb * Xb).T
+    Sab = Xa @ Xb.T
+    cov = N * Sab - Sa * Sb
+    va = N * Saa - Sa * Sa
+    vb = N * Sbb - Sb * Sb
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = cov / np.sqrt(va * vb)
+    r[(va <= 0) | (vb <= 0)] = np.nan
+    return r
+
+
+def r_to_leads(geno: np.ndarray, lead_pos: Sequence[int]) -> np.ndarray:
+    """(n_leads, m) signed r of each lead row against every window row."""
+    return corr_rows(geno[np.asarray(lead_pos, dtype=np.int64)], geno)
+
+
+def r_matrix(geno: np.ndarray, chunk: int = 2048) -> np.ndarray:
+    """(m, m) signed r as float32, computed in row blocks to bound memory."""
+    m = geno.shape[0]
+    out = np.empty((m, m), dtype=np.float32)
+    for lo in range(0, m, chunk):
+        out[lo:lo + chunk] = corr_rows(geno[lo:lo + chunk], geno)
+    return out
+
+
+# ---------------------------------------------------------------- outputs
+
+def ld_table(win: pd.DataFrame, lead_pos: Sequence[int], r: np.ndarray,
+             window_kb: Optional[float] = None, min_r2: float = 0.0,
+             window_n: Optional[int] = None) -> pd.DataFrame:
+    """PLINK --r2 --ld-snp rows (lead x partner, partners in .bim order)."""
+    chr_ = win["CHR"].to_numpy()
+    bp = win["BP"].to_numpy()
+    snp = win["SNP"].to_numpy()
+    r2 = r.astype(np.float64) ** 2
+    parts = []
+    for k, a in enumerate(lead_pos):
+        keep = np.ones(len(win), dtype=bool)
+        if window_kb is not None:
+            keep &= np.abs(bp - bp[a]) <= window_kb * 1000
+        if window_n is not None:
+            keep &= np.abs(np.arange(len(win)) - a) < window_n
+        if min_r2 > 0:
+            keep &= r2[k] >= min_r2
+        b = np.flatnonzero(keep)
+        parts.append(pd.DataFrame({
+            "CHR_A": chr_[a], "BP_A": bp[a], "SNP_A": snp[a],
+            "CHR_B": chr_[b], "BP_B": bp[b], "SNP_B": snp[b], "R2": r2[k, b],
+        }))
+    if not parts:
+        return pd.DataFrame({c: [] for c in LD_R2_COLS})
+    return pd.concat(parts, ignore_index=True)[LD_R2_COLS]
+
+
+def _open_text(path: str):
+    # level 1: the square matrix is ~20 MB of text and level 6 triples the write time
+    return gzip.open(path, "wt", compresslevel=1) if path.endswith(".gz") else open(path, "w")
+
+
+def _fmt_g6(x: float) -> str:
+    return "nan" if not np.isfinite(x) else f"{x:.6g}"
+
+
+def write_ld_table(df: pd.DataFrame, path: str) -> None:
+    """PLINK 1.9 fixed-width .ld layout (gzip when path ends with .gz)."""
+    with _open_text(path) as f:
+        f.write(" CHR_A         BP_A        SNP_A  CHR_B         BP_B        SNP_B           R2 \n")
+        f.writelines(
+            f"{a:>6} {b:>12} {c:>12} {d:>6} {e:>12} {g:>12} {_fmt_g6(h):>12} \n"
+            for a, b, c, d, e, g, h in zip(df["CHR_A"], df["BP_A"], df["SNP_A"], df["CHR_B"],
+                                           df["BP_B"], df["SNP_B"], df["R2"]))
+
+
+def write_square(r: np.ndarray, path: str) -> None:
+    """PLINK --r square layout: tab-separated matrix, no header."""
+    with _open_text(path) as f:
+        np.savetxt(f, r, fmt="%.6g", delimiter="\t")
+
+
+def save_npz(path: str, win: pd.DataFrame, values: np.ndarray, kind: str,
+             leads: Sequence[str] = ()) -> None:
+    """Compact binary copy: SNP order + float16 values (r, or r2 to leads)."""
+    np.savez_compressed(
+        path, kind=np.array(kind), snp=win["SNP"].to_numpy().astype(str),
+        chr=win["CHR"].to_numpy().astype(str), bp=win["BP"].to_numpy(dtype=np.int64),
+        leads=np.asarray(list(leads), dtype=str), values=values.astype(np.float16))
+
+
+def proxies(win: pd.DataFrame, r: np.ndarray, min_r2: float) -> List[str]:
+    """rsIDs with r^2 >= min_r2 to any lead (leads included), window order."""
+    hit = np.nan_to_num(r.astype(np.float64) ** 2, nan=0.0) >= min_r2
+    return win["SNP"].to_numpy()[hit.any(axis=0)].tolist()
+
+
+def from_store(store, extract: Optional[Sequence[str]] = None,
+               keep_allele_order: bool = True) -> Tuple[pd.DataFrame, np.ndarray]:
+    """(.bim rows with store POS, +1/-1 sign per row) for the store's window."""
+    win = store.bim(keep_allele_order)
+    sign = store.signs(keep_allele_order)
+    if extract is not None:
+        keep = win["SNP"].isin(set(extract)).to_numpy()
+        win, sign = win[keep].reset_index(drop=True), sign[keep]
+    return win, sign
+
+
+def store_r(store, win: pd.DataFrame, sign: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+    """Signed r of window rows `rows` against every window row, from the store."""
+    rows = np.asarray(rows, dtype=np.int64)
+    pos = win["POS"].to_numpy()
+    return store.block(pos[rows], pos) * sign[rows, None] * sign[None, :]
+
+
+# ---------------------------------------------------------------- CLI
+
+def _read_list(path: str) -> List[str]:
+    with open(path) as f:
+        return [tok for line in f for tok in line.split()[:1]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="plink --r2/--r for one window, in NumPy")
+    ap.add_argument("--bfile", required=True)
+    ap.add_argument("--chr", required=True, dest="chrom")
+    ap.add_argument("--from-bp", type=int, required=True)
+    ap.add_argument("--to-bp", type=int, required=True)
+    ap.add_argument("--extract", default=None, help="restrict to rsIDs in this file")
+    ap.add_argument("--keep-allele-order", action="store_true")
+    mode = ap.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--r2", nargs="*", choices=["gz"], default=None,
+                      help="r^2 to --ld-snp lead(s), PLINK .ld table")
+    mode.add_argument("--r", nargs="*", choices=["square", "gz"], default=None,
+                      help="signed r; 'square' writes the full window matrix")
+    leads = ap.add_mutually_exclusive_group()
+    leads.add_argument("--ld-snp", default=None)
+    leads.add_argument("--ld-snp-list", default=None)
+    ap.add_argument("--ld-window", type=int, default=10, help="max variant-count distance (PLINK default 10)")
+    ap.add_argument("--ld-window-kb", type=float, default=1000, help="PLINK default 1000")
+    ap.add_argument("--ld-window-r2", type=float, default=0.2, help="PLINK default 0.2")
+    ap.add_argument("--proxy-r2", type=float, default=None,
+                    help="also write rsIDs with r^2 >= this to any lead (--proxy-out)")
+    ap.add_argument("--proxy-out", default=None)
+    ap.add_argument("--npz", default=None, help="also save values as float16 .npz")
+    ap.add_argument("--store-dir", default=None,
+                    help="read r from (building if needed) the window's LD store in this dir")
+    ap.add_argument("--out", required=True, help="output prefix (<out>.ld or <out>.ld.gz)")
+    args = ap.parse_args()
+
+    extract = _read_list(args.extract) if args.extract else None
+    store = geno = sign = None
+    if args.store_dir:
+        from ld_store import open_or_build
+
+        store = open_or_build(args.bfile, args.chrom, args.from_bp, args.to_bp, args.store_dir)
+        win, sign = from_store(store, extract, args.keep_allele_order)
+    else:
+        win, geno = load_window(args.bfile, args.chrom, args.from_bp, args.to_bp,
+                                extract=extract, keep_allele_order=args.keep_allele_order)
+    if win.empty:
+        raise SystemExit(f"[ERR] no variants in {args.chrom}:{args.from_bp}-{args.to_bp}")
+
+    gz = "gz" in (args.r2 if args.r2 is not None else args.r)
+    out = args.out + (".ld.gz" if gz else ".ld")
+
+    if args.r is not None:
+        if "square" not in args.r:
+            raise SystemExit("[ERR] only --r square is supported")
+        r = store_r(store, win, sign, np.arange(len(win))) if store is not None else r_matrix(geno)
+        write_square(r, out)
+        if args.npz:
+            save_npz(args.npz, win, r, kind="r")
+        print(f"[OK] wrote {out} ({len(win)}x{len(win)})")
+        return
+
+    lead_ids = [args.ld_snp] if args.ld_snp else (_read_list(args.ld_snp_list) if args.ld_snp_list else [])
+    if not lead_ids:
+        raise SystemExit("[ERR] --r2 needs --ld-snp or --ld-snp-list")
+    pos_of = {s: i for i, s in enumerate(win["SNP"])}
+    absent = [s for s in lead_ids if s not in pos_of]
+    if absent:
+        raise SystemExit(f"[ERR] --ld-snp not in window: {absent}")
+    lead_pos = [pos_of[s] for s in lead_ids]
+
+    r = store_r(store, win, sign, lead_pos) if store is not None else r_to_leads(geno, lead_pos)
+    table = ld_table(win, lead_pos, r, window_kb=args.ld_window_kb,
+                     min_r2=args.ld_window_r2, window_n=args.ld_window)
+    write_ld_table(table, out)
+    if args.npz:
+        save_npz(args.npz, win, r.astype(np.float64) ** 2, kind="r2", leads=lead_ids)
+    if args.proxy_r2 is not None:
+        if not args.proxy_out:
+            raise SystemExit("[ERR] --proxy-r2 needs --proxy-out")
+        with open(args.proxy_out, "w") as f:
+            f.writelines(f"{s}\n" for s in proxies(win, r, args.proxy_r2))
+    print(f"[OK] wrote {out} (leads={len(lead_ids)}, rows={len(table)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""One binary LD store per window, shared by the plots and the ranking step.
+
+The store holds the signed r matrix of every variant in a bp window (A1 as
+written in the .bim, founders, pairwise-complete calls, as ld_calc.py) in
+one uncompressed file, so any row is a single seek:
+
+  magic     8 bytes  b"LDSTORE1"
+  header    4 x int32 little-endian: version, m, code, text_len
+  text      text_len bytes UTF-8:
+              "#" + JSON source key (bfile, .bim/.bed size/mtime, window)
+              m lines SNP<TAB>CHR<TAB>BP<TAB>A1<TAB>A2<TAB>A1_FREQ
+  padding   to a 64-byte boundary
+  values    m x m row-major; code 2 = float16 r (default),
+            code 1 = uint8 q = round((r + 1) * 127), 255 = NaN
+
+float16 keeps r to ~3 significant digits (r^2 within ~1e-3); uint8 halves
+the size again at a step of 1/127 in r. The matrix is symmetric, so a row
+is also the column the R plots colour by. A1_FREQ (founders) lets readers
+that want PLINK's default allele orientation flip signs without genotypes.
+
+Stores live in one directory (LD_STORE_DIR in scripts/_config.sh), named
+<bfile basename>.<chr>_<from>_<to>.ldstore; open_or_build() reuses a store
+while its source key still matches and recomputes it otherwise.
+code/ld_store.R reads the same format.
+
+CLI:
+  ld_store.py build  --bfile B --chr C --from-bp F --to-bp T --dir D [--dtype u1]
+                                                  (prints the store path)
+  ld_store.py info   STORE
+  ld_store.py row    STORE SNP [--r2]            (SNP<TAB>R or R2, store order)
+  ld_store.py submatrix STORE SNPLIST [--out TSV] (square r, --r square layout)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas and ld_calc (genotypes) are imported lazily: reading rows back only
+# needs numpy, and ld_calc imports this module for --store-dir.
+
+MAGIC = b"LDSTORE1"
+STORE_VERSION = 1
+STORE_SUFFIX = ".ldstore"
+CODES = {"f2": 2, "u1": 1}
+DTYPES = {2: np.dtype("<f2"), 1: np.dtype(np.uint8)}
+NAN_U1 = 255
+ALIGN = 64
+HEADER_BYTES = len(MAGIC) + 16
+
+
+# ---------------------------------------------------------------- quantization
+
+def quantize(r: np.ndarray, code: int) -> np.ndarray:
+    r = np.asarray(r, dtype=np.float32)
+    if code == 2:
+        return r.astype("<f2")
+    q = np.rint((np.clip(r, -1.0, 1.0) + 1.0) * 127.0)
+    return np.where(np.isnan(r), NAN_U1, q).astype(np.uint8)
+
+
+def dequantize(q: np.ndarray, code: int) -> np.ndarray:
+    q = np.asarray(q)
+    if code == 2:
+        return q.astype(np.float32)
+    r = q.astype(np.float32) / 127.0 - 1.0
+    r[q == NAN_U1] = np.nan
+    return r
+
+
+# ---------------------------------------------------------------- write
+
+def store_path(store_dir: str, bfile: str, chrom: str, from_bp: int, to_bp: int) -> str:
+    return os.path.join(store_dir, f"{os.path.basename(bfile)}.{chrom}_{from_bp}_{to_bp}{STORE_SUFFIX}")
+
+
+def source_key(bfile: str, chrom: str, from_bp: int, to_bp: int) -> Dict[str, object]:
+    key: Dict[str, object] = {"version": STORE_VERSION, "bfile": os.path.abspath(bfile),
+                              "chr": str(chrom), "from_bp": int(from_bp), "to_bp": int(to_bp)}
+    for ext in ("bim", "bed"):
+        st = os.stat(f"{bfile}.{ext}")
+        key[f"{ext}_size"] = st.st_size
+        key[f"{ext}_mtime_ns"] = st.st_mtime_ns
+    return key
+
+
+def write_store(path: str, win: "pd.DataFrame", r: np.ndarray, freq: np.ndarray,
+                source: Dict[str, object], dtype: str = "f2", chunk: int = 1024) -> str:
+    """Write win (SNP/CHR/BP/A1/A2) + r (m, m) atomically; returns path."""
+    code = CODES[dtype]
+    m = len(win)
+    lines = ["#" + json.dumps(source, sort_keys=True)]
+    lines += [f"{s}\t{c}\t{b}\t{a1}\t{a2}\t{f:.6g}" for s, c, b, a1, a2, f in
+              zip(win["SNP"], win["CHR"], win["BP"], win["A1"], win["A2"], freq)]
+    text = ("\n".join(lines) + "\n").encode()
+    pad = -(HEADER_BYTES + len(text)) % ALIGN
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([STORE_VERSION, m, code, len(text)], dtype="<i4").tobytes())
+        f.write(text)
+        f.write(b"\0" * pad)
+        for lo in range(0, m, chunk):
+            f.write(quantize(r[lo:lo + chunk], code).tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+def build_store(bfile: str, chrom: str, from_bp: int, to_bp: int, path: str,
+                dtype: str = "f2") -> str:
+    """Compute the window's r matrix (A1 as in the .bim) and write it to path."""
+    from ld_calc import load_window, r_matrix
+
+    win, geno = load_window(bfile, chrom, from_bp, to_bp, keep_allele_order=True)
+    if win.empty:
+        raise SystemExit(f"[ERR] no variants in {chrom}:{from_bp}-{to_bp}")
+    with np.errstate(invalid="ignore"):
+        freq = np.nan_to_num(np.nanmean(geno, axis=1) / 2.0, nan=0.0)
+    return write_store(path, win, r_matrix(geno), freq,
+                       source_key(bfile, chrom, from_bp, to_bp), dtype=dtype)
+
+
+# ---------------------------------------------------------------- read
+
+def is_store(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class LdStore:
+    """Memory-mapped store; rows are read on demand, never the whole matrix."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SystemExit(f"[ERR] not an LD store: {path}")
+            version, m, code, text_len = np.frombuffer(f.read(16), dtype="<i4").tolist()
+            if version != STORE_VERSION:
+                raise SystemExit(f"[ERR] {path}: store version {version}, expected {STORE_VERSION}")
+            lines = f.read(text_len).decode().split("\n")
+        self.m, self.code = m, code
+        self.source = json.loads(lines[0][1:])
+        cols = list(zip(*(ln.split("\t") for ln in lines[1:m + 1]))) if m else [()] * 6
+        self.snp = np.asarray(cols[0], dtype=str)
+        self.chr = np.asarray(cols[1], dtype=str)
+        self.bp = np.asarray(cols[2], dtype=np.int64)
+        self.a1 = np.asarray(cols[3], dtype=str)
+        self.a2 = np.asarray(cols[4], dtype=str)
+        self.freq = np.asarray(cols[5], dtype=np.float64)
+        offset = HEADER_BYTES + text_len + (-(HEADER_BYTES + text_len) % ALIGN)
+        self.values = np.memmap(path, dtype=DTYPES[code], mode="r", offset=offset, shape=(m, m))
+        self._pos: Optional[Dict[str, int]] = None
+
+    def index(self, snps: Sequence[str]) -> np.ndarray:
+        """Store position per rsID (first occurrence), -1 where absent."""
+        if self._pos is None:
+            self._pos = {}
+            for i, s in enumerate(self.snp.tolist()):
+                self._pos.setdefault(s, i)
+        return np.array([self._pos.get(s, -1) for s in snps], dtype=np.int64)
+
+    def block(self, rows: Sequence[int], cols: Optional[Sequence[int]] = None) -> np.ndarray:
+        """r for store positions rows x cols (all columns by default), float32.
+
+        Rows are read once each in file order, then put back in request order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        uniq, inv = np.unique(rows, return_inverse=True)
+        got = np.asarray(self.values[uniq])
+        if cols is not None:
+            got = got[:, np.asarray(cols, dtype=np.int64)]
+        return dequantize(got, self.code)[inv.reshape(-1)]
+
+    def row(self, lead: str) -> np.ndarray:
+        """r of lead against every store SNP (store order)."""
+        pos = self.index([lead])[0]
+        if pos < 0:
+            raise KeyError(lead)
+        return self.block([pos])[0]
+
+    def submatrix(self, snps: Sequence[str]) -> np.ndarray:
+        """Square r for snps, in the given order."""
+        pos = self.index(snps)
+        absent = [s for s, p in zip(snps, pos) if p < 0]
+        if absent:
+            raise KeyError(absent)
+        return self.block(pos, pos)
+
+    def signs(self, keep_allele_order: bool) -> np.ndarray:
+        """+1/-1 per SNP; -1 where PLINK would swap A1 (freq > 0.5) without kao."""
+        if keep_allele_order:
+            return np.ones(self.m, dtype=np.float32)
+        return np.where(self.freq > 0.5, -1.0, 1.0).astype(np.float32)
+
+    def bim(self, keep_allele_order: bool = True) -> "pd.DataFrame":
+        import pandas as pd
+
+        swap = self.signs(keep_allele_order) < 0
+        return pd.DataFrame({
+            "CHR": self.chr, "SNP": self.snp, "BP": self.bp,
+            "A1": np.where(swap, self.a2, self.a1), "A2": np.where(swap, self.a1, self.a2),
+            "POS": np.arange(self.m, dtype=np.int64),
+        })
+
+
+def open_or_build(bfile: str, chrom: str, from_bp: int, to_bp: int, store_dir: str,
+                  dtype: Optional[str] = None, rebuild: bool = False) -> LdStore:
+    """Store for the window, computing it only when missing or out of date.
+
+    dtype=None reuses a store of either precision and builds float16.
+    """
+    path = store_path(store_dir, bfile, chrom, from_bp, to_bp)
+    if not rebuild and is_store(path):
+        st = LdStore(path)
+        if (st.source == source_key(bfile, chrom, from_bp, to_bp)
+                and (dtype is None or st.code == CODES[dtype])):
+            return st
+    return LdStore(build_store(bfile, chrom, from_bp, to_bp, path, dtype=dtype or "f2"))
+
+
+# ---------------------------------------------------------------- CLI
+
+def main():
+    ap = argparse.ArgumentParser(description="per-window binary LD store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="build (or reuse) the store for a window; prints its path")
+    b.add_argument("--bfile", required=True)
+    b.add_argument("--chr", required=True, dest="chrom")
+    b.add_argument("--from-bp", type=int, required=True)
+    b.add_argument("--to-bp", type=int, required=True)
+    b.add_argument("--dir", required=True, dest="store_dir")
+    b.add_argument("--dtype", choices=sorted(CODES), default=None,
+                   help="f2 (float16) or u1 (uint8); default: keep an existing store, else f2")
+    b.add_argument("--rebuild", action="store_true")
+
+    i = sub.add_parser("info", help="window, size and source of a store")
+    i.add_argument("store")
+
+    rw = sub.add_parser("row", help="r (or r^2) of one SNP against the window")
+    rw.add_argument("store")
+    rw.add_argument("snp")
+    rw.add_argument("--r2", action="store_true")
+
+    sm = sub.add_parser("submatrix", help="square r for the rsIDs in a list file")
+    sm.add_argument("store")
+    sm.add_argument("snplist")
+    sm.add_argument("--out", default=None, help="output path (.gz ok); default stdout")
+
+    args = ap.parse_args()
+    if args.cmd == "build":
+        st = open_or_build(args.bfile, args.chrom, args.from_bp, args.to_bp, args.store_dir,
+                           dtype=args.dtype, rebuild=args.rebuild)
+        print(st.path)
+        return
+
+    st = LdStore(args.store)
+    if args.cmd == "info":
+        src = st.source
+        print(f"{st.path}\tm={st.m}\tdtype={'f2' if st.code == 2 else 'u1'}\t"
+              f"{src['chr']}:{src['from_bp']}-{src['to_bp']}\t{src['bfile']}")
+    elif args.cmd == "row":
+        try:
+            r = st.row(args.snp)
+        except KeyError:
+            raise SystemExit(f"[ERR] {args.snp} not in {st.path}")
+        vals = r.astype(np.float64) ** 2 if args.r2 else r
+        sys.stdout.writelines(f"{s}\t{v:.6g}\n" for s, v in zip(st.snp, vals))
+    else:
+        from ld_calc import _read_list, write_square
+
+        snps = _read_list(args.snplist)
+        try:
+            r = st.submatrix(snps)
+        except KeyError as e:
+            raise SystemExit(f"[ERR] not in {st.path}: {e.args[0]}")
+        if args.out:
+            write_square(r, args.out)
+        else:
+            np.savetxt(sys.stdout, r, fmt="%.6g", delimiter="\t")
+
+
+if __name__ == "__main__":
+    main()
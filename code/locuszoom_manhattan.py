@@ -2,7 +2,8 @@
 #!/usr/bin/env python3
 import argparse
 import math
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import matplotlib
 matplotlib.use("Agg")
@@ -11,56 +12,66 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+import assoc_io
+from ld_store import LdStore, is_store
+
 
 def read_assoc_linear(path: str, test: str = "ADD") -> pd.DataFrame:
-    df = pd.read_table(path, sep=r"\s+", dtype=str)
+    df = assoc_io.read_assoc_linear(path, test=test, columns=["CHR", "SNP", "BP", "P"])
     need = {"CHR", "SNP", "BP", "P"}
     miss = need - set(df.columns)
     if miss:
         raise SystemExit(f"[ERR] assoc missing columns {sorted(miss)}: {path}")
 
-    if "TEST" in df.columns and test:
-        df = df[df["TEST"] == test].copy()
-
-    df["CHR"] = pd.to_numeric(df["CHR"], errors="coerce")
-    df["BP"] = pd.to_numeric(df["BP"], errors="coerce")
-    df["P"] = pd.to_numeric(df["P"], errors="coerce")
-    df = df.dropna(subset=["CHR", "BP", "P", "SNP"])
+    df = df.dropna(subset=["P", "SNP"])
     df = df[(df["CHR"] >= 1) & (df["CHR"] <= 22)]
-    df = df[df["BP"] > 0]
+    df = df[df["BP"] > 0].copy()
     df.loc[df["P"] <= 0, "P"] = 1e-300
-    df["mlogp"] = -np.log10(df["P"].astype(float).values)
+    df["mlogp"] = -np.log10(df["P"].to_numpy(dtype=float))
     df["BP"] = df["BP"].astype(int)
     df["SNP"] = df["SNP"].astype(str)
     return df[["CHR", "SNP", "BP", "P", "mlogp"]]
 
 
-def read_ld_r2(path: str, lead: str) -> Dict[str, float]:
-    df = pd.read_table(path, sep=r"\s+", dtype=str)
-    if not {"SNP_A", "SNP_B", "R2"} <= set(df.columns):
-        raise SystemExit(f"[ERR] LD file missing SNP_A/SNP_B/R2: {path}")
-
-    df = df[df["SNP_A"] == lead].copy()
-    df["R2"] = pd.to_numeric(df["R2"], errors="coerce").fillna(0.0).clip(0, 1)
-    out = dict(zip(df["SNP_B"].astype(str), df["R2"].astype(float)))
-    out[lead] = 1.0
-    return out
-
-
-def plot_panel(ax, assoc: pd.DataFrame, r2map: Dict[str, float], lead: str,
+def read_ld_r2(path: str, lead: str) -> pd.Series:
+    """r2 to lead indexed by SNP_B (last row per SNP wins; lead itself = 1.0).
+
+    An LD store (ld_store.py) is read directly: only the lead's row.
+    """
+    if is_store(path):
+        st = LdStore(path)
+        if st.index([lead])[0] >= 0:
+            r2 = pd.Series(st.row(lead).astype(float) ** 2, index=st.snp)
+        else:
+            r2 = pd.Series([], dtype=float)
+    else:
+        df = pd.read_table(path, sep=r"\s+", dtype=str)
+        if not {"SNP_A", "SNP_B", "R2"} <= set(df.columns):
+            raise SystemExit(f"[ERR] LD file missing SNP_A/SNP_B/R2: {path}")
+        df = df[df["SNP_A"] == lead]
+        r2 = pd.Series(pd.to_numeric(df["R2"], errors="coerce").to_numpy(dtype=float),
+                       index=df["SNP_B"].astype(str).to_numpy())
+    r2 = r2.fillna(0.0).clip(0, 1)
+    r2 = r2[~r2.index.duplicated(keep="last")]
+    r2[lead] = 1.0
+    return r2
+
+
+def plot_panel(ax, assoc: pd.DataFrame, r2: pd.Series, lead: str,
                title: str, gw_p: float, point_size: float = 18.0):
-    d = assoc.copy()
-    d["r2"] = d["SNP"].map(r2map).fillna(0.0).astype(float).clip(0, 1)
+    # index join: position of each assoc SNP in the LD index (-1 = not in LD)
+    pos = r2.index.get_indexer(assoc["SNP"])
+    vals = np.where(pos >= 0, r2.to_numpy()[pos], 0.0)
 
-    x = d["BP"].values / 1e6
-    y = d["mlogp"].values
+    x = assoc["BP"].to_numpy() / 1e6
+    y = assoc["mlogp"].to_numpy()
 
-    sc = ax.scatter(x, y, c=d["r2"].values, s=point_size, linewidths=0)
+    sc = ax.scatter(x, y, c=vals, s=point_size, linewidths=0)
     ax.axhline(-math.log10(gw_p), linewidth=1.0)
 
-    ld = d[d["SNP"] == lead]
-    if len(ld) > 0:
-        ax.scatter((ld["BP"].values / 1e6), ld["mlogp"].values,
+    is_lead = (assoc["SNP"] == lead).to_numpy()
+    if is_lead.any():
+        ax.scatter(x[is_lead], y[is_lead],
                    s=point_size * 2.2, c="red", linewidths=0, zorder=5)
 
     ax.set_title(title)
@@ -69,51 +80,64 @@ def plot_panel(ax, assoc: pd.DataFrame, r2map: Dict[str, float], lead: str,
     return sc
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--assoc", required=True)
-    ap.add_argument("--ld", required=True)
-    ap.add_argument("--lead", required=True)
-    ap.add_argument("--out-png", required=True)
+class Inputs:
+    """Parsed assoc / LD per (path, test) and (path, lead), shared by every figure."""
 
-    ap.add_argument("--title", default=None)
-    ap.add_argument("--titles", default=None)
-    ap.add_argument("--suptitle", default=None)
+    def __init__(self):
+        self.assoc: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self.ld: Dict[Tuple[str, str], pd.Series] = {}
+
+    def get_assoc(self, path: str, test: str) -> pd.DataFrame:
+        if (path, test) not in self.assoc:
+            self.assoc[(path, test)] = read_assoc_linear(path, test=test)
+        return self.assoc[(path, test)]
+
+    def get_ld(self, path: str, lead: str) -> pd.Series:
+        if (path, lead) not in self.ld:
+            self.ld[(path, lead)] = read_ld_r2(path, lead)
+        return self.ld[(path, lead)]
+
+
+def _split(x: Optional[str]) -> List[str]:
+    return [v.strip() for v in (x or "").split(",") if v.strip()]
 
-    ap.add_argument("--gw-threshold", type=float, default=5e-8)
-    ap.add_argument("--test", default="ADD")
-    ap.add_argument("--point-size", type=float, default=18.0)
-    args = ap.parse_args()
 
-    assoc_list = [x.strip() for x in args.assoc.split(",") if x.strip()]
-    ld_list = [x.strip() for x in args.ld.split(",") if x.strip()]
-    lead_list = [x.strip() for x in args.lead.split(",") if x.strip()]
+def render(fig_spec: Dict[str, object], inputs: Inputs) -> str:
+    """Draw one single- or multi-panel figure; returns its path."""
+    assoc_list = _split(fig_spec["assoc"])
+    ld_list = _split(fig_spec["ld"])
+    lead_list = _split(fig_spec["lead"])
     if not (len(assoc_list) == len(ld_list) == len(lead_list)):
         raise SystemExit("[ERR] --assoc/--ld/--lead count mismatch")
+    test = fig_spec.get("test") or "ADD"
+    gw_p = float(fig_spec.get("gw_threshold") or 5e-8)
+    point_size = float(fig_spec.get("point_size") or 18.0)
+    out_png = fig_spec["out_png"]
 
     n = len(assoc_list)
 
     if n == 1:
-        assoc = read_assoc_linear(assoc_list[0], test=args.test)
-        r2map = read_ld_r2(ld_list[0], lead_list[0])
-        t = args.title if args.title else "Regional cis-eQTL association (±500 kb)"
+        assoc = inputs.get_assoc(assoc_list[0], test)
+        r2 = inputs.get_ld(ld_list[0], lead_list[0])
+        t = fig_spec.get("title") or "Regional cis-eQTL association (±500 kb)"
 
         fig = plt.figure(figsize=(10.2, 7.0), dpi=150)
         ax = fig.add_subplot(111)
-        sc = plot_panel(ax, assoc, r2map, lead_list[0], t, args.gw_threshold, args.point_size)
+        sc = plot_panel(ax, assoc, r2, lead_list[0], t, gw_p, point_size)
         cb = fig.colorbar(sc, ax=ax, fraction=0.046, pad=0.04)
         cb.set_label(r"LD $r^2$ to lead")
 
         fig.tight_layout()
-        fig.savefig(args.out_png, bbox_inches="tight")
+        fig.savefig(out_png, bbox_inches="tight")
         plt.close(fig)
-        return
+        return out_png
 
     titles = None
-    if args.titles:
-        titles = [x.strip() for x in args.titles.split(",")]
+    if fig_spec.get("titles"):
+        titles = [x.strip() for x in str(fig_spec["titles"]).split(",")]
         if len(titles) != n:
             raise SystemExit("[ERR] --titles count mismatch with --assoc")
+    suptitle = fig_spec.get("suptitle")
 
     fig_w = 6.4 * n + 1.2
     fig_h = 4.8
@@ -122,26 +146,98 @@ def main():
 
     mappable = None
     for i in range(n):
-        assoc = read_assoc_linear(assoc_list[i], test=args.test)
-        r2map = read_ld_r2(ld_list[i], lead_list[i])
+        assoc = inputs.get_assoc(assoc_list[i], test)
+        r2 = inputs.get_ld(ld_list[i], lead_list[i])
         t = titles[i] if titles else f"Panel {i+1}"
-        sc = plot_panel(axes[i], assoc, r2map, lead_list[i], t, args.gw_threshold, args.point_size)
+        sc = plot_panel(axes[i], assoc, r2, lead_list[i], t, gw_p, point_size)
         mappable = sc
         if i != 0:
             axes[i].set_ylabel("")
 
-    top = 0.82 if args.suptitle else 0.86
+    top = 0.82 if suptitle else 0.86
     fig.subplots_adjust(left=0.06, right=0.90, bottom=0.16, top=top, wspace=0.18)
 
-    if args.suptitle:
-        fig.suptitle(args.suptitle, y=0.96)
+    if suptitle:
+        fig.suptitle(suptitle, y=0.96)
 
     cax = fig.add_axes([0.92, 0.18, 0.015, 0.62])
     cb = fig.colorbar(mappable, cax=cax)
     cb.set_label(r"LD $r^2$ to lead")
 
-    fig.savefig(args.out_png, bbox_inches="tight")
+    fig.savefig(out_png, bbox_inches="tight")
     plt.close(fig)
+    return out_png
+
+
+MANIFEST_COLS = ["out_png", "assoc", "ld", "lead"]
+MANIFEST_OPTIONAL = ["title", "titles", "suptitle", "test", "gw_threshold", "point_size"]
+
+# per-worker cache for --workers > 1 (each process parses its inputs once)
+_WORKER_INPUTS: Optional[Inputs] = None
+
+
+def _render_group(specs: List[Dict[str, object]]) -> List[str]:
+    global _WORKER_INPUTS
+    if _WORKER_INPUTS is None:
+        _WORKER_INPUTS = Inputs()
+    return [render(spec, _WORKER_INPUTS) for spec in specs]
+
+
+def run_manifest(path: str, workers: int = 1) -> None:
+    """Render every row of a figure manifest, parsing each assoc / LD pair once."""
+    figs = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+    miss = [c for c in MANIFEST_COLS if c not in figs.columns]
+    if miss:
+        raise SystemExit(f"[ERR] manifest missing columns: {miss}")
+    specs = figs.to_dict("records")
+
+    if workers <= 1 or len(specs) <= 1:
+        inputs = Inputs()
+        for spec in specs:
+            print(f"[OK] {render(spec, inputs)}")
+        return
+
+    # figures sharing their first assoc go to the same worker, so its cache is reused
+    groups: Dict[str, List[Dict[str, object]]] = {}
+    for spec in specs:
+        groups.setdefault(_split(spec["assoc"])[0], []).append(spec)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(_render_group, g) for g in groups.values()]
+        for fut in futs:
+            for out in fut.result():
+                print(f"[OK] {out}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--manifest", default=None,
+                    help=f"TSV with columns {MANIFEST_COLS} (+ optional {MANIFEST_OPTIONAL}); "
+                         "renders every figure in one process")
+    ap.add_argument("--workers", type=int, default=1, help="processes for --manifest")
+    ap.add_argument("--assoc", default=None)
+    ap.add_argument("--ld", default=None)
+    ap.add_argument("--lead", default=None)
+    ap.add_argument("--out-png", default=None)
+
+    ap.add_argument("--title", default=None)
+    ap.add_argument("--titles", default=None)
+    ap.add_argument("--suptitle", default=None)
+
+    ap.add_argument("--gw-threshold", type=float, default=5e-8)
+    ap.add_argument("--test", default="ADD")
+    ap.add_argument("--point-size", type=float, default=18.0)
+    args = ap.parse_args()
+
+    if args.manifest:
+        run_manifest(args.manifest, args.workers)
+        return
+    if not (args.assoc and args.ld and args.lead and args.out_png):
+        ap.error("--assoc, --ld, --lead and --out-png are required without --manifest")
+
+    render({"assoc": args.assoc, "ld": args.ld, "lead": args.lead, "out_png": args.out_png,
+            "title": args.title, "titles": args.titles, "suptitle": args.suptitle,
+            "test": args.test, "gw_threshold": args.gw_threshold, "point_size": args.point_size},
+           Inputs())
 
 
 if __name__ == "__main__":
@@ -1,5 +1,28 @@
 #!/usr/bin/env python3
-import sys, csv
+"""Base covariates + one gene's expression as an extra covariate column.
+
+  make_covar_plus_expr.py <base_covar.tsv> <pheno.txt> <expr_gene> <out.tsv>
+
+writes the base covariate rows of samples with a non-missing <expr_gene>
+value, plus an expr_<GENE> column. The batch form parses both tables once
+and serves every gene from the same sample index:
+
+  make_covar_plus_expr.py --covar C --pheno P --gene ERAP2 ERAP1 ... \\
+      --out-dir D [--out-pattern covar_plus_expr_{gene}.tsv]
+  make_covar_plus_expr.py --covar C --pheno P --all-genes --wide W.tsv
+
+--wide writes one file with expr_<GENE> for every gene (missing = NA) over
+all base samples; --covar-name C1..C10 expr_<GENE> on it selects the same
+samples as the per-gene file.
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+MISSING = ("NA", "", "nan", "NaN", ".")
 
 def detect_delim(path: str):
     with open(path, "r", newline="") as f:
@@ -22,14 +45,9 @@ def read_table(path: str):
                     rows.append(line.split())
     return rows
 
-def main():
-    if len(sys.argv) != 5:
-        print("usage: make_covar_plus_expr.py <base_covar.tsv> <pheno.txt> <expr_gene> <out.tsv>", file=sys.stderr)
-        sys.exit(2)
-
-    base, pheno, gene, out = sys.argv[1:]
-
-    base_rows = read_table(base)
+def read_base(path: str):
+    """(header, rows) of the base covariates, one row per FID/IID (last wins, first position)."""
+    base_rows = read_table(path)
     if len(base_rows) < 2:
         raise SystemExit("base covar too small")
 
@@ -49,34 +67,104 @@ def main():
             continue
         key = (row[0], row[1])
         base_map[key] = row
+    return base_header, base_map
 
-    ph_rows = read_table(pheno)
-    ph_header = ph_rows[0]
-    try:
-        idx = ph_header.index(gene)
-    except ValueError:
-        raise SystemExit(f"gene column not found in pheno header: {gene}")
+class PhenoTable:
+    """Phenotype text as a (rows, columns) string array with an integer sample index."""
 
-    expr_map = {}
-    for row in ph_rows[1:]:
-        if len(row) <= idx:
-            continue
-        key = (row[0], row[1])
-        val = row[idx]
-        if val in ("NA", "", "nan", "NaN", "."):
-            continue
-        expr_map[key] = val
+    def __init__(self, path: str):
+        rows = read_table(path)
+        self.header = rows[0]
+        width = len(self.header)
+        # short rows are padded with "" (= missing), as the per-gene reader skipped them
+        padded = [r[:width] + [""] * (width - len(r)) for r in rows[1:]]
+        self.values = np.empty((len(padded), width), dtype=object)
+        if padded:
+            self.values[:] = padded
+        self.code = {}
+        for r in padded:
+            self.code.setdefault((r[0], r[1]), len(self.code))
+        self.row_code = np.array([self.code[(r[0], r[1])] for r in padded], dtype=np.int64)
+
+    def genes(self):
+        return [c for c in self.header[2:] if c not in ("FID", "IID")]
 
-    merged = []
-    for key, brow in base_map.items():
-        if key in expr_map:
-            merged.append(brow + [expr_map[key]])
+    def column(self, gene: str, keys):
+        """Value of `gene` per key (last non-missing row of that sample), None where absent."""
+        try:
+            idx = self.header.index(gene)
+        except ValueError:
+            raise SystemExit(f"gene column not found in pheno header: {gene}")
+        col = self.values[:, idx]
+        ok = np.flatnonzero(~np.isin(col, MISSING))
+        best = np.full(len(self.code), -1, dtype=np.int64)
+        np.maximum.at(best, self.row_code[ok], ok)
+        codes = np.array([self.code.get(k, -1) for k in keys], dtype=np.int64)
+        rows = np.where(codes >= 0, best[np.maximum(codes, 0)], -1)
+        return [col[r] if r >= 0 else None for r in rows]
 
-    with open(out, "w", newline="") as f:
+def write_rows(path: str, header, rows):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", newline="") as f:
         w = csv.writer(f, delimiter="\t")
-        w.writerow(base_header + [f"expr_{gene}"])
-        for row in merged:
+        w.writerow(header)
+        for row in rows:
             w.writerow(row)
+    os.replace(tmp, path)
+
+def write_gene(path: str, base_header, base_map, gene: str, vals):
+    rows = [brow + [v] for brow, v in zip(base_map.values(), vals) if v is not None]
+    write_rows(path, base_header + [f"expr_{gene}"], rows)
+
+def main():
+    if len(sys.argv) == 5 and not sys.argv[1].startswith("-"):
+        base, pheno, gene, out = sys.argv[1:]
+        base_header, base_map = read_base(base)
+        vals = PhenoTable(pheno).column(gene, list(base_map))
+        write_gene(out, base_header, base_map, gene, vals)
+        return
+
+    ap = argparse.ArgumentParser(
+        usage="make_covar_plus_expr.py <base_covar.tsv> <pheno.txt> <expr_gene> <out.tsv>\n"
+              "       make_covar_plus_expr.py --covar C --pheno P (--gene G [G ...] | --all-genes) "
+              "(--out F | --out-dir D | --wide W)")
+    ap.add_argument("--covar", required=True)
+    ap.add_argument("--pheno", required=True)
+    genes = ap.add_mutually_exclusive_group(required=True)
+    genes.add_argument("--gene", nargs="+")
+    genes.add_argument("--all-genes", action="store_true", help="every phenotype column")
+    ap.add_argument("--out", default=None, help="output file (one --gene only)")
+    ap.add_argument("--out-dir", default=None, help="one file per gene")
+    ap.add_argument("--out-pattern", default="covar_plus_expr_{gene}.tsv")
+    ap.add_argument("--wide", default=None, help="one file, expr_<GENE> for every gene")
+    args = ap.parse_args()
+    if not (args.out or args.out_dir or args.wide):
+        ap.error("one of --out, --out-dir, --wide is required")
+
+    base_header, base_map = read_base(args.covar)
+    table = PhenoTable(args.pheno)
+    gene_list = table.genes() if args.all_genes else args.gene
+    if args.out and len(gene_list) != 1:
+        ap.error("--out takes exactly one --gene; use --out-dir for several")
+    keys = list(base_map)
+
+    wide_cols = []
+    for gene in gene_list:
+        vals = table.column(gene, keys)
+        if args.out:
+            write_gene(args.out, base_header, base_map, gene, vals)
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            write_gene(os.path.join(args.out_dir, args.out_pattern.format(gene=gene)),
+                       base_header, base_map, gene, vals)
+        if args.wide:
+            wide_cols.append(["NA" if v is None else v for v in vals])
+
+    if args.wide:
+        rows = [brow + list(extra) for brow, extra in zip(base_map.values(), zip(*wide_cols))] \
+            if wide_cols else list(base_map.values())
+        write_rows(args.wide, base_header + [f"expr_{g}" for g in gene_list], rows)
+    print(f"[OK] covar+expr for {len(gene_list)} gene(s)", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -1,62 +1,167 @@
 # manhattan_genomewide.py (수정 포인트만 포함된 "전체 덮어쓰기" 버전)
+#
+# Each assoc is reduced once to a plot layer kept next to it as
+# <assoc>.manh.npz: SNPs sorted by cumulative X (uint32), -log10P (float32),
+# CHR, chromosome offsets/ticks and the rows above --bin-cutoff. The layer is
+# keyed by the assoc's SHA-1 (size/mtime as a fast path), --test and
+# --bin-cutoff, so single- and multi-panel figures, new titles or another
+# --xtick-step load it instead of reparsing the text. ASSOC_IO_CACHE=0 turns
+# it off together with the assoc_io sidecar.
 import argparse
+import json
+import os
+from typing import Dict
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+import assoc_io
+from assoc_io import file_sha1, file_stat, sidecar_state
+
+LAYER_SUFFIX = ".manh.npz"
+LAYER_VERSION = 1
+
 def read_assoc_linear(path: str, test: str = "ADD") -> pd.DataFrame:
-    df = pd.read_table(path, sep=r"\s+", dtype=str)
     # PLINK --linear output: CHR SNP BP A1 TEST NMISS BETA STAT P
-    df = df[df["TEST"] == test].copy()
-    df["CHR"] = pd.to_numeric(df["CHR"], errors="coerce")
-    df["BP"] = pd.to_numeric(df["BP"], errors="coerce")
-    df["P"] = pd.to_numeric(df["P"], errors="coerce")
-    df = df.dropna(subset=["CHR", "BP", "P"])
+    df = assoc_io.read_assoc_linear(path, test=test, columns=["CHR", "BP", "P"])
+    df = df.dropna(subset=["P"])
     df = df[(df["CHR"] >= 1) & (df["CHR"] <= 22)]
     return df
 
-def manhattan_ax(ax, df: pd.DataFrame, gw_threshold: float, max_points: int, seed: int, xtick_step: int):
-    df = df.sort_values(["CHR", "BP"]).copy()
-    df["LOGP"] = -np.log10(np.clip(df["P"].values, 1e-300, 1.0))
-
-    # downsample (랜덤이 아니라 균일 샘플링 + 상위 신호 보존)
-    if max_points and len(df) > max_points:
-        rng = np.random.default_rng(seed)
-        top = df.nlargest(min(20000, len(df)), "LOGP")
-        rest = df.drop(top.index)
-        k = max_points - len(top)
-        if k > 0 and len(rest) > k:
-            rest = rest.sample(n=k, random_state=seed)
-        df = pd.concat([top, rest], ignore_index=True).sort_values(["CHR", "BP"])
-
-    # cumulative x
-    chr_max = df.groupby("CHR")["BP"].max().to_dict()
-    chr_order = list(range(1, 23))
-    offsets = {}
-    cum = 0
-    for c in chr_order:
-        offsets[c] = cum
-        cum += chr_max.get(c, 0) + 1_000_000  # 1Mb gap
-
-    df["X"] = df.apply(lambda r: r["BP"] + offsets[int(r["CHR"])], axis=1)
-
-    # tick at chr centers
-    ticks = []
-    labels = []
-    for c in chr_order:
-        if c not in chr_max:
-            continue
-        start = offsets[c]
-        end = offsets[c] + chr_max[c]
-        ticks.append((start + end) / 2)
-        labels.append(str(c))
-
-    # alternate color by chr (단색/회색톤)
-    colors = []
-    for c in df["CHR"].astype(int).values:
-        colors.append("0.2" if (c % 2 == 1) else "0.65")
-
-    ax.scatter(df["X"].values, df["LOGP"].values, s=1.0, c=colors, linewidths=0, rasterized=True)
+CHR_GAP = 1_000_000  # 1Mb gap between chromosomes
+CHR_COLORS = ("0.65", "0.2")  # even / odd chromosomes (단색/회색톤)
+
+def chrom_layout(chr_: np.ndarray, bp: np.ndarray):
+    """(offset per CHR 0..22, tick positions, tick labels) for chromosomes 1-22 present."""
+    chr_max = np.full(23, -1, dtype=np.int64)
+    np.maximum.at(chr_max, chr_, bp)
+    present = chr_max >= 0
+    width = np.where(present, chr_max, 0) + CHR_GAP
+    offsets = np.zeros(23, dtype=np.int64)
+    offsets[2:] = np.cumsum(width[1:22])
+    cs = np.flatnonzero(present[1:]) + 1
+    ticks = (offsets[cs] + (offsets[cs] + chr_max[cs])) / 2
+    return offsets, ticks.tolist(), [str(c) for c in cs]
+
+def _binned_layer(ax, x: np.ndarray, logp: np.ndarray, odd: np.ndarray,
+                  xlim, ylim, cutoff: float, cell_px: float = 2.0):
+    """Occupancy raster of the points below cutoff, one cell ~ one marker."""
+    fig = ax.figure
+    pos = ax.get_position()
+    w_px = pos.width * fig.get_figwidth() * fig.dpi
+    h_px = pos.height * fig.get_figheight() * fig.dpi
+    top = min(cutoff, ylim[1])
+    nx = max(1, int(w_px / cell_px))
+    ny = max(1, int(h_px / cell_px * (top - ylim[0]) / (ylim[1] - ylim[0])))
+
+    ix = np.clip(((x - xlim[0]) / (xlim[1] - xlim[0]) * nx).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((logp - ylim[0]) / (top - ylim[0]) * ny).astype(np.int64), 0, ny - 1)
+    cell = iy * nx + ix
+    hit_odd = np.bincount(cell[odd], minlength=nx * ny).reshape(ny, nx) > 0
+    hit_even = np.bincount(cell[~odd], minlength=nx * ny).reshape(ny, nx) > 0
+
+    rgba = np.zeros((ny, nx, 4), dtype=np.float32)
+    for hit, grey in ((hit_even, float(CHR_COLORS[0])), (hit_odd, float(CHR_COLORS[1]))):
+        rgba[hit] = (grey, grey, grey, 1.0)
+    ax.imshow(rgba, extent=(xlim[0], xlim[1], ylim[0], top), origin="lower",
+              aspect="auto", interpolation="nearest", zorder=1)
+
+def build_layer(df: pd.DataFrame, bin_cutoff: float) -> Dict[str, np.ndarray]:
+    """Plot-ready arrays for one assoc (see the header comment)."""
+    chr_ = df["CHR"].to_numpy(dtype=np.int64)
+    bp = df["BP"].to_numpy(dtype=np.int64)
+    logp = -np.log10(np.clip(df["P"].to_numpy(dtype=np.float64), 1e-300, 1.0))
+
+    # cumulative x (layout from every SNP, so sampling never moves chromosomes)
+    offsets, ticks, labels = chrom_layout(chr_, bp)
+    x = bp + offsets[chr_]
+    order = np.argsort(x, kind="stable")
+    logp = logp[order].astype(np.float32)
+    return {
+        "x": x[order].astype(np.uint32 if len(x) == 0 or x.max() < 2**32 else np.int64),
+        "logp": logp, "chr": chr_[order].astype(np.int8),
+        "offsets": offsets, "ticks": np.asarray(ticks, dtype=np.float64),
+        "labels": np.asarray(labels, dtype=str),
+        "top": np.flatnonzero(logp >= bin_cutoff),
+    }
+
+def layer_path(assoc: str) -> str:
+    return assoc + LAYER_SUFFIX
+
+def _save_layer(path: str, layer: Dict[str, np.ndarray], meta: Dict[str, object]) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **layer)
+        os.replace(tmp, path)
+    except OSError:
+        # best-effort, like the assoc_io sidecar
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def load_layer(assoc: str, test: str, bin_cutoff: float) -> Dict[str, np.ndarray]:
+    """Cached plot layer for assoc, rebuilt when its content or parameters change."""
+    if not assoc_io.cache_enabled():
+        return build_layer(read_assoc_linear(assoc, test=test), bin_cutoff)
+
+    params = {"version": LAYER_VERSION, "test": test or "", "bin_cutoff": float(bin_cutoff)}
+    path = layer_path(assoc)
+    sha1 = None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["__meta__"]))
+            if all(meta.get(k) == v for k, v in params.items()):
+                state, sha1 = sidecar_state(meta, assoc)
+                if state != "stale":
+                    layer = {k: z[k] for k in z.files if k != "__meta__"}
+                    if state == "touched":
+                        # refresh the fast-path key only
+                        _save_layer(path, layer, dict(meta, **file_stat(assoc)))
+                    return layer
+    except (OSError, ValueError, KeyError):
+        pass
+
+    layer = build_layer(read_assoc_linear(assoc, test=test), bin_cutoff)
+    _save_layer(path, layer, dict(params, **file_stat(assoc), sha1=sha1 or file_sha1(assoc)))
+    return layer
+
+def manhattan_ax(ax, layer: Dict[str, np.ndarray], gw_threshold: float, max_points: int, seed: int,
+                 xtick_step: int, render: str = "binned", bin_cutoff: float = 3.0):
+    x = layer["x"].astype(np.float64)
+    logp = layer["logp"].astype(np.float64)
+    odd = (layer["chr"] % 2) == 1
+    ticks, labels = layer["ticks"].tolist(), layer["labels"].tolist()
+
+    if render == "points":
+        keep = np.arange(len(x))
+        # downsample (랜덤이 아니라 균일 샘플링 + 상위 신호 보존)
+        if max_points and len(x) > max_points:
+            n_top = min(20000, len(x))
+            top = np.argsort(-logp, kind="stable")[:n_top]
+            rest = np.setdiff1d(keep, top)
+            k = max_points - n_top
+            if k > 0 and len(rest) > k:
+                rest = np.sort(np.random.default_rng(seed).choice(rest, size=k, replace=False))
+            keep = np.concatenate([top, rest])
+        ax.scatter(x[keep], logp[keep], s=1.0, c=np.where(odd[keep], CHR_COLORS[1], CHR_COLORS[0]),
+                   linewidths=0, rasterized=True)
+    else:
+        # bulk below the cutoff -> pixel raster, only the signal above it as markers
+        ymax = max(float(logp.max()) if len(logp) else 0.0, -np.log10(gw_threshold))
+        xmin, xmax = (float(x.min()), float(x.max())) if len(x) else (0.0, 1.0)
+        xpad, ypad = 0.05 * (xmax - xmin), 0.05 * ymax
+        xlim, ylim = (xmin - xpad, xmax + xpad), (-ypad, ymax + ypad)
+        hi = np.zeros(len(x), dtype=bool)
+        hi[layer["top"]] = True
+        low = ~hi
+        _binned_layer(ax, x[low], logp[low], odd[low], xlim, ylim, bin_cutoff)
+        ax.scatter(x[hi], logp[hi], s=1.0, c=np.where(odd[hi], CHR_COLORS[1], CHR_COLORS[0]),
+                   linewidths=0, rasterized=True, zorder=2)
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
 
     ax.axhline(-np.log10(gw_threshold), linewidth=1.0)
     ax.set_xlabel("Chromosome")
@@ -81,7 +186,11 @@ def main():
     ap.add_argument("--suptitle", default=None, help="overall title for multi-panel")
     ap.add_argument("--gw-threshold", type=float, default=5e-8)
     ap.add_argument("--test", default="ADD")
-    ap.add_argument("--max-points", type=int, default=800000)
+    ap.add_argument("--render", choices=["binned", "points"], default="binned",
+                    help="binned: raster the bulk below --bin-cutoff, markers above it; "
+                         "points: scatter (sampled down to --max-points)")
+    ap.add_argument("--bin-cutoff", type=float, default=3.0, help="-log10(P) drawn as markers (binned)")
+    ap.add_argument("--max-points", type=int, default=800000, help="points render only")
     ap.add_argument("--seed", type=int, default=1)
     ap.add_argument("--xtick-step", type=int, default=1)
     args = ap.parse_args()
@@ -93,13 +202,15 @@ def main():
         if len(titles) != len(assoc_list):
             raise SystemExit("[ERR] --titles count mismatch with --assoc")
 
-    dfs = [read_assoc_linear(p, test=args.test) for p in assoc_list]
-    n = len(dfs)
+    # one panel's layer in memory at a time
+    n = len(assoc_list)
 
     if n == 1:
         fig_w, fig_h = 12, 4.8
         fig, ax = plt.subplots(1, 1, figsize=(fig_w, fig_h), dpi=150)
-        manhattan_ax(ax, dfs[0], args.gw_threshold, args.max_points, args.seed, args.xtick_step)
+        layer = load_layer(assoc_list[0], args.test, args.bin_cutoff)
+        manhattan_ax(ax, layer, args.gw_threshold, args.max_points, args.seed, args.xtick_step,
+                     args.render, args.bin_cutoff)
         if args.title:
             ax.set_title(args.title)
         # x축 라벨 크기
@@ -113,7 +224,10 @@ def main():
         if n == 1:
             axes = [axes]
         for i, ax in enumerate(axes):
-            manhattan_ax(ax, dfs[i], args.gw_threshold, args.max_points, args.seed, args.xtick_step)
+            layer = load_layer(assoc_list[i], args.test, args.bin_cutoff)
+            manhattan_ax(ax, layer, args.gw_threshold, args.max_points, args.seed, args.xtick_step,
+                         args.render, args.bin_cutoff)
+            del layer
             ax.tick_params(axis="x", labelsize=8)  # ✅ 글자 조금 줄여서 21/22 겹침 방지
             ax.set_title(titles[i] if titles else f"panel{i+1}")
             if i != 0:
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Multiple-testing corrections in NumPy, shared by the trans/cis collectors.
+
+  bh(p)                      Benjamini-Hochberg q-values
+  storey_pi0(p) / storey(p)  Storey pi0 estimate and q-values (pi0 * BH)
+  hierarchical(p, groups)    per-gene (Simes) then global FDR, as used for
+                             trans-eQTL scans with many SNPs per gene
+  fdr(p, method, groups)     q-value columns + pass mask for --fdr-method
+
+NaN P-values are left out of the test count and get NaN q-values. float32
+input stays float32 (half the memory for tens of millions of tests); float64
+BH matches statsmodels multipletests(method="fdr_bh") exactly. Pass
+presorted=True when P is already ascending to skip the sort.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+METHODS = ("bh", "storey", "hierarchical")
+
+
+def _as_float(p) -> np.ndarray:
+    p = np.asarray(p)
+    return p if p.dtype in (np.float32, np.float64) else p.astype(np.float64)
+
+
+def _bh_sorted(ps: np.ndarray) -> np.ndarray:
+    """BH on ascending, NaN-free P (returns a new array in the same order)."""
+    n = len(ps)
+    ecdf = np.arange(1, n + 1, dtype=ps.dtype) / ps.dtype.type(n)
+    q = ps / ecdf
+    q[::-1] = np.minimum.accumulate(q[::-1])
+    np.minimum(q, 1, out=q)
+    return q
+
+
+def bh(p, presorted: bool = False) -> np.ndarray:
+    """Benjamini-Hochberg q-values aligned to the input order."""
+    p = _as_float(p)
+    ok = ~np.isnan(p)
+    if ok.all():
+        if presorted:
+            return _bh_sorted(p)
+        order = np.argsort(p, kind="mergesort")
+        q = np.empty_like(p)
+        q[order] = _bh_sorted(p[order])
+        return q
+    q = np.full(p.shape, np.nan, dtype=p.dtype)
+    if ok.any():
+        q[ok] = bh(p[ok], presorted=presorted)
+    return q
+
+
+def storey_pi0(p, lam: float = 0.5) -> float:
+    """Storey's pi0 = #{p > lam} / (m (1 - lam)), capped at 1."""
+    p = _as_float(p)
+    p = p[~np.isnan(p)]
+    if len(p) == 0:
+        return 1.0
+    return float(min(1.0, np.count_nonzero(p > lam) / (len(p) * (1.0 - lam))))
+
+
+def storey(p, lam: float = 0.5, pi0: Optional[float] = None,
+           presorted: bool = False) -> np.ndarray:
+    """Storey q-values: pi0 * BH (pi0 estimated at `lam` unless given)."""
+    p = _as_float(p)
+    if pi0 is None:
+        pi0 = storey_pi0(p, lam)
+    q = bh(p, presorted=presorted)
+    q *= q.dtype.type(pi0)
+    return q
+
+
+def hierarchical(p, groups: Sequence, alpha: float = 0.05) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Two-level FDR: genes first (Simes + BH), then SNPs within selected genes.
+
+    Returns per-row (gene_q, local_q, reject):
+      gene_q   BH q-value of the row's gene, over genes, from its Simes P
+      local_q  BH q-value within the gene
+      reject   gene_q <= alpha and local_q <= alpha * R / G, where R genes of G
+               were selected (the level-2 threshold of the hierarchical procedure)
+    Rows with NaN P get NaN q-values and are never rejected.
+    """
+    p = _as_float(p)
+    groups = np.asarray(groups)
+    if groups.shape != p.shape:
+        raise ValueError("p and groups must have the same length")
+
+    gene_q = np.full(p.shape, np.nan, dtype=p.dtype)
+    local_q = np.full(p.shape, np.nan, dtype=p.dtype)
+    reject = np.zeros(p.shape, dtype=bool)
+    ok = np.flatnonzero(~np.isnan(p))
+    if len(ok) == 0:
+        return gene_q, local_q, reject
+
+    _, code = np.unique(groups[ok], return_inverse=True)
+    code = code.ravel()
+    order = np.lexsort((p[ok], code))           # by gene, then P ascending
+    rows = ok[order]
+    g = code[order]
+    ps = p[rows]
+
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    sizes = np.diff(np.r_[starts, len(g)])
+    rank = np.arange(len(g)) - np.repeat(starts, sizes) + 1
+    size = np.repeat(sizes, sizes)
+    raw = ps / (rank.astype(ps.dtype) / size.astype(ps.dtype))
+
+    simes = np.minimum.reduceat(raw, starts)
+    gq = bh(simes)
+
+    # reverse cumulative min within each gene in one accumulate: the key is the
+    # value's global rank offset by gene * n, so a later (higher) gene never
+    # carries its minimum into an earlier one; integer keys keep q exact
+    n = len(raw)
+    clipped = np.minimum(raw, 1)
+    by_value = np.argsort(clipped, kind="mergesort")
+    key = np.empty(n, dtype=np.int64)
+    key[by_value] = np.arange(n, dtype=np.int64)
+    base = g.astype(np.int64) * n
+    key += base
+    key[::-1] = np.minimum.accumulate(key[::-1])
+    lq = clipped[by_value[key - base]]
+
+    gene_q[rows] = np.repeat(gq, sizes)
+    local_q[rows] = lq
+    n_sel = int(np.count_nonzero(gq <= alpha))
+    if n_sel:
+        level2 = alpha * n_sel / len(gq)
+        reject[rows] = (gene_q[rows] <= alpha) & (lq <= level2)
+    return gene_q, local_q, reject
+
+
+def fdr(p, method: str = "bh", groups: Optional[Sequence] = None,
+        alpha: float = 0.05) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Output columns and pass mask (at `alpha`) for one of METHODS.
+
+      bh            {"q_bh"}               pass: q_bh <= alpha
+      storey        {"q_storey"}           pass: q_storey <= alpha
+      hierarchical  {"q_gene", "q_local"}  pass: hierarchical reject (needs groups)
+    """
+    if method == "bh":
+        q = bh(p)
+        return {"q_bh": q}, q <= alpha
+    if method == "storey":
+        q = storey(p)
+        return {"q_storey": q}, q <= alpha
+    if method == "hierarchical":
+        if groups is None:
+            raise ValueError("hierarchical FDR needs groups")
+        gene_q, local_q, reject = hierarchical(p, groups, alpha=alpha)
+        return {"q_gene": gene_q, "q_local": local_q}, reject
+    raise ValueError(f"unknown FDR method: {method} (expected one of {METHODS})")
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Per-invocation performance ledger for the pipeline's PLINK / Python / Rscript calls.
+
+The step scripts run every tool through perf_run (scripts/_perf.sh), which
+calls `perf_ledger.py run -- CMD ...`. That runs CMD unchanged (same stdio,
+same exit code) and appends one JSON line to the run's ledger
+(result/perf/<PERF_RUN>.jsonl):
+
+  run step tool task cmd start rc
+  wall_s user_s sys_s       wall clock and CPU of CMD and its children
+  max_rss_mb                peak resident set of the largest process
+  read_bytes write_bytes    block I/O (page-cache hits do not count)
+  in_files in_bytes         existing files named on the command line
+                            (a PLINK prefix counts .bed/.bim/.fam)
+  out_files out_bytes       files it (re)wrote: named on the command line, or
+                            PREFIX.* / files in DIR for --out*/--outdir args
+
+`task` is what to rank by: the script (+ subcommand) for python/Rscript and
+the main mode for PLINK (plink --linear, plink --r2, ...). pipeline_dag.py
+adds one tool=step line per step with the step's totals.
+
+  perf_ledger.py summary RUN [--by task|step|tool] [--top N]
+  perf_ledger.py compare OLD NEW [--max-ratio 1.5]
+
+RUN is a ledger path or a run id under PERF_DIR (default result/perf).
+compare ranks tasks by wall-time change and, with --max-ratio, exits 1 when
+any task got slower or bigger than that ratio (regression gate).
+"""
+
+import argparse
+import glob
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+PLINK_MODES = ("--linear", "--logistic", "--assoc", "--r2", "--r", "--pca", "--indep-pairwise",
+               "--freq", "--make-bed", "--recode", "--clump", "--extract")
+MB = 1 << 20
+
+
+def default_dir():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.environ.get("PERF_DIR") or os.path.normpath(os.path.join(here, "..", "result", "perf"))
+
+
+def resolve(run):
+    """Ledger path for a path or a run id."""
+    if os.path.exists(run):
+        return run
+    path = os.path.join(default_dir(), run if run.endswith(".jsonl") else run + ".jsonl")
+    if not os.path.exists(path):
+        raise SystemExit(f"[ERR] no ledger: {run}")
+    return path
+
+
+def append(ledger, record):
+    """One JSON line; a single O_APPEND write, so concurrent steps can share a ledger."""
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(ledger)), exist_ok=True)
+        line = (json.dumps(record, sort_keys=False) + "\n").encode()
+        fd = os.open(ledger, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"[WARN] perf ledger not written ({ledger}): {e}", file=sys.stderr)
+
+
+def read_ledger(path):
+    out = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    continue
+    return out
+
+
+def usage_record(ru, wall):
+    return {
+        "wall_s": round(wall, 3),
+        "user_s": round(ru.ru_utime, 3),
+        "sys_s": round(ru.ru_stime, 3),
+        "max_rss_mb": round(ru.ru_maxrss / 1024.0, 1),   # Linux: KiB
+        "read_bytes": ru.ru_inblock * 512,
+        "write_bytes": ru.ru_oublock * 512,
+    }
+
+
+# ----------------------------
+# command classification / file accounting
+# ----------------------------
+def tool_task(cmd):
+    exe = os.path.basename(cmd[0])
+    if "plink" in exe.lower():
+        mode = next((m for m in PLINK_MODES if m in cmd), "")
+        return "plink", f"plink {mode}".strip()
+    if exe.startswith("python") or exe == "Rscript":
+        tool = "python" if exe.startswith("python") else "Rscript"
+        rest = cmd[1:]
+        if rest and rest[0] in ("-c", "-e"):
+            return tool, f"{tool} {rest[0]}"
+        if rest and rest[0] == "-m" and len(rest) > 1:
+            return tool, rest[1]
+        if not rest:
+            return tool, tool
+        task = os.path.basename(rest[0])
+        # subcommand CLIs (bim_index.py window, ld_store.py build, ...)
+        if len(rest) > 1 and not rest[1].startswith("-") and rest[1].isidentifier():
+            task += " " + rest[1]
+        return tool, task
+    return exe, exe
+
+
+def arg_paths(cmd):
+    """(paths named on the command line, output prefixes/dirs from --out* options)."""
+    paths, prefixes = [], []
+    skip = 2 if os.path.basename(cmd[0]).startswith("python") or os.path.basename(cmd[0]) == "Rscript" else 1
+    prev = ""
+    for tok in cmd[skip:]:
+        if prev == "--bfile":
+            paths.extend(tok + ext for ext in (".bed", ".bim", ".fam"))
+        elif prev.startswith("--out"):
+            prefixes.append(tok)
+        if not tok.startswith("-"):
+            for p in tok.split(","):
+                if p and not os.path.exists(p) and os.path.exists(p + ".bed"):
+                    paths.extend(p + ext for ext in (".bed", ".bim", ".fam"))   # bfile prefix
+                elif p:
+                    paths.append(p)
+        prev = tok
+    return paths, prefixes
+
+
+def file_sizes(paths):
+    out = {}
+    for p in paths:
+        try:
+            if os.path.isfile(p):
+                out[os.path.abspath(p)] = os.path.getsize(p)
+        except OSError:
+            continue
+    return out
+
+
+def written_since(paths, prefixes, t0_ns):
+    cands = set(paths)
+    for p in prefixes:
+        if os.path.isdir(p):
+            cands.update(os.path.join(p, f) for f in os.listdir(p))
+        else:
+            cands.update(glob.glob(glob.escape(p) + "*"))
+    out = {}
+    for p in cands:
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        if os.path.isfile(p) and st.st_mtime_ns >= t0_ns:
+            out[os.path.abspath(p)] = st.st_size
+    return out
+
+
+def measure(cmd, **popen_kw):
+    """Run cmd to completion: (exit code, usage_record) or (None, None) if it cannot start.
+
+    Negative exit codes are signals, as in subprocess.
+    """
+    t0 = time.monotonic()
+    # the child gets the terminal's signals itself; the wrapper only waits
+    old_int = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        try:
+            proc = subprocess.Popen(cmd, **popen_kw)
+        except OSError as e:
+            print(f"[ERR] {cmd[0]}: {e}", file=sys.stderr)
+            return None, None
+        _, status, ru = os.wait4(proc.pid, 0)
+    finally:
+        signal.signal(signal.SIGINT, old_int)
+    rc = os.waitstatus_to_exitcode(status)
+    proc.returncode = rc
+    return rc, usage_record(ru, time.monotonic() - t0)
+
+
+def run_cmd(args):
+    cmd = args.cmd[1:] if args.cmd and args.cmd[0] == "--" else args.cmd
+    if not cmd:
+        raise SystemExit("[ERR] perf_ledger.py run: no command")
+    if not args.ledger:
+        os.execvp(cmd[0], cmd)
+
+    paths, prefixes = arg_paths(cmd)
+    before = file_sizes(paths)
+    t0_ns = time.time_ns()
+    rc, usage = measure(cmd)
+    if rc is None:
+        return 127
+    outputs = written_since(paths, prefixes, t0_ns)
+    inputs = {p: s for p, s in before.items() if p not in outputs}
+    tool, task = tool_task(cmd)
+    rec = {
+        "run": os.environ.get("PERF_RUN", ""),
+        "step": args.step or os.environ.get("PERF_STEP", ""),
+        "tool": tool,
+        "task": args.label or task,
+        "cmd": " ".join(shlex.quote(c) for c in cmd)[:2000],
+        "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t0_ns / 1e9)),
+        "host": socket.gethostname(),
+        "rc": rc,
+    }
+    rec.update(usage)
+    rec.update({
+        "in_files": len(inputs), "in_bytes": sum(inputs.values()),
+        "out_files": len(outputs), "out_bytes": sum(outputs.values()),
+    })
+    append(args.ledger, rec)
+    return 128 - rc if rc < 0 else rc
+
+
+# ----------------------------
+# summary / compare
+# ----------------------------
+def aggregate(records, by):
+    if by == "step":
+        steps = [r for r in records if r.get("tool") == "step"]
+        records = steps or [r for r in records if r.get("tool") != "step"]
+    else:
+        records = [r for r in records if r.get("tool") != "step"]
+    agg = {}
+    for r in records:
+        key = r.get(by) or "-"
+        a = agg.setdefault(key, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_rss_mb": 0.0,
+                                 "read_bytes": 0, "write_bytes": 0, "in_bytes": 0, "out_bytes": 0,
+                                 "failed": 0})
+        a["calls"] += 1
+        a["wall_s"] += r.get("wall_s", 0.0)
+        a["cpu_s"] += r.get("user_s", 0.0) + r.get("sys_s", 0.0)
+        a["max_rss_mb"] = max(a["max_rss_mb"], r.get("max_rss_mb", 0.0))
+        for k in ("read_bytes", "write_bytes", "in_bytes", "out_bytes"):
+            a[k] += r.get(k, 0)
+        a["failed"] += int(r.get("rc", 0) != 0)
+    return agg
+
+
+def fmt_mb(n):
+    return f"{n / MB:.1f}"
+
+
+def summary(args):
+    path = resolve(args.run)
+    agg = aggregate(read_ledger(path), args.by)
+    total = sum(a["wall_s"] for a in agg.values()) or 1.0
+    rows = sorted(agg.items(), key=lambda kv: -kv[1]["wall_s"])[:args.top or None]
+    print(f"# {path}  (by {args.by}; wall summed over calls)")
+    print("\t".join([args.by, "calls", "wall_s", "wall_%", "cpu_s", "max_rss_mb",
+                     "read_mb", "write_mb", "in_mb", "out_mb", "failed"]))
+    for key, a in rows:
+        print("\t".join([key, str(a["calls"]), f"{a['wall_s']:.2f}", f"{100 * a['wall_s'] / total:.1f}",
+                         f"{a['cpu_s']:.2f}", f"{a['max_rss_mb']:.1f}",
+                         fmt_mb(a["read_bytes"]), fmt_mb(a["write_bytes"]),
+                         fmt_mb(a["in_bytes"]), fmt_mb(a["out_bytes"]), str(a["failed"])]))
+
+
+def ratio(new, old):
+    return new / old if old > 0 else (float("inf") if new > 0 else 1.0)
+
+
+def compare(args):
+    old = aggregate(read_ledger(resolve(args.old)), args.by)
+    new = aggregate(read_ledger(resolve(args.new)), args.by)
+    keys = sorted(set(old) | set(new),
+                  key=lambda k: -abs(new.get(k, {}).get("wall_s", 0.0) - old.get(k, {}).get("wall_s", 0.0)))
+    print("\t".join([args.by, "wall_old", "wall_new", "wall_x", "rss_old", "rss_new", "rss_x",
+                     "in_mb_old", "in_mb_new", "flag"]))
+    worse = []
+    for k in keys[:args.top or None]:
+        o, n = old.get(k), new.get(k)
+        if o is None or n is None:
+            flag = "only_new" if o is None else "only_old"
+            o = o or {"wall_s": 0.0, "max_rss_mb": 0.0, "in_bytes": 0}
+            n = n or {"wall_s": 0.0, "max_rss_mb": 0.0, "in_bytes": 0}
+            wx = rx = float("nan")
+        else:
+            wx = ratio(n["wall_s"], o["wall_s"])
+            rx = ratio(n["max_rss_mb"], o["max_rss_mb"])
+            slow = o["wall_s"] >= args.min_wall or n["wall_s"] >= args.min_wall
+            flag = "SLOWER" if args.max_ratio and slow and wx > args.max_ratio else ""
+            if args.max_ratio and rx > args.max_ratio and n["max_rss_mb"] >= args.min_rss_mb:
+                flag = (flag + ",BIGGER").lstrip(",")
+            if flag:
+                worse.append(k)
+        print("\t".join([k, f"{o['wall_s']:.2f}", f"{n['wall_s']:.2f}", f"{wx:.2f}",
+                         f"{o['max_rss_mb']:.1f}", f"{n['max_rss_mb']:.1f}", f"{rx:.2f}",
+                         fmt_mb(o["in_bytes"]), fmt_mb(n["in_bytes"]), flag]))
+    if worse:
+        print(f"[WARN] {len(worse)} regression(s) over x{args.max_ratio}: {', '.join(worse)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="per-invocation wall/CPU/RSS/IO ledger for pipeline tools")
+    sub = ap.add_subparsers(dest="cmd_name", required=True)
+    r = sub.add_parser("run", help="run a command and append its usage to the ledger")
+    r.add_argument("--ledger", default=os.environ.get("PERF_LEDGER", ""),
+                   help="JSONL ledger (default $PERF_LEDGER; empty = just run the command)")
+    r.add_argument("--step", default=None, help="pipeline step (default $PERF_STEP)")
+    r.add_argument("--label", default=None, help="task name instead of the detected one")
+    r.add_argument("cmd", nargs=argparse.REMAINDER)
+    s = sub.add_parser("summary", help="hottest tasks/steps of one run")
+    s.add_argument("run")
+    s.add_argument("--by", choices=("task", "step", "tool"), default="task")
+    s.add_argument("--top", type=int, default=20)
+    c = sub.add_parser("compare", help="per-task change between two runs")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument("--by", choices=("task", "step", "tool"), default="task")
+    c.add_argument("--top", type=int, default=0)
+    c.add_argument("--max-ratio", type=float, default=0.0,
+                   help="exit 1 if any task's wall or peak RSS grew by more than this factor")
+    c.add_argument("--min-wall", type=float, default=1.0,
+                   help="ignore wall ratios of tasks faster than this in both runs (s)")
+    c.add_argument("--min-rss-mb", type=float, default=50.0,
+                   help="ignore RSS ratios below this peak (MB)")
+    args = ap.parse_args()
+
+    if args.cmd_name == "run":
+        sys.exit(run_cmd(args))
+    if args.cmd_name == "summary":
+        summary(args)
+        return
+    sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
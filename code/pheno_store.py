@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Binary, memory-mapped copy of a PLINK-style phenotype table (FID IID gene...).
+
+The chr%d_GD462.signalGeneQuantRPKM_plink.txt files are wide text that every
+reader re-parsed in full for one or a few columns. The store is built once
+per file into <pheno>.pheno.idx/ as plain .npy arrays that are memory-mapped
+on open:
+
+  values.npy  samples x genes, column-major (one gene = one contiguous run),
+              NaN = missing; float32 when every value round-trips exactly
+              (see `decimals`), float64 otherwise
+  genes.npy   column names (bytes), file order
+  fid.npy     FID per row, file order (duplicates kept, as in the text)
+  iid.npy     IID per row
+
+meta.json records the text's size/mtime and `decimals`: float32 values are
+rounded back to that many decimals on read, which reproduces the float64 the
+text parse gives exactly (checked at build time, else float64 is stored).
+So every consumer sees the same numbers as before, from only the columns it
+asks for. PHENO_STORE_DIR=<dir> keeps stores elsewhere (read-only pheno
+dirs); PHENO_STORE=0 reads the text as before.
+
+Builds hold an exclusive flock on <store>.lock and readers open under a
+shared one (bim_index.dir_lock): steps 03/04/06/07 start side by side and
+all open the PHENO5 store on the first run.
+
+CLI:
+  pheno_store.py build PHENO [PHENO ...]
+  pheno_store.py info  PHENO
+  pheno_store.py get   PHENO GENE [GENE ...]     (FID IID GENE... as TSV)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from bim_index import dir_lock, staged_dir
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STORE_SUFFIX = ".pheno.idx"
+STORE_VERSION = 1
+MISSING_VALUES = ["-9", "NA", "nan", "NaN", "."]
+MAX_DECIMALS = 9
+
+
+def store_enabled() -> bool:
+    return os.environ.get("PHENO_STORE", "1").strip().lower() not in ("0", "no", "false", "off")
+
+
+def store_dir(pheno: str) -> str:
+    root = os.environ.get("PHENO_STORE_DIR", "").strip()
+    if root:
+        return os.path.join(root, os.path.basename(pheno) + STORE_SUFFIX)
+    return pheno + STORE_SUFFIX
+
+
+def _source_key(pheno: str) -> Dict[str, object]:
+    st = os.stat(pheno)
+    return {"version": STORE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_text(pheno: str, columns: Optional[Sequence[str]] = None) -> "pd.DataFrame":
+    """FID/IID + gene columns as float64 (NaN = missing), every row kept, file order."""
+    import pandas as pd
+
+    usecols = None if columns is None else ["FID", "IID"] + list(columns)
+    df = pd.read_csv(pheno, sep=r"\s+", usecols=usecols, dtype={"FID": str, "IID": str},
+                     na_values=MISSING_VALUES, keep_default_na=True, engine="c")
+    for c in df.columns[2:] if columns is None else columns:
+        if df[c].dtype != np.float64:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(np.float64)
+    return df
+
+
+def _compact(x: np.ndarray):
+    """(float32 array, decimals) if rounding float32 back reproduces x exactly, else (x, -1)."""
+    x32 = x.astype(np.float32)
+    back = x32.astype(np.float64)
+    finite = np.isfinite(x)
+    if not np.array_equal(np.isfinite(back), finite):
+        return x, -1
+    xs, bs = x[finite], back[finite]
+    for d in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(bs, d), xs):
+            return x32, d
+    return x, -1
+
+
+def _is_fresh(path: str, pheno: str) -> bool:
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    key = _source_key(pheno)
+    return all(meta.get(k) == v for k, v in key.items())
+
+
+def build_store(pheno: str) -> str:
+    """(Re)build the store for pheno; returns the store directory.
+
+    Call with the exclusive lock held (open_store does).
+    """
+    key = _source_key(pheno)
+    df = read_text(pheno)
+    genes = list(df.columns[2:])
+    values, decimals = _compact(df[genes].to_numpy(dtype=np.float64))
+
+    out = store_dir(pheno)
+    with staged_dir(out) as tmp:
+        np.save(os.path.join(tmp, "values.npy"), np.asfortranarray(values))
+        np.save(os.path.join(tmp, "genes.npy"), np.asarray(genes, dtype=object).astype(bytes))
+        np.save(os.path.join(tmp, "fid.npy"), df["FID"].to_numpy().astype(bytes))
+        np.save(os.path.join(tmp, "iid.npy"), df["IID"].to_numpy().astype(bytes))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(dict(key, n_samples=int(len(df)), n_genes=len(genes),
+                           dtype=str(values.dtype), decimals=int(decimals)), f)
+    return out
+
+
+class PhenoStore:
+    """Memory-mapped view of a built store; use open_store() to get one."""
+
+    def __init__(self, pheno: str, path: str):
+        self.pheno = pheno
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.values = load("values.npy")
+        self.genes: List[str] = [g.decode() for g in np.load(os.path.join(path, "genes.npy"))]
+        self.gene_index: Dict[str, int] = {}
+        for i, g in enumerate(self.genes):
+            self.gene_index.setdefault(g, i)
+        self.fid = np.load(os.path.join(path, "fid.npy")).astype(str)
+        self.iid = np.load(os.path.join(path, "iid.npy")).astype(str)
+        self.decimals = int(self.meta.get("decimals", -1))
+
+    def __contains__(self, gene: str) -> bool:
+        return gene in self.gene_index
+
+    def columns(self, genes: Sequence[str]) -> np.ndarray:
+        """(n_samples, len(genes)) float64 in file row order; KeyError for unknown genes."""
+        idx = [self.gene_index[g] for g in genes]
+        out = np.empty((self.values.shape[0], len(idx)), dtype=np.float64)
+        for j, i in enumerate(idx):
+            out[:, j] = self.values[:, i]
+        if self.decimals >= 0:
+            out = np.round(out, self.decimals)
+        return out
+
+    def column(self, gene: str) -> np.ndarray:
+        return self.columns([gene])[:, 0]
+
+    def sample_rows(self, fam: "pd.DataFrame") -> np.ndarray:
+        """Store row per .fam sample (first occurrence of its FID/IID), -1 where absent."""
+        import pandas as pd
+
+        keys = pd.MultiIndex.from_arrays([self.fid, self.iid])
+        first = ~keys.duplicated(keep="first")
+        uniq = pd.MultiIndex.from_arrays([self.fid[first], self.iid[first]])
+        pos = uniq.get_indexer(pd.MultiIndex.from_frame(fam[["FID", "IID"]].astype(str)))
+        return np.where(pos >= 0, np.flatnonzero(first)[np.maximum(pos, 0)], -1)
+
+    def aligned(self, fam: "pd.DataFrame", genes: Sequence[str]) -> np.ndarray:
+        """(n_fam, len(genes)) float64 in .fam order, NaN where the sample is absent."""
+        rows = self.sample_rows(fam)
+        vals = self.columns(genes)
+        out = np.full((len(rows), len(genes)), np.nan)
+        out[rows >= 0] = vals[rows[rows >= 0]]
+        return out
+
+    def table(self, genes: Sequence[str]) -> "pd.DataFrame":
+        """FID/IID + genes, every row in file order (what read_text gives)."""
+        import pandas as pd
+
+        df = pd.DataFrame(self.columns(genes), columns=list(genes))
+        df.insert(0, "IID", self.iid.astype(object))
+        df.insert(0, "FID", self.fid.astype(object))
+        return df
+
+
+def open_store(pheno: str, rebuild: bool = False) -> PhenoStore:
+    """Store for pheno, building it first if missing or stale."""
+    path = store_dir(pheno)
+    if not rebuild:
+        with dir_lock(path, exclusive=False):
+            if _is_fresh(path, pheno):
+                return PhenoStore(pheno, path)
+    with dir_lock(path, exclusive=True):
+        # re-check: another process may have built it while we waited
+        if rebuild or not _is_fresh(path, pheno):
+            build_store(pheno)
+        return PhenoStore(pheno, path)
+
+
+def read_pheno(pheno: str, columns: Optional[Sequence[str]] = None) -> "pd.DataFrame":
+    """FID/IID + columns (all genes if None), from the store unless PHENO_STORE=0."""
+    if not store_enabled():
+        return read_text(pheno, columns)
+    store = open_store(pheno)
+    if columns is None:
+        columns = store.genes
+    miss = [c for c in columns if c not in store]
+    if miss:
+        raise KeyError(miss)
+    return store.table(columns)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="memory-mapped phenotype matrix for PLINK pheno tables")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="(re)build the store(s)")
+    b.add_argument("pheno", nargs="+")
+    i = sub.add_parser("info", help="print the store's meta")
+    i.add_argument("pheno")
+    g = sub.add_parser("get", help="print FID IID + genes as TSV")
+    g.add_argument("pheno")
+    g.add_argument("genes", nargs="+")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        for p in args.pheno:
+            print(f"[OK] wrote {open_store(p, rebuild=True).path}")
+        return
+
+    store = open_store(args.pheno)
+    if args.cmd == "info":
+        print(json.dumps(dict(store.meta, path=store.path), indent=1))
+        return
+
+    miss = [x for x in args.genes if x not in store]
+    if miss:
+        raise SystemExit(f"[ERR] genes not in {args.pheno}: {miss}")
+    store.table(args.genes).to_csv(sys.stdout, sep="\t", index=False, na_rep="NA")
+
+
+if __name__ == "__main__":
+    main()
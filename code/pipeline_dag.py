@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""Dependency-aware runner for scripts/0*.sh (called by scripts/00_pipeline.sh).
+
+Each step below declares the files it reads and writes and the environment
+parameters its results depend on. Edges come from those declarations (a step
+runs after every step whose outputs it reads), so once 01 has written the PCA
+covariates 02 / 03 / 04 / 06b / 07 run side by side, 05 waits for 03 and 04,
+06 for 03, and 06_transcis for 05.
+
+A step is skipped when its stamp (<RESULTDIR>/.dag/<step>.json) matches:
+
+  key      sha1 over the content of its inputs, its script and the code/ files
+           that script runs (plus their sibling imports), and its parameter
+           values (PRIOR_MULT, WIN, R2TH, EQTL_ENGINE, ...)
+  outputs  sha1 of every declared output as written by the last run, so a
+           missing, partial or hand-edited output re-runs the step
+
+Input paths may be globs; a printf %d (PHENO_PATTERN) matches like *, so the
+trans scan is keyed on every per-chromosome phenotype file. `optional` inputs
+(the GTF, which 05 reads only for offline or fallback annotation) are hashed
+when present and do not block the step when absent.
+
+File hashes are cached by size/mtime (<RESULTDIR>/.dag/hashes.json), so large
+inputs (the .bed) are read once. A step whose upstream re-ran is checked again
+after it finishes: if the upstream outputs came out identical it stays skipped.
+
+Steps are started as soon as their upstream is done and the CPU budget
+(--cpus, default all) has room; a step's `cpus` is its share of the budget and
+is handed to it as OMP/BLAS threads and, where declared, the step's own worker
+variable (FINEMAP_JOBS, SCAN_CORES). Each step logs to .dag/logs/<step>.log
+and adds its wall/CPU/peak RSS to the run's perf ledger (perf_ledger.py).
+
+The scripts keep their own "output exists" shortcuts for partial re-runs;
+they are told REUSE_OUTPUTS=0 whenever the step runs because its key changed
+or it was forced, so stale assoc/LD files from other inputs are not reused.
+
+  pipeline_dag.py                     run every stale step
+  pipeline_dag.py 05                  05 and whatever it needs
+  pipeline_dag.py --from 04           re-run 04 and everything downstream
+  pipeline_dag.py --dry-run           show what would run and why
+  pipeline_dag.py --touch             adopt existing outputs (no stamps yet) as up to date
+"""
+
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import re
+import string
+import subprocess
+import sys
+import time
+
+import perf_ledger
+
+GLOB_CHARS = "*?["
+PRINTF_INT = re.compile(r"%0?\d*d")
+HASH_BLOCK = 1 << 20
+
+LEADS = ["ERAP2_LEAD", "LNPEP_LEAD", "ERAP1_S1", "ERAP1_S2", "ERAP1_S3"]
+BFILE = ["${BFILE}.bed", "${BFILE}.bim", "${BFILE}.fam"]
+LD = ["LD_ENGINE", "LD_STORE_DIR"]
+
+# step, script, inputs, [optional], outputs, params, env, cpus (share of the budget; 0 = all), cpu_env
+STEPS = [
+    dict(step="01", script="01_make_pca_covar.sh",
+         inputs=BFILE,
+         outputs=["${RESULTDIR}/01_pca/covar_pca10.tsv"],
+         params=[],
+         env={"OUTDIR": "${RESULTDIR}/01_pca"},
+         cpus=0),
+    dict(step="02", script="02_genomewide_eqtl.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}"],
+         outputs=["${RESULTDIR}/02_eqtl_genomewide/%s_genomewide.assoc.linear" % g
+                  for g in ("ERAP2", "ERAP1", "LNPEP")]
+                 + ["${FIGDIR}/Fig_genomewide_3genes_manhattan.png"],
+         params=["COVAR_NAMES"],
+         env={"PHENO": "${PHENO5}"},
+         cpus=2),
+    dict(step="03", script="03_signal_check_5q15.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}"],
+         outputs=["${RESULTDIR}/03_signal_check_5q15/signals_summary.tsv",
+                  "${RESULTDIR}/03_signal_check_5q15/locus_figures.tsv"],
+         params=["COVAR_NAMES", "WINDOW_BP", "EQTL_ENGINE"] + LD + LEADS,
+         env={"PHENO": "${PHENO5}", "WINDOW_BP": "${WIN}"},
+         cpus=2),
+    dict(step="04", script="04_finemap_pip_run.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}"],
+         outputs=["${RESULTDIR}/04_finemap_pip/*_pip.tsv",
+                  "${RESULTDIR}/04_finemap_pip/*_credible95.tsv",
+                  "${RESULTDIR}/04_finemap_pip/sensitivity/prior_sensitivity_summary.tsv"],
+         params=["COVAR_NAMES", "WIN", "PRIOR_MULT", "PRIOR_MULT_LIST", "CREDIBLE", "EQTL_ENGINE"] + LEADS,
+         env={"OUTDIR": "${RESULTDIR}/04_finemap_pip", "PHENO": "${PHENO5}"},
+         cpus=4, cpu_env="FINEMAP_JOBS"),
+    dict(step="05", script="05_functional_annot.sh",
+         inputs=["${BFILE}.bim", "${BFILE}.bed", "${BFILE}.fam",
+                 "${RESULTDIR}/03_signal_check_5q15/signals_summary.tsv",
+                 "${RESULTDIR}/04_finemap_pip/*_pip.tsv",
+                 "${RESULTDIR}/04_finemap_pip/*_credible95.tsv"],
+         optional=["${GTF}"],
+         outputs=["${RESULTDIR}/05_functional_annot/functional_candidates_manifest.tsv",
+                  "${TABLEDIR}/functional_candidates/*.top*.tsv"],
+         params=["WINKB", "R2TH", "TOPN", "VEP_ENGINE"] + LD,
+         env={"OUTDIR": "${RESULTDIR}/05_functional_annot",
+              "FINEMAP_DIR": "${RESULTDIR}/04_finemap_pip",
+              "SIGNALS_TSV": "${RESULTDIR}/03_signal_check_5q15/signals_summary.tsv"},
+         cpus=1),
+    dict(step="06", script="06_cross_conditional.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}",
+                         "${RESULTDIR}/03_signal_check_5q15/signals_summary.tsv"],
+         outputs=["${RESULTDIR}/06_cross_conditional/runs.tsv",
+                  "${RESULTDIR}/06_cross_conditional/signals_min.tsv"],
+         params=["COVAR_NAMES", "WIN", "ERAP1_COND_MODE", "EQTL_ENGINE"] + LD + LEADS,
+         env={"OUTDIR": "${RESULTDIR}/06_cross_conditional",
+              "SIGNALS_RAW": "${RESULTDIR}/03_signal_check_5q15/signals_summary.tsv"},
+         cpus=1),
+    dict(step="06_transcis", script="06_transcis_scan.sh",
+         inputs=BFILE + ["${COVAR}", "${TABLEDIR}/functional_candidates/*.top*.tsv",
+                         "${PHENO_DIR}/${PHENO_PATTERN}"],
+         outputs=["${RESULTDIR}/06_transcis_scan/*/*_sig_genome.tsv"],
+         params=["COVAR_NAMES", "PHENO_DIR", "PHENO_PATTERN", "R2TH", "TOPN", "P_RAW", "Q_FDR",
+                 "ERAP1_MODE", "TARGETS_RAW", "SCAN_ENGINE"],
+         env={"OUTROOT": "${RESULTDIR}/06_transcis_scan"},
+         cpus=4, cpu_env="SCAN_CORES"),
+    dict(step="06b", script="06b_CSF2.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}"],
+         outputs=["${RESULTDIR}/06b_CSF2/*_local_lead.txt"],
+         params=["COVAR_NAMES", "GENE", "CENTER_SNP", "WIN_BP"] + LD,
+         env={"OUTDIR": "${RESULTDIR}/06b_CSF2"},
+         cpus=2),
+    dict(step="07", script="07_make_crossconditional_table_figs.sh",
+         inputs=BFILE + ["${PHENO5}", "${COVAR}"],
+         outputs=["${TABLEDIR}/crossconditional_ERAP1_ERAP2_LNPEP_attenuation.tsv",
+                  "${TABLEDIR}/crossconditional_ERAP1_CSF2_attenuation.tsv"],
+         params=["COVAR_NAMES", "CENTER_SNP", "WIN", "EQTL_ENGINE"] + LD + LEADS,
+         env={"OUTDIR": "${RESULTDIR}/07_crossconditional"},
+         cpus=1),
+]
+
+
+def is_glob(path):
+    return any(c in path for c in GLOB_CHARS)
+
+
+def overlaps(a, b):
+    """True if path patterns a and b can name the same file (or one contains the other)."""
+    if a == b or a.startswith(b.rstrip("/") + "/") or b.startswith(a.rstrip("/") + "/"):
+        return True
+    return fnmatch.fnmatchcase(a, b) or fnmatch.fnmatchcase(b, a)
+
+
+def expand(path):
+    """Files named by a path / glob / directory, sorted ([] if none exist)."""
+    if is_glob(path):
+        hits = sorted(glob.glob(path))
+    else:
+        hits = [path] if os.path.exists(path) else []
+    out = []
+    for h in hits:
+        if os.path.isdir(h):
+            for d, dirs, files in os.walk(h):
+                dirs.sort()
+                out.extend(os.path.join(d, f) for f in sorted(files))
+        else:
+            out.append(h)
+    return out
+
+
+class HashCache:
+    """sha1 per file, recomputed only when size or mtime changed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def file(self, path):
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        e = self.entries.get(key)
+        if e and e["size"] == st.st_size and e["mtime_ns"] == st.st_mtime_ns:
+            return e["sha1"]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+        self.entries[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": h.hexdigest()}
+        self.dirty = True
+        return h.hexdigest()
+
+    def paths(self, patterns):
+        """{pattern: {file: sha1}} for each declared path (empty dict = nothing there)."""
+        return {p: {f: self.file(f) for f in expand(p)} for p in patterns}
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def code_deps(script, codedir):
+    """code/ files a step script runs, plus the sibling modules they import."""
+    with open(script) as f:
+        text = f.read()
+    names = set(re.findall(r"\b([\w.]+\.(?:py|R))\b", text))
+    todo = [os.path.join(codedir, n) for n in names if os.path.exists(os.path.join(codedir, n))]
+    seen = set()
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        if not path.endswith(".py"):
+            continue
+        with open(path) as f:
+            for m in re.finditer(r"^\s*(?:from|import)\s+(\w+)", f.read(), re.M):
+                dep = os.path.join(codedir, m.group(1) + ".py")
+                if os.path.exists(dep):
+                    todo.append(dep)
+    return sorted(seen)
+
+
+class Step:
+    def __init__(self, decl, env, scriptdir, codedir):
+        sub = lambda s: string.Template(s).substitute(env)
+        path = lambda s: PRINTF_INT.sub("*", sub(s))
+        self.name = decl["step"]
+        self.script = os.path.join(scriptdir, decl["script"])
+        self.inputs = [path(p) for p in decl["inputs"]]
+        self.optional = [path(p) for p in decl.get("optional", [])]
+        self.outputs = [sub(p) for p in decl["outputs"]]
+        self.env = {k: sub(v) for k, v in decl["env"].items()}
+        self.params = {k: self.env.get(k, env.get(k, "")) for k in decl["params"]}
+        self.cpus = decl["cpus"]
+        self.cpu_env = decl.get("cpu_env")
+        self.code = [self.script] + code_deps(self.script, codedir)
+        self.upstream = []
+        self.downstream = []
+
+    def key(self, hashes):
+        """sha1 over input content, the step's code and its parameter values."""
+        payload = {
+            "inputs": hashes.paths(self.inputs + self.optional),
+            "code": {os.path.basename(p): hashes.file(p) for p in self.code},
+            "params": self.params,
+            "env": self.env,
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def build_graph(steps):
+    for s in steps:
+        for t in steps:
+            if t is s:
+                continue
+            if any(overlaps(i, o) for i in s.inputs + s.optional for o in t.outputs):
+                s.upstream.append(t)
+                t.downstream.append(s)
+    # topological order (declaration order among independent steps)
+    order, done = [], set()
+
+    def visit(s, path):
+        if s.name in done:
+            return
+        if s.name in path:
+            raise SystemExit(f"[ERR] dependency cycle: {' -> '.join(path + [s.name])}")
+        for u in s.upstream:
+            visit(u, path + [s.name])
+        done.add(s.name)
+        order.append(s)
+
+    for s in steps:
+        visit(s, [])
+    return order
+
+
+def closure(steps, start, attr):
+    out, todo = set(), list(start)
+    while todo:
+        s = todo.pop()
+        if s.name in out:
+            continue
+        out.add(s.name)
+        todo.extend(getattr(s, attr))
+    return out
+
+
+class Runner:
+    def __init__(self, steps, dag_dir, cpus, hashes):
+        self.steps = steps
+        self.dag_dir = dag_dir
+        self.log_dir = os.path.join(dag_dir, "logs")
+        self.cpus = cpus
+        self.hashes = hashes
+
+    def stamp_path(self, step):
+        return os.path.join(self.dag_dir, f"{step.name}.json")
+
+    def load_stamp(self, step):
+        try:
+            with open(self.stamp_path(step)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def check(self, step, forced):
+        """(reason to run or None, reuse_outputs, key); key is None if an input is missing."""
+        missing = [p for p in step.inputs if not expand(p)]
+        if missing:
+            return f"missing input {missing[0]}", True, None
+        key = step.key(self.hashes)
+        if forced:
+            return "forced", False, key
+        stamp = self.load_stamp(step)
+        if stamp is None:
+            return "no stamp", True, key
+        if stamp.get("key") != key:
+            return "inputs/params changed", False, key
+        outputs = self.hashes.paths(step.outputs)
+        for p in step.outputs:
+            if not outputs[p]:
+                return f"missing output {p}", True, key
+        if outputs != stamp.get("outputs"):
+            return "outputs changed since last run", True, key
+        return None, True, key
+
+    def write_stamp(self, step, key, wall):
+        outputs = self.hashes.paths(step.outputs)
+        empty = [p for p in step.outputs if not outputs[p]]
+        if empty:
+            raise RuntimeError(f"step {step.name} did not produce {empty[0]}")
+        stamp = {"step": step.name, "key": key, "params": step.params, "outputs": outputs,
+                 "finished": time.strftime("%Y-%m-%d %H:%M:%S"), "wall_s": round(wall, 1)}
+        tmp = f"{self.stamp_path(step)}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(stamp, f, indent=1)
+        os.replace(tmp, self.stamp_path(step))
+
+    def share(self, step):
+        return self.cpus if step.cpus <= 0 else min(step.cpus, self.cpus)
+
+    def launch(self, step, reuse):
+        n = self.share(step)
+        env = dict(os.environ)
+        env.update(step.env)
+        env["REUSE_OUTPUTS"] = "1" if reuse else "0"
+        env["PERF_STEP"] = step.name
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            env[var] = str(n)
+        if step.cpu_env:
+            env[step.cpu_env] = str(n)
+        log = open(os.path.join(self.log_dir, f"{step.name}.log"), "w")
+        proc = subprocess.Popen(["bash", step.script], env=env, stdout=log, stderr=subprocess.STDOUT)
+        return proc, log
+
+    def touch(self, selected):
+        """Stamp selected steps as up to date with their current outputs, without running them."""
+        rc = 0
+        for s in self.steps:
+            if s.name not in selected:
+                continue
+            reason, _, key = self.check(s, False)
+            try:
+                if key is None:
+                    raise RuntimeError(reason)
+                self.write_stamp(s, key, 0.0)
+            except RuntimeError as e:
+                print(f"[ERR] {s.name}: {e}", file=sys.stderr)
+                rc = 1
+                continue
+            print(f"[OK] stamped {s.name}")
+        self.hashes.save()
+        return rc
+
+    def record(self, step, rc, ru, wall, t0):
+        """Step totals (the step's own tool calls are in the same ledger) for perf_ledger.py."""
+        ledger = os.environ.get("PERF_LEDGER", "")
+        if not ledger:
+            return
+        rec = {"run": os.environ.get("PERF_RUN", ""), "step": step.name, "tool": "step",
+               "task": os.path.basename(step.script), "cmd": step.script,
+               "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t0)), "rc": rc}
+        rec.update(perf_ledger.usage_record(ru, wall))
+        ins = [f for p in step.inputs + step.optional for f in expand(p)]
+        outs = [f for p in step.outputs for f in expand(p)]
+        rec.update({"in_files": len(ins), "in_bytes": sum(os.path.getsize(f) for f in ins),
+                    "out_files": len(outs), "out_bytes": sum(os.path.getsize(f) for f in outs)})
+        perf_ledger.append(ledger, rec)
+
+    def run(self, selected, forced, dry_run=False):
+        os.makedirs(self.log_dir, exist_ok=True)
+        todo = [s for s in self.steps if s.name in selected]
+        state = {}          # name -> "ran" | "skipped" | "failed"
+        running = {}        # name -> (step, proc, log, key, t0, n)
+        used = 0
+        failed = False
+
+        if dry_run:
+            will_run = set()
+            for s in todo:
+                if s.name not in forced and any(u.name in will_run for u in s.upstream):
+                    reason, reuse = "upstream re-runs", True
+                else:
+                    reason, reuse, _ = self.check(s, s.name in forced)
+                if reason is None:
+                    print(f"[SKIP] {s.name}: up to date")
+                else:
+                    will_run.add(s.name)
+                    print(f"[RUN] {s.name}: {reason} (cpus={self.share(s)}, reuse={int(reuse)})")
+            self.hashes.save()
+            return 0
+
+        while todo or running:
+            started = False
+            for s in list(todo):
+                if failed:
+                    break
+                ups = [u.name for u in s.upstream if u.name in selected]
+                if any(u not in state for u in ups):
+                    continue
+                if any(state[u] == "failed" for u in ups):
+                    todo.remove(s)
+                    state[s.name] = "failed"
+                    print(f"[SKIP] {s.name}: upstream failed")
+                    continue
+                n = self.share(s)
+                if running and used + n > self.cpus:
+                    continue
+                reason, reuse, key = self.check(s, s.name in forced)
+                if reason is None:
+                    todo.remove(s)
+                    state[s.name] = "skipped"
+                    print(f"[SKIP] {s.name}: up to date")
+                    continue
+                if key is None:
+                    todo.remove(s)
+                    state[s.name] = "failed"
+                    failed = True
+                    print(f"[ERR] {s.name}: {reason}", file=sys.stderr)
+                    continue
+                self.hashes.save()
+                todo.remove(s)
+                proc, log = self.launch(s, reuse)
+                running[s.name] = (s, proc, log, key, time.time(), n)
+                used += n
+                started = True
+                print(f"[{time.strftime('%H:%M:%S')}] [RUN] {s.name}: {reason} (cpus={n}) "
+                      f"log={log.name}")
+            if failed and not running:
+                break
+            if started:
+                continue
+            if not running:
+                if todo:
+                    # only reachable if selected upstream is missing from the plan
+                    raise SystemExit(f"[ERR] cannot schedule: {[s.name for s in todo]}")
+                break
+            time.sleep(0.2)
+            for name, (s, proc, log, key, t0, n) in list(running.items()):
+                pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+                if pid == 0:
+                    continue
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                log.close()
+                del running[name]
+                used -= n
+                wall = time.time() - t0
+                self.record(s, proc.returncode, ru, wall, t0)
+                if proc.returncode != 0:
+                    state[name] = "failed"
+                    failed = True
+                    print(f"[ERR] {name} exited {proc.returncode} after {wall:.0f}s, see {log.name}",
+                          file=sys.stderr)
+                    continue
+                try:
+                    self.write_stamp(s, key, wall)
+                except RuntimeError as e:
+                    state[name] = "failed"
+                    failed = True
+                    print(f"[ERR] {e}, see {log.name}", file=sys.stderr)
+                    continue
+                state[name] = "ran"
+                print(f"[{time.strftime('%H:%M:%S')}] [OK] {name} ({wall:.0f}s)")
+            self.hashes.save()
+
+        self.hashes.save()
+        ran = [n for n, v in state.items() if v == "ran"]
+        bad = [n for n, v in state.items() if v == "failed"]
+        if bad:
+            print(f"[ERR] failed: {' '.join(bad)}; not run: {' '.join(s.name for s in todo) or '-'}",
+                  file=sys.stderr)
+        else:
+            print(f"[OK] ran: {' '.join(ran) or '-'}")
+        if ran and os.environ.get("PERF_LEDGER"):
+            print(f"[OK] perf ledger: {os.environ['PERF_LEDGER']} (code/perf_ledger.py summary)")
+        return 1 if bad or failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="run scripts/0*.sh as a dependency graph with content-hash skips")
+    ap.add_argument("targets", nargs="*", help="steps to bring up to date (default: all) plus their upstream")
+    ap.add_argument("--from", dest="from_step", action="append", default=[],
+                    help="re-run this step and everything downstream of it (repeatable)")
+    ap.add_argument("--force", action="store_true", help="re-run the targets (default: every step)")
+    ap.add_argument("--cpus", type=int, default=0, help="CPU budget (default: all cores)")
+    ap.add_argument("--dry-run", action="store_true", help="print what would run and why")
+    ap.add_argument("--touch", action="store_true",
+                    help="stamp the selected steps' current outputs as up to date (adopt an existing result/)")
+    ap.add_argument("--list", action="store_true", help="print steps with their upstream and exit")
+    ap.add_argument("--dag-dir", default=None, help="stamps/logs (default: $RESULTDIR/.dag)")
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    for var in ("SCRIPTDIR", "CODEDIR", "RESULTDIR"):
+        if not env.get(var):
+            raise SystemExit(f"[ERR] {var} not set; run via scripts/00_pipeline.sh")
+    try:
+        steps = [Step(d, env, env["SCRIPTDIR"], env["CODEDIR"]) for d in STEPS]
+    except KeyError as e:
+        raise SystemExit(f"[ERR] step declaration needs ${e.args[0]}")
+    order = build_graph(steps)
+    by_name = {s.name: s for s in order}
+
+    if args.list:
+        for s in order:
+            ups = ",".join(u.name for u in s.upstream) or "-"
+            print(f"{s.name}\tafter={ups}\tcpus={s.cpus or 'all'}\t{os.path.basename(s.script)}")
+        return
+
+    for n in args.targets + args.from_step:
+        if n not in by_name:
+            raise SystemExit(f"[ERR] unknown step: {n} (have: {' '.join(by_name)})")
+    targets = [by_name[n] for n in args.targets] or order
+    selected = closure(order, targets, "upstream")
+    if args.force:
+        forced = {s.name for s in targets}
+    else:
+        forced = closure(order, [by_name[n] for n in args.from_step], "downstream") & selected
+
+    cpus = args.cpus if args.cpus > 0 else (os.cpu_count() or 1)
+    dag_dir = args.dag_dir or os.path.join(env["RESULTDIR"], ".dag")
+    os.makedirs(dag_dir, exist_ok=True)
+    hashes = HashCache(os.path.join(dag_dir, "hashes.json"))
+    runner = Runner(order, dag_dir, cpus, hashes)
+    if args.touch:
+        sys.exit(runner.touch(selected))
+    sys.exit(runner.run(selected, forced, dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
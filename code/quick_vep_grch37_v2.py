@@ -1,17 +1,14 @@
 #!/usr/bin/env python3
-import sys
-import time
-import json
-import requests
-from typing import List, Dict, Any, Optional
+import argparse
+import os
+from typing import List, Dict, Any
 
-VEP_URL = "https://grch37.rest.ensembl.org/vep/human/id"
-HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+from vep_cache import VEP_URL, VepCache, annotate
 
-# Ensembl REST는 과도 호출하면 429가 뜸 -> 배치 + backoff
+# Ensembl REST는 과도 호출하면 429가 뜸 -> 배치 + token bucket (vep_cache)
 BATCH = 150
-SLEEP_SEC = 0.25
-MAX_RETRY = 6
+WORKERS = 4
+RATE = 10.0   # requests/s across all workers (Ensembl allows 15)
 
 def read_rsids(path: str) -> List[str]:
     rsids = []
@@ -80,20 +77,6 @@ def flatten_one(entry: Dict[str, Any]) -> Dict[str, Any]:
     out["CADD_PHRED_max"] = ""  # REST 기본 응답엔 보통 없음(빈칸 유지)
     return out
 
-def post_ids(ids: List[str]) -> List[Dict[str, Any]]:
-    payload = {"ids": ids}
-    backoff = 1.0
-    for attempt in range(MAX_RETRY):
-        r = requests.post(VEP_URL, headers=HEADERS, data=json.dumps(payload), timeout=60)
-        if r.status_code == 200:
-            return r.json()
-        if r.status_code in (429, 500, 502, 503, 504):
-            time.sleep(backoff)
-            backoff *= 1.8
-            continue
-        raise RuntimeError(f"VEP request failed: status={r.status_code} body={r.text[:300]}")
-    raise RuntimeError("VEP request failed after retries (rate limit / server error)")
-
 def write_tsv(rows: List[Dict[str, Any]], out_path: str) -> None:
     cols = [
         "SNP",
@@ -115,26 +98,35 @@ def write_tsv(rows: List[Dict[str, Any]], out_path: str) -> None:
             w.write("\t".join(str(row.get(c, "")) for c in cols) + "\n")
 
 def main():
-    if len(sys.argv) != 3:
-        print(f"Usage: {sys.argv[0]} <rsids.txt> <out.tsv>", file=sys.stderr)
-        sys.exit(2)
-
-    rsids_path = sys.argv[1]
-    out_tsv = sys.argv[2]
-
-    rsids = read_rsids(rsids_path)
-    rows: List[Dict[str, Any]] = []
-
-    for i in range(0, len(rsids), BATCH):
-        batch = rsids[i:i+BATCH]
-        data = post_ids(batch)
-        for entry in data:
-            rows.append(flatten_one(entry))
-        time.sleep(SLEEP_SEC)
+    ap = argparse.ArgumentParser(description="VEP (GRCh37 REST) for a rsID list, via a local cache")
+    ap.add_argument("rsids", help="rsids.txt (one per line)")
+    ap.add_argument("out", help="out.tsv")
+    ap.add_argument("--cache", default=os.environ.get("VEP_CACHE", ""),
+                    help="SQLite cache (default: $VEP_CACHE or <out dir>/vep_cache.sqlite)")
+    ap.add_argument("--offline", action="store_true", help="serve from the cache only")
+    ap.add_argument("--max-age-days", type=float, default=180,
+                    help="refetch cached answers older than this (0 = never)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--rate", type=float, default=RATE, help="max requests/s")
+    ap.add_argument("--batch", type=int, default=BATCH)
+    ap.add_argument("--url", default=VEP_URL)
+    args = ap.parse_args()
+
+    cache_path = args.cache or os.path.join(os.path.dirname(os.path.abspath(args.out)), "vep_cache.sqlite")
+    cache = VepCache(cache_path, endpoint=args.url, max_age_days=args.max_age_days)
+    rsids = read_rsids(args.rsids)
+    try:
+        entries = annotate(rsids, cache, offline=args.offline,
+                           batch=args.batch, workers=args.workers, rate=args.rate)
+    finally:
+        cache.close()
+
+    # one row per VEP entry (an rsID can map to several locations / alleles)
+    rows: List[Dict[str, Any]] = [flatten_one(e) for s in rsids for e in entries.get(s, [])]
 
     # stable order
     rows.sort(key=lambda x: x.get("SNP",""))
-    write_tsv(rows, out_tsv)
+    write_tsv(rows, args.out)
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,50 @@
 #!/usr/bin/env python3
 import argparse
-import gzip
+import numpy as np
 import pandas as pd
 from typing import Dict, Optional
 
+from ld_store import LdStore, is_store
+
+def store_r2(path: str, lead: str) -> Dict[str, float]:
+    """read_ld_r2 for an LD store: r2 of the lead's row, same 0.0 floor / max rule"""
+    st = LdStore(path)
+    if st.index([lead])[0] < 0:
+        return {lead: 1.0}
+    r2 = st.row(lead).astype(float) ** 2
+    other = st.snp != lead
+    best = pd.Series(r2[other], index=st.snp[other]).groupby(level=0, sort=False).max()
+    r2map: Dict[str, float] = {lead: 1.0}
+    r2map.update(best.fillna(0.0).clip(lower=0.0).to_dict())
+    return r2map
+
 def read_ld_r2(ld_gz: str, lead: str) -> Dict[str, float]:
     """
     Read plink --r2 gz output and return r2 to lead for each partner SNP.
     Expected columns include SNP_A SNP_B R2 (and others).
+    An LD store (ld_store.py) is read directly: only the lead's row.
     """
-    with gzip.open(ld_gz, "rt") as f:
-        df = pd.read_csv(f, sep=r"\s+", engine="python")
+    if is_store(ld_gz):
+        return store_r2(ld_gz, lead)
+    df = pd.read_csv(ld_gz, sep=r"\s+", engine="c")
     # normalize column names
     cols = {c.lower(): c for c in df.columns}
     snp_a = cols.get("snp_a") or "SNP_A"
     snp_b = cols.get("snp_b") or "SNP_B"
     r2c = cols.get("r2") or "R2"
 
+    a = df[snp_a].astype(str).to_numpy()
+    b = df[snp_b].astype(str).to_numpy()
+    r2 = pd.to_numeric(df[r2c], errors="coerce").to_numpy(dtype=float)
+    fwd = (a == lead) & (b != lead)
+    rev = (b == lead) & (a != lead)
+    partners = pd.Series(np.concatenate([r2[fwd], r2[rev]]),
+                         index=np.concatenate([b[fwd], a[rev]]))
+    # max over duplicate pairs; 0.0 floor as in the old per-row max(get(b, 0.0), r2)
+    best = partners.groupby(level=0, sort=False).max().fillna(0.0).clip(lower=0.0)
+
     r2map: Dict[str, float] = {lead: 1.0}
-    for _, r in df.iterrows():
-        a = str(r[snp_a])
-        b = str(r[snp_b])
-        r2 = float(r[r2c])
-        if a == lead and b != lead:
-            r2map[b] = max(r2map.get(b, 0.0), r2)
-        elif b == lead and a != lead:
-            r2map[a] = max(r2map.get(a, 0.0), r2)
+    r2map.update(best.to_dict())
     return r2map
 
 def consequence_score(cons: str, impact: str) -> float:
@@ -57,62 +76,110 @@ def consequence_score(cons: str, impact: str) -> float:
         return 0.8
     return 0.4
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--ld", required=True, help="plink .ld.gz (r2 output)")
-    ap.add_argument("--vep", required=True, help="VEP TSV from quick_vep_grch37_v2.py")
-    ap.add_argument("--lead", required=True, help="lead SNP rsID")
-    ap.add_argument("--pip", required=False, help="*_pip.tsv from finemap step (SNP,PIP columns)")
-    ap.add_argument("--out", required=True, help="ranked output TSV")
-    ap.add_argument("--top", type=int, default=20, help="top N to export")
-    ap.add_argument("--top-out", required=False, help="top N TSV path")
-    args = ap.parse_args()
+def score_table(cons: pd.Series, impact: pd.Series) -> np.ndarray:
+    """consequence_score per row, evaluated once per distinct (consequence, impact)"""
+    codes, uniq = pd.factorize(pd.MultiIndex.from_arrays([cons.fillna(""), impact.fillna("")]))
+    table = np.array([consequence_score(c, i) for c, i in uniq], dtype=float)
+    return table[codes]
 
-    r2map = read_ld_r2(args.ld, args.lead)
+def read_pip(path: str) -> pd.DataFrame:
+    pip = pd.read_csv(path, sep="\t")
+    # tolerate different header cases
+    if "SNP" not in pip.columns:
+        # try first column
+        pip.columns = ["SNP"] + list(pip.columns[1:])
+    if "PIP" not in pip.columns:
+        # try second col as PIP
+        if len(pip.columns) >= 2:
+            pip = pip.rename(columns={pip.columns[1]: "PIP"})
+        else:
+            pip["PIP"] = 0.0
+    pip["SNP"] = pip["SNP"].astype(str)
+    pip["PIP"] = pd.to_numeric(pip["PIP"], errors="coerce").fillna(0.0)
+    return pip[["SNP", "PIP"]]
 
-    vep = pd.read_csv(args.vep, sep="\t", dtype=str).fillna("")
+def rank(vep: pd.DataFrame, lead: str, r2map: Dict[str, float],
+         pip: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """score -> PIP -> R2 -> lead first (ties), as the single-set CLI always did"""
     if "SNP" not in vep.columns:
         raise SystemExit("[ERR] VEP file must contain column 'SNP'")
 
     # pip merge (optional)
-    if args.pip:
-        pip = pd.read_csv(args.pip, sep="\t")
-        # tolerate different header cases
-        if "SNP" not in pip.columns:
-            # try first column
-            pip.columns = ["SNP"] + list(pip.columns[1:])
-        if "PIP" not in pip.columns:
-            # try second col as PIP
-            if len(pip.columns) >= 2:
-                pip = pip.rename(columns={pip.columns[1]: "PIP"})
-            else:
-                pip["PIP"] = 0.0
-        pip["SNP"] = pip["SNP"].astype(str)
-        pip["PIP"] = pd.to_numeric(pip["PIP"], errors="coerce").fillna(0.0)
-        vep = vep.merge(pip[["SNP", "PIP"]], on="SNP", how="left")
+    if pip is not None:
+        vep = vep.merge(pip, on="SNP", how="left")
         vep["PIP"] = vep["PIP"].fillna(0.0)
     else:
+        vep = vep.copy()
         vep["PIP"] = 0.0
 
     # r2 to lead
-    vep["R2_to_lead"] = vep["SNP"].map(lambda s: float(r2map.get(str(s), float("nan"))))
+    vep["R2_to_lead"] = vep["SNP"].map(r2map).astype(float)
     # score
-    vep["score"] = vep.apply(lambda r: consequence_score(r.get("most_severe_consequence",""), r.get("impact","")), axis=1)
-    vep["is_lead"] = (vep["SNP"] == args.lead).astype(int)
+    vep["score"] = score_table(vep.get("most_severe_consequence", pd.Series("", index=vep.index)),
+                               vep.get("impact", pd.Series("", index=vep.index)))
+    vep["is_lead"] = (vep["SNP"] == lead).astype(int)
 
-    # sort: score -> PIP -> R2 -> lead first (ties)
-    vep_sorted = vep.sort_values(
+    return vep.sort_values(
         by=["score", "PIP", "R2_to_lead", "is_lead"],
         ascending=[False, False, False, False],
         na_position="last"
     )
 
+def write_ranked(vep_sorted: pd.DataFrame, out: str, top: int, top_out: Optional[str]) -> None:
     # write full ranked
-    vep_sorted.to_csv(args.out, sep="\t", index=False)
-
+    vep_sorted.to_csv(out, sep="\t", index=False)
     # write top N
-    if args.top_out:
-        vep_sorted.head(args.top).to_csv(args.top_out, sep="\t", index=False)
+    if top_out:
+        vep_sorted.head(top).to_csv(top_out, sep="\t", index=False)
+
+MANIFEST_COLS = ["label", "lead", "ld", "vep", "pip", "out", "top_out"]
+
+def run_manifest(path: str, top: int) -> None:
+    """one process for every (label, set): LD/PIP files shared between sets are read once"""
+    jobs = pd.read_csv(path, sep="\t", dtype=str).fillna("")
+    miss = [c for c in MANIFEST_COLS if c not in jobs.columns]
+    if miss:
+        raise SystemExit(f"[ERR] manifest missing columns: {miss}")
+
+    ld_cache: Dict[tuple, Dict[str, float]] = {}
+    pip_cache: Dict[str, pd.DataFrame] = {}
+    for job in jobs.to_dict("records"):
+        key = (job["ld"], job["lead"])
+        if key not in ld_cache:
+            ld_cache[key] = read_ld_r2(job["ld"], job["lead"])
+        pip = None
+        if job["pip"]:
+            if job["pip"] not in pip_cache:
+                pip_cache[job["pip"]] = read_pip(job["pip"])
+            pip = pip_cache[job["pip"]]
+        vep = pd.read_csv(job["vep"], sep="\t", dtype=str).fillna("")
+        ranked = rank(vep, job["lead"], ld_cache[key], pip)
+        write_ranked(ranked, job["out"], top, job["top_out"] or None)
+        print(f"[OK] {job['label']}: {job['out']} (n={len(ranked)})")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--manifest", default=None,
+                    help=f"TSV with columns {MANIFEST_COLS}: rank every row in one process")
+    ap.add_argument("--ld", required=False, help="plink .ld.gz (r2 output) or LD store")
+    ap.add_argument("--vep", required=False, help="VEP TSV from quick_vep_grch37_v2.py")
+    ap.add_argument("--lead", required=False, help="lead SNP rsID")
+    ap.add_argument("--pip", required=False, help="*_pip.tsv from finemap step (SNP,PIP columns)")
+    ap.add_argument("--out", required=False, help="ranked output TSV")
+    ap.add_argument("--top", type=int, default=20, help="top N to export")
+    ap.add_argument("--top-out", required=False, help="top N TSV path")
+    args = ap.parse_args()
+
+    if args.manifest:
+        run_manifest(args.manifest, args.top)
+        return
+    if not (args.ld and args.vep and args.lead and args.out):
+        ap.error("--ld, --vep, --lead and --out are required without --manifest")
+
+    r2map = read_ld_r2(args.ld, args.lead)
+    vep = pd.read_csv(args.vep, sep="\t", dtype=str).fillna("")
+    pip = read_pip(args.pip) if args.pip else None
+    write_ranked(rank(vep, args.lead, r2map, pip), args.out, args.top, args.top_out)
 
 if __name__ == "__main__":
     main()
@@ -2,8 +2,13 @@
 import argparse
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
 import pandas as pd
 
+from assoc_io import read_at_snps
+
 def read_signals(path: str) -> pd.DataFrame:
     # tolerate tabs/whitespace + lead/snp/SNP column names
     df = pd.read_csv(path, sep=r"\s+|\t", engine="python")
@@ -31,23 +36,20 @@ def read_runs(path: str) -> pd.DataFrame:
             raise ValueError(f"runs.tsv missing column '{c}': {path}")
     return df
 
-def read_assoc_linear(path: str) -> pd.DataFrame:
-    df = pd.read_table(path, sep=r"\s+")
-    if "TEST" in df.columns:
-        df = df[df["TEST"] == "ADD"].copy()
-    return df
-
-def extract_beta_p(assoc_path: str, snp: str):
+def read_lead_values(assoc_path: str, leads: List[str]) -> Optional[pd.DataFrame]:
+    """BETA/P at the lead SNPs (indexed by lead), or None if the file is missing."""
     if not os.path.exists(assoc_path):
+        return None
+    try:
+        return read_at_snps(assoc_path, leads, test="ADD", columns=["SNP", "BETA", "P"])
+    except ValueError:
+        return None
+
+def extract_beta_p(values: Optional[pd.DataFrame], snp: str):
+    if values is None:
         return (None, None)
-    df = read_assoc_linear(assoc_path)
-    if "SNP" not in df.columns:
-        return (None, None)
-    hit = df[df["SNP"] == snp]
-    if hit.empty:
-        return (None, None)
-    beta = pd.to_numeric(hit.iloc[0].get("BETA", None), errors="coerce")
-    p = pd.to_numeric(hit.iloc[0].get("P", None), errors="coerce")
+    beta = values.at[snp, "BETA"] if "BETA" in values.columns else None
+    p = values.at[snp, "P"] if "P" in values.columns else None
     return (None if pd.isna(beta) else float(beta),
             None if pd.isna(p) else float(p))
 
@@ -58,6 +60,7 @@ def main():
     ap.add_argument("--out", required=True)
     ap.add_argument("--erap1-cond-mode", choices=["sig1","all"], default="sig1",
                     help="label ERAP1 SNP-conditioning as sig1 or sig1+sig2+sig3")
+    ap.add_argument("--workers", type=int, default=4, help="assoc files read in parallel")
     args = ap.parse_args()
 
     signals = read_signals(args.signals)
@@ -102,6 +105,12 @@ def main():
         if run_id == "baseline":       return "baseline"
         return run_id
 
+    # every assoc read once (in parallel), keeping only the three lead rows
+    leads = [lead_ERAP2, lead_ERAP1, lead_LNPEP]
+    paths = sorted(set(runs["assoc"].astype(str)))
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        values = dict(zip(paths, ex.map(lambda p: read_lead_values(p, leads), paths)))
+
     out_rows = []
     for outcome in ["ERAP2","ERAP1","LNPEP"]:
         lead = {"ERAP2":lead_ERAP2, "ERAP1":lead_ERAP1, "LNPEP":lead_LNPEP}[outcome]
@@ -110,7 +119,7 @@ def main():
         if base.empty:
             raise ValueError(f"missing baseline for {outcome} in {args.runs}")
         base_assoc = base.iloc[0]["assoc"]
-        b_beta, b_p = extract_beta_p(base_assoc, lead)
+        b_beta, b_p = extract_beta_p(values[str(base_assoc)], lead)
 
         # compare against the 6 cross-condition runs (excluding baseline/self)
         for rid in ["cond_snp_"+lead_ERAP2, "cond_snp_"+lead_ERAP1, "cond_snp_"+lead_LNPEP,
@@ -118,7 +127,7 @@ def main():
             rr = runs[(runs["outcome"]==outcome) & (runs["run_id"]==rid)]
             if rr.empty:
                 continue
-            a_beta, a_p = extract_beta_p(rr.iloc[0]["assoc"], lead)
+            a_beta, a_p = extract_beta_p(values[str(rr.iloc[0]["assoc"])], lead)
 
             # percent change (guard div0)
             def pct(new, old):
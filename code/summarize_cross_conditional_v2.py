@@ -21,12 +21,15 @@ TSV with per (outcome, signal_id, lead_snp, run_id) delta% of beta and -log10(p)
 from __future__ import annotations
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List
 
 import numpy as np
 import pandas as pd
 
+from assoc_io import read_at_snps
+
 
 def _read_table(path: str) -> pd.DataFrame:
     p = Path(path)
@@ -77,28 +80,14 @@ def _read_runs(path: str) -> pd.DataFrame:
     return out
 
 
-def _read_plink_assoc(path: str) -> pd.DataFrame:
-    df = pd.read_table(path, sep=r"\s+", engine="python")
-    if "TEST" not in df.columns or "SNP" not in df.columns:
-        raise ValueError(f"Unexpected assoc file format: {path}")
-    df = df[df["TEST"] == "ADD"].copy()
-    for c in ["P", "BETA", "BP", "STAT"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-    return df
+def _read_lead_rows(path: str, leads: List[str]) -> pd.DataFrame:
+    """BP/BETA/STAT/P of the lead SNPs only, indexed by lead (NaN where absent)."""
+    return read_at_snps(path, leads, test="ADD")
 
 
-def _extract_at_snp(assoc: pd.DataFrame, snp: str) -> Dict[str, float]:
-    row = assoc.loc[assoc["SNP"] == snp]
-    if row.empty:
-        return {"P": float("nan"), "BETA": float("nan"), "BP": float("nan"), "STAT": float("nan")}
-    row = row.iloc[0]
-    return {
-        "P": float(row["P"]) if "P" in row else float("nan"),
-        "BETA": float(row["BETA"]) if "BETA" in row else float("nan"),
-        "BP": float(row["BP"]) if "BP" in row else float("nan"),
-        "STAT": float(row["STAT"]) if "STAT" in row else float("nan"),
-    }
+def _extract_at_snp(rows: pd.DataFrame, snp: str) -> Dict[str, float]:
+    return {c: float(rows.at[snp, c]) if c in rows.columns else float("nan")
+            for c in ("P", "BETA", "BP", "STAT")}
 
 
 def _pct_change(new: float, base: float) -> float:
@@ -123,17 +112,24 @@ def main() -> None:
         default="baseline",
         help="run_id that represents baseline per outcome (default: baseline)",
     )
+    ap.add_argument("--workers", type=int, default=4, help="assoc files read in parallel")
     args = ap.parse_args()
 
     sig = _read_signals(args.signals)
     runs = _read_runs(args.runs)
 
-    # Preload assoc files to avoid repeated IO
-    assoc_cache: Dict[str, pd.DataFrame] = {}
-    for p in sorted(set(runs["assoc_path"])):
+    # each assoc is read once (in parallel), keeping only its outcome's lead rows
+    paths = sorted(set(runs["assoc_path"]))
+    for p in paths:
         if not Path(p).exists():
             raise FileNotFoundError(f"Missing assoc file in runs.tsv: {p}")
-        assoc_cache[p] = _read_plink_assoc(p)
+    leads_of = {g: sorted(set(s["lead"])) for g, s in sig.groupby("gene")}
+    need: Dict[str, set] = {p: set() for p in paths}
+    for outcome, p in zip(runs["outcome"], runs["assoc_path"]):
+        need[p].update(leads_of.get(outcome, []))
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        tables = ex.map(lambda p: _read_lead_rows(p, sorted(need[p])), paths)
+        assoc_cache: Dict[str, pd.DataFrame] = dict(zip(paths, tables))
 
     out_rows = []
     for outcome, sub in runs.groupby("outcome", sort=False):
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""Synthetic, GEUVADIS-shaped inputs for benchmarks (no real data needed).
+
+Writes every file type the pipeline's Python modules read, at a size set by
+--scale (1 = a small window study; 100 = roughly the real genome-wide SNP and
+gene counts), with planted signals so the outputs are not empty:
+
+  window/<label>.assoc.linear       fine-map loci (ERAP2, LNPEP, ERAP1_sig1..3)
+  cross/<outcome>/<run_id>.assoc.linear
+                                    cross-conditional runs (3 outcomes x 7 runs)
+  genomewide/<GENE>_genomewide.assoc.linear
+  transcis/T_cand_chr<c>.<GENE>.assoc.linear
+                                    candidate SNPs x trans genes (--all-pheno naming)
+  ld/<label>.ld, ld/<label>.ld.gz   r2 to the lead, PLINK --r2 layout
+  vep/<label>.vep.tsv               quick_vep_grch37_v2.py columns
+  pip/<label>_pip.tsv               finemap_pip.py columns
+  signals.tsv runs.tsv              summarize_cross_conditional*.py inputs
+  finemap_manifest.tsv finemap_sens_manifest.tsv rank_manifest.tsv
+  locuszoom_manifest.tsv
+  meta.json                         sizes, seed and row counts per file group
+
+and with --geno also the genotype / phenotype side (not read by any module
+the benchmark times, and large at scale 100):
+
+  geno.bed/.bim/.fam                all genome-wide SNPs, LD in 20-SNP blocks
+  pheno_chr<c>.txt                  FID IID genes (5q15 genes + trans genes)
+  covar_pca10.tsv                   FID IID C1..C10
+
+Assoc files use PLINK's fixed-width --linear layout (TEST=ADD only, a few NA
+rows as PLINK writes for monomorphic SNPs). The same --scale/--seed always
+gives the same files; a directory whose meta.json matches is left as is
+(--force rebuilds).
+
+  synth_data.py --out bench/x1 --scale 1
+  synth_data.py --out bench/x100 --scale 100 --geno
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+from scipy.special import erfc
+
+BASE = {
+    "samples": 370,
+    "window_snps": 3000,      # per window assoc / LD file
+    "gw_snps": 50_000,        # per genome-wide assoc file (and the .bim)
+    "trans_genes": 200,       # transcis files
+    "candidates": 40,         # SNPs per transcis file
+}
+SCALED = ("window_snps", "gw_snps", "trans_genes")
+
+WINDOW = (95_750_000, 96_750_000)          # chr5 bp range of the window SNPs
+BLOCK = 20                                 # SNPs per LD block
+CHUNK = 200_000                            # rows formatted per write
+VERSION = 1                                # bump when the files change for the same seed
+# fine-map loci: label, gene, lead position as a fraction of the window, z at the lead
+LOCI = [
+    ("ERAP2", "ERAP2", 0.40, 12.0),
+    ("LNPEP", "LNPEP", 0.20, 7.0),
+    ("ERAP1_sig1", "ERAP1", 0.55, 9.0),
+    ("ERAP1_sig2", "ERAP1", 0.65, 6.0),
+    ("ERAP1_sig3", "ERAP1", 0.75, 5.0),
+]
+OUTCOMES = {"ERAP2": "ERAP2", "ERAP1": "ERAP1_sig1", "LNPEP": "LNPEP"}
+CHR_LEN = {c: int(250e6 * (1.0 - (c - 1) / 30.0)) for c in range(1, 23)}
+CONSEQUENCES = [
+    ("intron_variant", "MODIFIER", 0.55),
+    ("upstream_gene_variant", "MODIFIER", 0.12),
+    ("downstream_gene_variant", "MODIFIER", 0.10),
+    ("3_prime_UTR_variant", "MODIFIER", 0.06),
+    ("synonymous_variant", "LOW", 0.06),
+    ("splice_region_variant", "LOW", 0.03),
+    ("missense_variant", "MODERATE", 0.06),
+    ("stop_gained", "HIGH", 0.01),
+    ("splice_donor_variant", "HIGH", 0.01),
+]
+ASSOC_HEADER = " CHR         SNP         BP   A1       TEST    NMISS       BETA         STAT            P \n"
+ASSOC_ROW = "%4d %11s %10d %4s %10s %8d %10.4g %12.4g %12.4g \n"
+ASSOC_NA = "%4d %11s %10d %4s %10s %8d %10s %12s %12s \n"
+
+
+def sizes(scale: float, **override) -> dict:
+    out = dict(BASE)
+    for k in SCALED:
+        out[k] = max(1, int(round(BASE[k] * scale)))
+    out.update({k: v for k, v in override.items() if v is not None})
+    out["gw_snps"] = max(out["gw_snps"], out["window_snps"])
+    return out
+
+
+def atomic_open(path: str, binary: bool = False):
+    """(file, commit) for path.tmp; commit() renames it into place."""
+    tmp = path + ".tmp"
+    opener = gzip.open if path.endswith(".gz") else open
+    f = opener(tmp, "wb" if binary else "wt")
+
+    def commit():
+        f.close()
+        os.replace(tmp, path)
+    return f, commit
+
+
+# ----------------------------
+# SNP map
+# ----------------------------
+def positions(lo: int, hi: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k distinct sorted bp in [lo, hi), without materialising the range."""
+    return np.sort(lo + rng.choice(hi - lo, k, replace=False))
+
+
+class SnpMap:
+    """Genome-wide SNPs (chr, bp, rsid, alleles); the chr5 window is a contiguous slice."""
+
+    def __init__(self, n_gw: int, n_window: int, rng: np.random.Generator):
+        n_other = n_gw - n_window
+        weights = np.array([CHR_LEN[c] for c in range(1, 23)], float)
+        per_chr = np.floor(n_other * weights / weights.sum()).astype(int)
+        per_chr[0] += n_other - per_chr.sum()
+
+        chrs, bps = [], []
+        for c, k in zip(range(1, 23), per_chr):
+            if c == 5:
+                # window SNPs sit in the middle of chr5's share (>= 2 bp apart on average)
+                w_end = max(WINDOW[1], WINDOW[0] + 2 * n_window)
+                lo = positions(1_000_000, WINDOW[0], k // 2, rng)
+                hi = positions(w_end + 1, CHR_LEN[5], k - k // 2, rng)
+                win = positions(WINDOW[0], w_end, n_window, rng)
+                self.window = slice(sum(len(b) for b in bps) + len(lo),
+                                    sum(len(b) for b in bps) + len(lo) + n_window)
+                bp = np.concatenate([lo, win, hi])
+            else:
+                bp = positions(1_000_000, CHR_LEN[c], k, rng)
+            chrs.append(np.full(len(bp), c, np.int64))
+            bps.append(bp.astype(np.int64))
+        self.chr = np.concatenate(chrs)
+        self.bp = np.concatenate(bps)
+        self.snp = np.char.add("rs", (100_000 + np.arange(len(self.bp))).astype(str))
+        alleles = np.array(list("ACGT"))
+        pick = rng.integers(0, 4, size=(len(self.bp), 2))
+        pick[:, 1] = (pick[:, 0] + 1 + pick[:, 1] % 3) % 4
+        self.a1 = alleles[pick[:, 0]]
+        self.a2 = alleles[pick[:, 1]]
+
+    def __len__(self):
+        return len(self.bp)
+
+    def lead_index(self, frac: float) -> int:
+        w = self.window
+        return w.start + int(frac * (w.stop - w.start - 1))
+
+
+def r_to_lead(n: int, lead: int, rng: np.random.Generator) -> np.ndarray:
+    """Correlation of each of n SNPs with SNP `lead`: decays by LD block distance."""
+    blocks = np.arange(n) // BLOCK
+    dist = np.abs(blocks - blocks[lead])
+    r = 0.75 ** dist * rng.uniform(0.55, 1.0, n) * np.where(dist == 0, 1.3, 1.0)
+    r = np.clip(r, 0.0, 0.99) * rng.choice([-1.0, 1.0], n, p=[0.2, 0.8])
+    r[lead] = 1.0
+    return r
+
+
+# ----------------------------
+# writers
+# ----------------------------
+def p_from_z(z: np.ndarray) -> np.ndarray:
+    return np.clip(erfc(np.abs(z) / np.sqrt(2.0)), 1e-300, 1.0)
+
+
+def write_assoc(path, snps: SnpMap, idx, z, nmiss, rng, na_frac=0.001) -> int:
+    """PLINK --linear (ADD rows) for SNPs idx with statistics z."""
+    idx = np.arange(len(snps))[idx] if isinstance(idx, slice) else np.asarray(idx)
+    beta = z / np.sqrt(nmiss) * rng.uniform(0.8, 1.25, len(idx))
+    p = p_from_z(z)
+    na = rng.random(len(idx)) < na_frac
+    f, commit = atomic_open(path)
+    f.write(ASSOC_HEADER)
+    for lo in range(0, len(idx), CHUNK):
+        i, sl = idx[lo:lo + CHUNK], slice(lo, lo + CHUNK)
+        rows = zip(snps.chr[i].tolist(), snps.snp[i].tolist(), snps.bp[i].tolist(), snps.a1[i].tolist(),
+                   beta[sl].tolist(), z[sl].tolist(), p[sl].tolist(), na[sl].tolist())
+        f.write("".join(
+            ASSOC_NA % (c, s, b, a, "ADD", 0, "NA", "NA", "NA") if bad else
+            ASSOC_ROW % (c, s, b, a, "ADD", nmiss, be, st, pv)
+            for c, s, b, a, be, st, pv, bad in rows))
+    commit()
+    return len(idx)
+
+
+def write_ld(path, snps: SnpMap, lead: int, r2: np.ndarray) -> int:
+    """PLINK --r2 --ld-snp <lead> --ld-window-r2 0 over the window SNPs."""
+    w = np.arange(len(snps))[snps.window]
+    c, b, s = snps.chr[lead], snps.bp[lead], snps.snp[lead]
+    f, commit = atomic_open(path)
+    f.write(" CHR_A         BP_A        SNP_A  CHR_B         BP_B        SNP_B           R2 \n")
+    for lo in range(0, len(w), CHUNK):
+        i = w[lo:lo + CHUNK]
+        f.write("".join(
+            "%6d %12d %12s %6d %12d %12s %12.6g \n" % (c, b, s, cb, bb, sb, rr)
+            for cb, bb, sb, rr in zip(snps.chr[i].tolist(), snps.bp[i].tolist(),
+                                      snps.snp[i].tolist(), r2[lo:lo + CHUNK].tolist())))
+    commit()
+    return len(w)
+
+
+def write_vep(path, snps: SnpMap, idx, gene, rng) -> int:
+    names = [c[0] for c in CONSEQUENCES]
+    impact = {c[0]: c[1] for c in CONSEQUENCES}
+    weights = np.array([c[2] for c in CONSEQUENCES])
+    cons = rng.choice(names, len(idx), p=weights / weights.sum())
+    aa = np.array(list("ACDEFGHIKLMNPQRSTVWY"))
+    f, commit = atomic_open(path)
+    f.write("SNP\tgene\timpact\tmost_severe_consequence\tconsequence_terms\tbiotype\tamino_acids"
+            "\tprotein_start\tprotein_end\tsift_prediction\tpolyphen_prediction\tCADD_PHRED_max\n")
+    for s, c, cadd in zip(snps.snp[idx].tolist(), cons.tolist(), rng.gamma(2.0, 3.0, len(idx)).tolist()):
+        coding = impact[c] in ("MODERATE", "HIGH")
+        pos = int(rng.integers(1, 960)) if coding else ""
+        f.write("\t".join(map(str, [
+            s, gene, impact[c], c, c, "protein_coding",
+            f"{rng.choice(aa)}/{rng.choice(aa)}" if c == "missense_variant" else "",
+            pos, pos,
+            rng.choice(["tolerated", "deleterious"]) if c == "missense_variant" else "",
+            rng.choice(["benign", "possibly_damaging", "probably_damaging"]) if c == "missense_variant" else "",
+            f"{cadd:.3f}"])) + "\n")
+    commit()
+    return len(idx)
+
+
+def write_pip(path, snps: SnpMap, idx, z) -> int:
+    """finemap_pip.py-shaped table; PIP from single-causal ABFs (W/V = 50)."""
+    k = 50.0
+    labf = 0.5 * np.log(1.0 / (1.0 + k)) + 0.5 * z * z * k / (1.0 + k)
+    pip = np.exp(labf - labf.max())
+    pip /= pip.sum()
+    order = np.argsort(-pip, kind="stable")
+    cum = np.empty_like(pip)
+    cum[order] = np.cumsum(pip[order])
+    f, commit = atomic_open(path)
+    f.write("SNP\tCHR\tBP\tSTAT\tlogABF\tPIP\tCUM_PIP\n")
+    f.write("".join(
+        f"{s}\t{c}\t{b}\t{zz:.6g}\t{la:.6g}\t{pp:.6g}\t{cc:.6g}\n"
+        for s, c, b, zz, la, pp, cc in zip(snps.snp[idx].tolist(), snps.chr[idx].tolist(),
+                                           snps.bp[idx].tolist(), z.tolist(), labf.tolist(),
+                                           pip.tolist(), cum.tolist())))
+    commit()
+    return len(idx)
+
+
+def write_tsv(path, header, rows, sep="\t") -> None:
+    f, commit = atomic_open(path)
+    if header:
+        f.write(sep.join(header) + "\n")
+    for r in rows:
+        f.write(sep.join(map(str, r)) + "\n")
+    commit()
+
+
+def write_geno(out, snps: SnpMap, n: int, leads, rng, chunk=20_000) -> dict:
+    """geno.bed/.bim/.fam (SNP-major); returns lead index -> dosage (NaN = missing)."""
+    maf = rng.uniform(0.05, 0.5, len(snps))
+    lead_g = {}
+    pad = (-n) % 4
+    f, commit = atomic_open(os.path.join(out, "geno.bed"), binary=True)
+    f.write(b"\x6c\x1b\x01")
+    for lo in range(0, len(snps), chunk):
+        hi = min(lo + chunk, len(snps))
+        m = hi - lo
+        # one shared haplotype draw per LD block, 70% of alleles copy it
+        nb = -(-m // BLOCK) + 1
+        base = rng.random((nb, n))
+        blk = (np.arange(lo, hi) // BLOCK) - lo // BLOCK
+        u1 = np.where(rng.random((m, n)) < 0.7, base[blk], rng.random((m, n)))
+        u2 = np.where(rng.random((m, n)) < 0.7, np.roll(base[blk], 7, axis=1), rng.random((m, n)))
+        g = (u1 < maf[lo:hi, None]).astype(np.int8) + (u2 < maf[lo:hi, None]).astype(np.int8)
+        miss = rng.random((m, n)) < 0.002
+        for i in leads:
+            if lo <= i < hi:
+                lead_g[i] = np.where(miss[i - lo], np.nan, g[i - lo]).astype(float)
+        # PLINK 2-bit codes, A1 = first allele: 00 hom A1 (2 copies), 10 het, 11 hom A2, 01 missing
+        code = np.where(g == 2, 0, np.where(g == 1, 2, 3)).astype(np.uint8)
+        code[miss] = 1
+        code = np.concatenate([code, np.zeros((m, pad), np.uint8)], axis=1).reshape(m, -1, 4)
+        f.write((code[:, :, 0] | (code[:, :, 1] << 2) | (code[:, :, 2] << 4) | (code[:, :, 3] << 6))
+                .astype(np.uint8).tobytes())
+    commit()
+
+    f, commit = atomic_open(os.path.join(out, "geno.bim"))
+    for lo in range(0, len(snps), CHUNK):
+        i = slice(lo, lo + CHUNK)
+        f.write("".join(f"{c}\t{s}\t0\t{b}\t{a}\t{a2}\n" for c, s, b, a, a2 in
+                        zip(snps.chr[i].tolist(), snps.snp[i].tolist(), snps.bp[i].tolist(),
+                            snps.a1[i].tolist(), snps.a2[i].tolist())))
+    commit()
+    write_tsv(os.path.join(out, "geno.fam"), None,
+              ([f"F{j}", f"S{j}", 0, 0, 1 + j % 2, -9] for j in range(n)), sep=" ")
+    return lead_g
+
+
+# ----------------------------
+# main
+# ----------------------------
+def generate(out: str, size: dict, seed: int, geno: bool) -> dict:
+    rng = np.random.default_rng(seed)
+    for d in ("window", "cross", "genomewide", "transcis", "ld", "vep", "pip", "rank", "fig"):
+        os.makedirs(os.path.join(out, d), exist_ok=True)
+    n = size["samples"]
+    nw = size["window_snps"]
+    snps = SnpMap(size["gw_snps"], nw, rng)
+    w0 = snps.window.start
+    counts = {}
+
+    # per-locus correlation with the lead (window-relative) and the lead's z
+    loci = {}
+    for label, gene, frac, z0 in LOCI:
+        lead = snps.lead_index(frac)
+        r = r_to_lead(nw, lead - w0, rng)
+        loci[label] = (gene, lead, r, z0)
+
+    def window_z(label, mult=1.0):
+        _, _, r, z0 = loci[label]
+        return z0 * mult * r + rng.normal(size=nw)
+
+    # fine-map loci: assoc + LD + VEP + PIP
+    fm, sens, rank_rows, figs = [], [], [], []
+    for label, (gene, lead, r, z0) in loci.items():
+        z = window_z(label)
+        assoc = os.path.join(out, "window", f"{label}.assoc.linear")
+        counts["window_rows"] = counts.get("window_rows", 0) + write_assoc(assoc, snps, snps.window, z, n - 2, rng)
+        r2 = r * r
+        ld = os.path.join(out, "ld", f"{label}.ld")
+        counts["ld_rows"] = counts.get("ld_rows", 0) + write_ld(ld, snps, lead, r2)
+        write_ld(ld + ".gz", snps, lead, r2)
+        # VEP covers the SNPs in best LD with the lead (what step 05 annotates)
+        keep = np.sort(np.argsort(-r2, kind="stable")[:max(1, nw // 10)]) + w0
+        vep = os.path.join(out, "vep", f"{label}.vep.tsv")
+        counts["vep_rows"] = counts.get("vep_rows", 0) + write_vep(vep, snps, keep, gene, rng)
+        pip = os.path.join(out, "pip", f"{label}_pip.tsv")
+        write_pip(pip, snps, np.arange(w0, w0 + nw), z)
+
+        lead_id = snps.snp[lead]
+        fm.append([label, assoc, "0.15", lead_id])
+        sens.append([label, assoc, "0.05,0.10,0.15,0.20,0.30", "1.0", lead_id])
+        rank_rows.append([label, lead_id, ld + ".gz", vep, pip,
+                          os.path.join(out, "rank", f"{label}_ranked.tsv"),
+                          os.path.join(out, "rank", f"{label}_top.tsv")])
+        figs.append([os.path.join(out, "fig", f"{label}_locus.png"), assoc, ld, lead_id, label])
+    write_tsv(os.path.join(out, "finemap_manifest.tsv"), ["label", "assoc", "prior_sd", "lead"], fm)
+    write_tsv(os.path.join(out, "finemap_sens_manifest.tsv"),
+              ["label", "assoc", "prior_mult", "pheno_sd", "lead"], sens)
+    write_tsv(os.path.join(out, "rank_manifest.tsv"),
+              ["label", "lead", "ld", "vep", "pip", "out", "top_out"], rank_rows)
+    write_tsv(os.path.join(out, "locuszoom_manifest.tsv"), ["out_png", "assoc", "ld", "lead", "title"], figs)
+
+    # cross-conditional: each outcome at baseline, conditioned on each lead and each expression
+    leads = {g: snps.snp[loci[lab][1]] for g, lab in OUTCOMES.items()}
+    write_tsv(os.path.join(out, "signals.tsv"), ["gene", "signal_id", "lead"],
+              [[loci[lab][0], "signal" + (lab.split("_sig")[1] if "_sig" in lab else "1"),
+                snps.snp[loci[lab][1]]] for lab in loci])
+    runs = []
+    for outcome, lab in OUTCOMES.items():
+        os.makedirs(os.path.join(out, "cross", outcome), exist_ok=True)
+        plan = [("baseline", "NA", "none", 1.0)]
+        for g in OUTCOMES:
+            own = g == outcome
+            plan.append((f"cond_snp_{leads[g]}", g, "snp", 0.05 if own else 0.9))
+            plan.append((f"cov_expr_{g}", g, "expr", 0.3 if own else 0.95))
+        for run_id, cond_gene, cov_type, mult in plan:
+            assoc = os.path.join(out, "cross", outcome, f"{run_id}.assoc.linear")
+            counts["cross_rows"] = counts.get("cross_rows", 0) + \
+                write_assoc(assoc, snps, snps.window, window_z(lab, mult), n - 3, rng)
+            runs.append([run_id, outcome, cond_gene, cov_type, assoc])
+    write_tsv(os.path.join(out, "runs.tsv"), ["run_id", "outcome", "cond_gene", "cov_type", "assoc"], runs)
+
+    # genome-wide scans: null everywhere but the gene's own window peak
+    gw = []
+    for outcome, lab in OUTCOMES.items():
+        z = rng.normal(size=len(snps))
+        z[snps.window] = window_z(lab)
+        path = os.path.join(out, "genomewide", f"{outcome}_genomewide.assoc.linear")
+        counts["gw_rows"] = counts.get("gw_rows", 0) + write_assoc(path, snps, slice(None), z, n, rng)
+        gw.append(path)
+
+    # trans/cis scan: window candidate SNPs x trans genes, a few real hits
+    nc = min(size["candidates"], nw)
+    cand = np.sort(w0 + rng.choice(nw, nc, replace=False))
+    chroms = rng.integers(1, 23, size["trans_genes"])
+    genes = []
+    for k, c in enumerate(chroms.tolist()):
+        gene = f"ENSG{k:011d}"
+        z = rng.normal(size=nc)
+        if k % 50 == 7:
+            z[rng.integers(0, nc)] += rng.choice([-1, 1]) * rng.uniform(5.5, 9.0)
+        path = os.path.join(out, "transcis", f"T_cand_chr{c}.{gene}.assoc.linear")
+        counts["transcis_rows"] = counts.get("transcis_rows", 0) + write_assoc(path, snps, cand, z, n, rng, 0.0)
+        genes.append((c, gene))
+
+    if geno:
+        lead_idx = [v[1] for v in loci.values()]
+        lead_g = write_geno(out, snps, n, lead_idx, rng)
+        pcs = rng.normal(size=(n, 10))
+        write_tsv(os.path.join(out, "covar_pca10.tsv"), ["FID", "IID"] + [f"C{i}" for i in range(1, 11)],
+                  ([f"F{j}", f"S{j}"] + [f"{x:.6f}" for x in pcs[j]] for j in range(n)))
+        by_chr = {}
+        for c, g in genes:
+            by_chr.setdefault(c, []).append(g)
+        by_chr.setdefault(5, [])[:0] = ["ERAP2", "ERAP1", "LNPEP", "CSF2"]
+        effect = {"ERAP2": [("ERAP2", 0.8)], "ERAP1": [("ERAP1_sig1", 0.5), ("ERAP1_sig2", 0.3)],
+                  "LNPEP": [("LNPEP", 0.4)]}
+        for c, names in sorted(by_chr.items()):
+            y = rng.normal(size=(n, len(names))) + pcs[:, :2] @ rng.normal(size=(2, len(names))) * 0.3
+            for j, g in enumerate(names):
+                for lab, b in effect.get(g, []):
+                    y[:, j] += b * np.nan_to_num(lead_g[loci[lab][1]], nan=1.0)
+            write_tsv(os.path.join(out, f"pheno_chr{c}.txt"), ["FID", "IID"] + names,
+                      ([f"F{i}", f"S{i}"] + [f"{v:.5f}" for v in y[i]] for i in range(n)), sep=" ")
+        counts["geno_snps"] = len(snps)
+
+    return {"files": {"genomewide": gw}, "leads": {lab: snps.snp[v[1]] for lab, v in loci.items()},
+            "counts": counts}
+
+
+def ensure(out: str, size: dict, seed: int = 1, geno: bool = False, force: bool = False) -> dict:
+    """Generate into out unless its meta.json already matches; returns the meta."""
+    want = {"version": VERSION, "size": size, "seed": seed, "geno": geno}
+    meta_path = os.path.join(out, "meta.json")
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if {k: meta.get(k) for k in want} == want:
+            return meta
+
+    if os.path.isdir(out) and os.listdir(out):
+        # only ever clear a directory this script wrote
+        if not os.path.exists(meta_path):
+            raise SystemExit(f"[ERR] {out} is not empty and has no meta.json; pick another --out")
+        shutil.rmtree(out)
+    os.makedirs(out, exist_ok=True)
+    meta = dict(want, **generate(out, size, seed, geno))
+    f, commit = atomic_open(meta_path)
+    json.dump(meta, f, indent=1)
+    commit()
+    print(f"[OK] {out}: " + " ".join(f"{k}={v}" for k, v in meta["counts"].items()), file=sys.stderr)
+    return meta
+
+
+def main():
+    ap = argparse.ArgumentParser(description="write synthetic benchmark inputs")
+    ap.add_argument("--out", required=True, help="output directory")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiplies SNP and gene counts")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--samples", type=int, default=None)
+    ap.add_argument("--window-snps", type=int, default=None)
+    ap.add_argument("--gw-snps", type=int, default=None)
+    ap.add_argument("--trans-genes", type=int, default=None)
+    ap.add_argument("--candidates", type=int, default=None)
+    ap.add_argument("--geno", action="store_true", help="also write .bed/.bim/.fam, pheno tables, covariates")
+    ap.add_argument("--force", action="store_true", help="rebuild even if meta.json matches")
+    args = ap.parse_args()
+
+    size = sizes(args.scale, samples=args.samples, window_snps=args.window_snps, gw_snps=args.gw_snps,
+                 trans_genes=args.trans_genes, candidates=args.candidates)
+    ensure(args.out, size, args.seed, args.geno, args.force)
+    print(f"[OK] {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Parallel, resumable runner for the per-chromosome PLINK --all-pheno scans.
+
+Input is a jobs TSV (one row per target x chromosome):
+
+  job_id  target  chr  pheno  rsids  outprefix  log
+
+Jobs run concurrently within a core budget (--cores / --threads-per-job) and
+an optional memory budget (--mem-mb / --mem-per-job-mb). Each PLINK call gets
+its own --threads and --memory. A job is complete only when PLINK exits 0 and
+one <outprefix>.<pheno>.assoc.linear exists for every phenotype column in its
+pheno file. Completion is recorded in a JSON manifest, rewritten atomically
+after every job, with the expected/found phenotype counts, a SHA-1 over the
+outputs and an input digest: SHA-1 of the rsids and covar files, size/mtime
+of the pheno file and the .bed/.bim/.fam, and the PLINK argv (covar names
+included; --threads/--memory left out, they do not change the results).
+
+On restart, jobs marked complete whose inputs digest the same and whose
+outputs are still all present are skipped (--verify also re-checks the
+output checksum). Anything else has its partial outputs removed and is
+rerun, so neither a crash halfway through a chromosome nor a changed
+candidate list is mistaken for a finished job.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+import pandas as pd
+
+from assoc_io import file_sha1
+
+JOB_COLS = ["job_id", "target", "chr", "pheno", "rsids", "outprefix", "log"]
+
+
+def expected_phenos(pheno: str) -> int:
+    with open(pheno) as f:
+        header = f.readline().split()
+    return len([c for c in header if c not in ("FID", "IID")])
+
+
+def job_outputs(outprefix: str) -> List[str]:
+    return sorted(glob.glob(glob.escape(outprefix) + ".*.assoc.linear"))
+
+
+def outputs_digest(paths: List[str]) -> str:
+    h = hashlib.sha1()
+    for p in paths:
+        h.update(os.path.basename(p).encode())
+        with open(p, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def stat_key(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def input_digest(job: dict, args, sha1_cache: Dict[str, str]) -> str:
+    """SHA-1 over everything the job's PLINK run reads or is told (see module doc)."""
+    def sha1(path):
+        if path not in sha1_cache:
+            sha1_cache[path] = file_sha1(path)
+        return sha1_cache[path]
+
+    argv = plink_command(job, args)
+    for flag in ("--threads", "--memory"):
+        if flag in argv:
+            i = argv.index(flag)
+            del argv[i:i + 2]
+    key = {
+        "rsids": sha1(job["rsids"]),
+        "covar": sha1(args.covar),
+        "pheno": stat_key(job["pheno"]),
+        "bfile": [stat_key(args.bfile + ext) for ext in (".bed", ".bim", ".fam")],
+        "argv": argv,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: Dict[str, dict]) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_complete(job: dict, entry: dict, inputs: str, verify: bool) -> bool:
+    if not entry or entry.get("status") != "complete":
+        return False
+    if entry.get("inputs") != inputs:
+        return False
+    paths = job_outputs(job["outprefix"])
+    if len(paths) != entry.get("expected"):
+        return False
+    return not verify or outputs_digest(paths) == entry.get("sha1")
+
+
+def clear_partial(outprefix: str) -> None:
+    for p in glob.glob(glob.escape(outprefix) + ".*.assoc.linear*"):
+        os.remove(p)
+
+
+def plink_command(job: dict, args) -> List[str]:
+    cmd = [args.plink, "--bfile", args.bfile,
+           "--pheno", job["pheno"], "--all-pheno",
+           "--extract", job["rsids"],
+           "--covar", args.covar, "--covar-name", *args.covar_name,
+           "--linear", "hide-covar", "--allow-no-sex",
+           "--threads", str(args.threads_per_job)]
+    if args.mem_per_job_mb:
+        cmd += ["--memory", str(args.mem_per_job_mb)]
+    return cmd + ["--out", job["outprefix"]]
+
+
+def run_job(job: dict, args, inputs: str) -> dict:
+    t0 = time.time()
+    os.makedirs(os.path.dirname(job["log"]) or ".", exist_ok=True)
+    with open(job["log"], "w") as log:
+        rc = subprocess.run(plink_command(job, args), stdout=log, stderr=subprocess.STDOUT).returncode
+    paths = job_outputs(job["outprefix"])
+    expected = expected_phenos(job["pheno"])
+    ok = rc == 0 and len(paths) == expected
+    return {
+        "status": "complete" if ok else "incomplete",
+        "target": job["target"], "chr": str(job["chr"]),
+        "returncode": rc, "expected": expected, "found": len(paths),
+        "sha1": outputs_digest(paths) if ok else "",
+        "inputs": inputs,
+        "seconds": round(time.time() - t0, 1),
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def slots(args) -> int:
+    n = max(1, args.cores // max(1, args.threads_per_job))
+    if args.mem_mb and args.mem_per_job_mb:
+        n = min(n, max(1, args.mem_mb // args.mem_per_job_mb))
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="parallel, resumable PLINK --all-pheno jobs")
+    ap.add_argument("--jobs", required=True, help=f"TSV with columns {JOB_COLS}")
+    ap.add_argument("--manifest", required=True, help="JSON completion manifest (created/updated)")
+    ap.add_argument("--plink", required=True)
+    ap.add_argument("--bfile", required=True)
+    ap.add_argument("--covar", required=True)
+    ap.add_argument("--covar-name", nargs="+", required=True)
+    ap.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--threads-per-job", type=int, default=1)
+    ap.add_argument("--mem-mb", type=int, default=0, help="total memory budget (0 = no limit)")
+    ap.add_argument("--mem-per-job-mb", type=int, default=0, help="PLINK --memory per job (0 = PLINK default)")
+    ap.add_argument("--verify", action="store_true", help="re-hash outputs of jobs marked complete")
+    args = ap.parse_args()
+
+    jobs = pd.read_csv(args.jobs, sep="\t", dtype=str)
+    miss = [c for c in JOB_COLS if c not in jobs.columns]
+    if miss:
+        raise SystemExit(f"[ERR] jobs TSV missing columns: {miss}")
+    jobs = jobs.to_dict("records")
+
+    manifest = load_manifest(args.manifest)
+    sha1_cache: Dict[str, str] = {}
+    inputs = {job["job_id"]: input_digest(job, args, sha1_cache) for job in jobs}
+    todo = []
+    for job in jobs:
+        if is_complete(job, manifest.get(job["job_id"], {}), inputs[job["job_id"]], args.verify):
+            continue
+        clear_partial(job["outprefix"])
+        manifest.pop(job["job_id"], None)
+        todo.append(job)
+    save_manifest(args.manifest, manifest)
+
+    n_slots = slots(args)
+    print(f"[RUN] {len(todo)} of {len(jobs)} jobs to run; {n_slots} concurrent x {args.threads_per_job} threads")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=n_slots) as ex:
+        pending = {ex.submit(run_job, job, args, inputs[job["job_id"]]): job for job in todo}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = pending.pop(fut)
+                entry = fut.result()
+                manifest[job["job_id"]] = entry
+                save_manifest(args.manifest, manifest)
+                if entry["status"] != "complete":
+                    failed += 1
+                    print(f"  [FAIL] {job['job_id']}: rc={entry['returncode']} "
+                          f"phenos {entry['found']}/{entry['expected']} (see {job['log']})", file=sys.stderr)
+                else:
+                    print(f"  [OK] {job['job_id']} ({entry['found']} phenos, {entry['seconds']}s)")
+
+    if failed:
+        raise SystemExit(f"[ERR] {failed} job(s) incomplete; rerun to retry only those")
+    print(f"[OK] all {len(jobs)} jobs complete: {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
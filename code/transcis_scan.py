@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Candidate SNPs x all phenotypes, genome-wide, without PLINK --all-pheno.
+
+Replaces the per-chromosome `plink --all-pheno --extract` loop of
+06_transcis_scan.sh plus collect_sig_genes_transcis_v2.py for one target:
+
+  - candidate genotypes are decoded once from the memory-mapped .bed
+  - per chromosome, the phenotype matrix and the genotypes are residualized
+    on the covariates and all SNP x gene statistics come from one product
+  - BH q-values are taken over every row, and <TARGET>_{all,sig}_genome.tsv
+    are written in the collector's format
+  - as in the collector, two passes bound memory: each chromosome's rows are
+    streamed to a temporary file as they are fitted (only P is kept), then
+    that file is re-read in chunks, q_bh appended, and the sig rows kept
+
+BETA/STAT/P are rounded to the 4 significant digits PLINK prints, so the
+q-values and the sig table match what the PLINK + collector path gives.
+Phenotypes with a different missing-sample pattern, and SNPs with missing
+calls, are fitted on their own sample subsets (PLINK drops them per test).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bim_index import open_index
+from eqtl_linear import (align_to_fam, covariate_rank, ols_from_residuals,
+                         read_condition_list, read_pheno_table, read_sample_table, residualize)
+from multitest import bh
+from plink_bed import BedReader, a1_is_major, founder_mask, read_fam
+
+OUT_COLS = ["pheno_gene", "pheno_chr", "SNP_CHR", "SNP", "BP", "A1", "BETA", "STAT", "P", "NMISS", "q_bh"]
+TEXT_COLS = {"pheno_gene": str, "pheno_chr": str, "SNP_CHR": str, "SNP": str, "A1": str}
+CHUNK_ROWS = 1_000_000
+
+
+def parse_chroms(raw: str) -> List[int]:
+    out: List[int] = []
+    for tok in raw.replace(",", " ").split():
+        if "-" in tok:
+            a, b = tok.split("-", 1)
+            out += list(range(int(a), int(b) + 1))
+        else:
+            out.append(int(tok))
+    return out
+
+
+def round_sig(x: np.ndarray, digits: int = 4) -> np.ndarray:
+    """Round to `digits` significant digits (what PLINK's %.4g text keeps)."""
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mag = np.floor(np.log10(np.abs(x)))
+        scale = np.power(10.0, digits - 1 - mag)
+        out = np.round(x * scale) / scale
+    return np.where(np.isfinite(out), out, np.where(x == 0, 0.0, x))
+
+
+def load_candidates(bfile: str, rsids: Sequence[str], fam: pd.DataFrame,
+                    keep_allele_order: bool = False) -> Tuple[pd.DataFrame, np.ndarray]:
+    """(.bim rows in .bim order, A1 counts (m, n_fam)) for the candidate rsIDs."""
+    index = open_index(bfile)
+    rows = index.rows(rsids)
+    absent = [s for s, r in zip(rsids, rows) if r < 0]
+    if absent:
+        print(f"[WARN] {len(absent)} candidate rsIDs not in .bim (skipped)", file=sys.stderr)
+    rows = np.unique(rows[rows >= 0])
+    snps = index.bim_rows(rows)
+    geno = BedReader(bfile, n_samples=len(fam), n_variants=index.n).dosage(rows)
+    if not keep_allele_order:
+        swap = a1_is_major(geno, founder_mask(fam))
+        geno[swap] = 2.0 - geno[swap]
+        snps.loc[swap, ["A1", "A2"]] = snps.loc[swap, ["A2", "A1"]].to_numpy()
+    return snps, geno
+
+
+def scan_matrix(Y: np.ndarray, G: np.ndarray, C: np.ndarray,
+                max_vif: float = 50.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """BETA/STAT/P/NMISS (m SNPs x p phenotypes) for y_j ~ g_i + C on all pairs.
+
+    Y (n, p) and G (n, m) may hold NaN; C (n, k) must be complete and include
+    the intercept. Phenotypes are grouped by missing pattern so the common
+    case (complete expression) is a single residualization and product.
+    """
+    n, p = Y.shape
+    m = G.shape[1]
+    beta = np.full((m, p), np.nan)
+    stat = np.full((m, p), np.nan)
+    pval = np.full((m, p), np.nan)
+    nmiss = np.zeros((m, p), dtype=np.int64)
+
+    ymiss = np.isnan(Y)
+    gmiss = np.isnan(G)
+    patterns, group = np.unique(ymiss.T, axis=0, return_inverse=True)
+    for gi, pat in enumerate(patterns):
+        cols = np.flatnonzero(group.ravel() == gi)
+        keep = ~pat
+        for snp_idx, sub in _snp_subsets(gmiss, keep):
+            Cs = C[sub]
+            k = covariate_rank(Cs)
+            df = int(sub.sum()) - k - 1
+            nmiss[np.ix_(snp_idx, cols)] = int(sub.sum())
+            if k < Cs.shape[1] or df <= 0:
+                continue
+            Gs = G[np.ix_(sub, snp_idx)].astype(np.float64)
+            b, s, pv = ols_from_residuals(residualize(Cs, Y[np.ix_(sub, cols)]),
+                                          residualize(Cs, Gs), Gs, df, max_vif)
+            beta[np.ix_(snp_idx, cols)] = b
+            stat[np.ix_(snp_idx, cols)] = s
+            pval[np.ix_(snp_idx, cols)] = pv
+    return beta, stat, pval, nmiss
+
+
+def _snp_subsets(gmiss: np.ndarray, keep: np.ndarray):
+    """Yield (snp indices, sample mask): complete SNPs together, the rest one by one."""
+    miss_in = gmiss[keep].any(axis=0)
+    complete = np.flatnonzero(~miss_in)
+    if len(complete):
+        yield complete, keep
+    for j in np.flatnonzero(miss_in):
+        yield np.array([j]), keep & ~gmiss[:, j]
+
+
+def scan(bfile: str, rsids: Sequence[str], pheno_files: Dict[int, str],
+         covar: str, covar_names: Sequence[str], keep_allele_order: bool = False,
+         max_vif: float = 50.0) -> Iterator[pd.DataFrame]:
+    """Candidate x phenotype rows (collector columns minus q_bh), one frame per chromosome."""
+    fam = read_fam(bfile)
+    snps, geno = load_candidates(bfile, rsids, fam, keep_allele_order)
+    if snps.empty:
+        raise SystemExit("[ERR] no candidate rsIDs found in .bim")
+
+    C = np.column_stack([np.ones(len(fam))] +
+                        list(align_to_fam(fam, read_sample_table(covar, covar_names), covar_names).T))
+    base = np.isfinite(C).all(axis=1)
+
+    n_done = 0
+    for chrom, path in pheno_files.items():
+        genes = [c for c in pd.read_csv(path, sep=r"\s+", nrows=0).columns if c not in ("FID", "IID")]
+        if not genes:
+            continue
+        Y = align_to_fam(fam, read_pheno_table(path, genes), genes)
+        use = base & np.isfinite(Y).any(axis=1)
+        beta, stat, pval, nmiss = scan_matrix(Y[use], geno[:, use].T, C[use], max_vif)
+
+        m, p = beta.shape
+        yield pd.DataFrame({
+            "pheno_gene": np.tile(np.asarray(genes, dtype=object), m),
+            "pheno_chr": str(chrom),
+            "SNP_CHR": np.repeat(snps["CHR"].to_numpy(), p),
+            "SNP": np.repeat(snps["SNP"].to_numpy(), p),
+            "BP": np.repeat(snps["BP"].to_numpy(), p),
+            "A1": np.repeat(snps["A1"].to_numpy(), p),
+            "BETA": round_sig(beta.ravel()),
+            "STAT": round_sig(stat.ravel()),
+            "P": round_sig(pval.ravel()),
+            "NMISS": nmiss.ravel(),
+        })
+        n_done += 1
+        print(f"  [OK] chr{chrom}: {p} phenotypes x {m} SNPs", file=sys.stderr)
+
+    if not n_done:
+        raise SystemExit("[ERR] no phenotype files scanned")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="candidate SNPs x all phenotypes (cis/trans) scan in NumPy")
+    ap.add_argument("--bfile", required=True)
+    ap.add_argument("--extract", required=True, help="candidate rsIDs, one per line")
+    ap.add_argument("--pheno-dir", required=True)
+    ap.add_argument("--pheno-pattern", default="chr%d_GD462.signalGeneQuantRPKM_plink.txt",
+                    help="file name per chromosome, %%d = chr")
+    ap.add_argument("--chroms", default="1-22", help="e.g. 1-22 or 5,6")
+    ap.add_argument("--covar", required=True)
+    ap.add_argument("--covar-name", nargs="+", required=True)
+    ap.add_argument("--keep-allele-order", action="store_true")
+    ap.add_argument("--vif", type=float, default=50.0)
+    ap.add_argument("--p-raw", type=float, default=5e-6)
+    ap.add_argument("--q-fdr", type=float, default=0.10)
+    ap.add_argument("--trans-only", action="store_true", help="keep only trans (pheno_chr != SNP_CHR)")
+    ap.add_argument("--out-all", required=True)
+    ap.add_argument("--out-sig", required=True)
+    args = ap.parse_args()
+
+    pheno_files: Dict[int, str] = {}
+    for chrom in parse_chroms(args.chroms):
+        path = os.path.join(args.pheno_dir, args.pheno_pattern % chrom)
+        if not os.path.exists(path):
+            raise SystemExit(f"[ERR] PHENO not found: {path}")
+        pheno_files[chrom] = path
+
+    rsids = read_condition_list(args.extract)
+    os.makedirs(os.path.dirname(args.out_all) or ".", exist_ok=True)
+    os.makedirs(os.path.dirname(args.out_sig) or ".", exist_ok=True)
+
+    # pass 1: stream each chromosome's kept rows to a temp file, keep only P
+    tmp = args.out_all + ".rows.tmp"
+    pvals = []
+    try:
+        with open(tmp, "w") as fout:
+            fout.write("\t".join(OUT_COLS[:-1]) + "\n")
+            for df in scan(args.bfile, rsids, pheno_files, args.covar, args.covar_name,
+                           keep_allele_order=args.keep_allele_order, max_vif=args.vif):
+                df = df.dropna(subset=["P"])
+                if args.trans_only:
+                    df = df[df["pheno_chr"] != df["SNP_CHR"].astype(str)]
+                pvals.append(df["P"].to_numpy(dtype=np.float64))
+                df.to_csv(fout, sep="\t", index=False, header=False, float_format="%.12g")
+        pvals = np.concatenate(pvals) if pvals else np.empty(0)
+        q = bh(pvals)
+        passed = (pvals <= args.p_raw) & (q <= args.q_fdr)
+
+        # pass 2: re-read in chunks, append q_bh, keep the SIG subset
+        sig_parts = []
+        n_all = 0
+        with open(args.out_all, "w") as fout:
+            fout.write("\t".join(OUT_COLS) + "\n")
+            for df in pd.read_csv(tmp, sep="\t", dtype=TEXT_COLS, keep_default_na=False,
+                                  na_values=[""], chunksize=CHUNK_ROWS):
+                df["q_bh"] = q[n_all:n_all + len(df)]
+                hit = passed[n_all:n_all + len(df)]
+                n_all += len(df)
+                df[OUT_COLS].to_csv(fout, sep="\t", index=False, header=False, float_format="%.12g")
+                if hit.any():
+                    sig_parts.append(df.loc[hit, OUT_COLS])
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if n_all != len(pvals):
+        raise SystemExit(f"[ERR] row count changed between passes ({n_all} vs {len(pvals)})")
+
+    sig = pd.concat(sig_parts, ignore_index=True) if sig_parts else pd.DataFrame(columns=OUT_COLS)
+    sig = sig.sort_values(["q_bh", "P", "pheno_gene", "SNP"], kind="mergesort")
+    sig[OUT_COLS].to_csv(args.out_sig, sep="\t", index=False, float_format="%.12g")
+
+    print(f"[OK] all  -> {args.out_all} (n={n_all})")
+    print(f"[OK] sig  -> {args.out_sig} (n={len(sig)})")
+
+
+if __name__ == "__main__":
+    main()
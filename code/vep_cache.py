@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Local SQLite cache of Ensembl VEP answers plus a rate-limited batch client.
+
+One row per queried rsID holds the list of raw VEP JSON entries VEP returned
+for it (several for multi-location or multi-allelic IDs; an empty list when
+VEP returned nothing, so unknown IDs are not asked again), the endpoint it
+came from and the fetch time. Rows from another endpoint, or older than
+max_age_days, count as misses. Only misses go to the network:
+
+  - batches are posted from a thread pool (workers)
+  - a shared token bucket caps requests/second across all workers
+  - 429/5xx answers are retried; Retry-After (or exponential backoff) pauses
+    the whole bucket, not just the worker that hit it
+
+All database writes happen on the calling thread. VEP_URL=<url> points the
+client at another endpoint (e.g. a local stand-in server for testing).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Sequence
+
+VEP_URL = os.environ.get("VEP_URL", "https://grch37.rest.ensembl.org/vep/human/id")
+HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+SCHEMA_VERSION = 2   # 1 kept one entry per rsID
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class VepCache:
+    """rsID -> raw VEP JSON entries, per endpoint, with fetch timestamps."""
+
+    def __init__(self, path: str, endpoint: str = VEP_URL, max_age_days: float = 0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.endpoint = endpoint
+        self.max_age = max_age_days * 86400.0
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS vep (
+                rsid TEXT NOT NULL, endpoint TEXT NOT NULL,
+                fetched REAL NOT NULL, json TEXT NOT NULL,
+                PRIMARY KEY (rsid, endpoint));
+        """)
+        row = self.db.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
+        if row is None or int(row[0]) == 1:
+            # v1 rows may have lost entries: drop them, they are refetched
+            with self.db:
+                self.db.execute("DELETE FROM vep")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+                                (str(SCHEMA_VERSION),))
+        elif int(row[0]) != SCHEMA_VERSION:
+            raise SystemExit(f"[ERR] {path}: cache schema {row[0]}, expected {SCHEMA_VERSION}")
+
+    def get(self, rsids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Fresh cached entries (empty list = VEP had no answer for that rsID)."""
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        oldest = time.time() - self.max_age if self.max_age > 0 else float("-inf")
+        ids = list(rsids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            q = ("SELECT rsid, json FROM vep WHERE endpoint=? AND fetched>=? AND rsid IN (%s)"
+                 % ",".join("?" * len(chunk)))
+            for rsid, raw in self.db.execute(q, [self.endpoint, oldest] + chunk):
+                out[rsid] = json.loads(raw)
+        return out
+
+    def put(self, entries: Dict[str, List[Dict[str, Any]]]) -> None:
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO vep (rsid, endpoint, fetched, json) VALUES (?, ?, ?, ?)",
+                [(k, self.endpoint, now, json.dumps(v)) for k, v in entries.items()])
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class TokenBucket:
+    """Thread-safe limiter: `rate` tokens/s, bursts up to `burst`; pause() blocks everyone."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = float(max(1, burst))
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.hold_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.hold_until:
+                    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                    self.stamp = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.hold_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.hold_until = max(self.hold_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.stamp = self.hold_until
+
+
+def _retry_after(resp, default: float) -> float:
+    raw = resp.headers.get("Retry-After", "")
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return default
+
+
+def post_ids(session, ids: List[str], bucket: TokenBucket, endpoint: str = VEP_URL,
+             max_retry: int = 6, timeout: float = 60) -> List[Dict[str, Any]]:
+    backoff = 1.0
+    for _ in range(max_retry):
+        bucket.acquire()
+        r = session.post(endpoint, headers=HEADERS, data=json.dumps({"ids": ids}), timeout=timeout)
+        if r.status_code == 200:
+            return r.json()
+        if r.status_code in RETRY_STATUS:
+            bucket.pause(_retry_after(r, backoff))
+            backoff *= 1.8
+            continue
+        raise RuntimeError(f"VEP request failed: status={r.status_code} body={r.text[:300]}")
+    raise RuntimeError("VEP request failed after retries (rate limit / server error)")
+
+
+def fetch(rsids: Sequence[str], batch: int = 150, workers: int = 4, rate: float = 10.0,
+          endpoint: str = VEP_URL) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """Yield {rsID: VEP entries, in answer order} per finished batch (completion order)."""
+    import requests
+
+    ids = list(rsids)
+    bucket = TokenBucket(rate, burst=workers)
+    local = threading.local()
+
+    def run(chunk: List[str]):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return chunk, post_ids(local.session, chunk, bucket, endpoint)
+
+    chunks = [ids[i:i + batch] for i in range(0, len(ids), batch)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for fut in as_completed([ex.submit(run, c) for c in chunks]):
+            chunk, data = fut.result()
+            got: Dict[str, List[Dict[str, Any]]] = {rsid: [] for rsid in chunk}
+            for entry in data:
+                key = entry.get("input") or entry.get("id")
+                if key in got:
+                    got[key].append(entry)
+            yield got
+
+
+def annotate(rsids: Sequence[str], cache: VepCache, offline: bool = False,
+             **fetch_kw) -> Dict[str, List[Dict[str, Any]]]:
+    """Cached entries for rsids, fetching the misses unless offline.
+
+    Each fetched batch is stored as soon as it arrives, so an interrupted run
+    keeps what it already paid for.
+    """
+    hits = cache.get(rsids)
+    misses = [s for s in rsids if s not in hits]
+    print(f"[INFO] VEP cache {cache.path}: {len(hits)} hits, {len(misses)} misses", file=sys.stderr)
+    if misses and offline:
+        print(f"[WARN] --offline: {len(misses)} rsIDs not in cache (no annotation)", file=sys.stderr)
+    elif misses:
+        for got in fetch(misses, endpoint=cache.endpoint, **fetch_kw):
+            cache.put(got)
+            hits.update(got)
+    return hits
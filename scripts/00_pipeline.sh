@@ -1,72 +1,40 @@
 #!/usr/bin/env bash
 # scripts/00_pipeline.sh
+# Runs steps 01..07 (+ 06_transcis, 06b) as a dependency graph: independent
+# steps run side by side within the CPU budget and a step is skipped when its
+# inputs, code and parameters hash the same as on its last successful run.
+# Step declarations (inputs/outputs/params) live in code/pipeline_dag.py.
+#
+#   bash scripts/00_pipeline.sh                  # everything that is stale
+#   bash scripts/00_pipeline.sh 05               # 05 and what it needs
+#   bash scripts/00_pipeline.sh --from 04        # re-run 04 and downstream
+#   bash scripts/00_pipeline.sh --dry-run        # plan only
+#   PRIOR_MULT=0.2 bash scripts/00_pipeline.sh   # re-runs 04, 05, 06_transcis only
+#   bash scripts/00_pipeline.sh --touch 01       # adopt an existing result/01_pca
+#   bash scripts/00_pipeline.sh --cpus 8 --force
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/_config.sh"
-
-log(){ echo "[$(date '+%F %T')] $*"; }
-
-# outputs
-OUT_PCA="$RESULTDIR/01_pca"
-OUT_GW="$RESULTDIR/02_eqtl_genomewide"
-OUT_SIG="$RESULTDIR/03_signal_check_5q15"
-OUT_FM="$RESULTDIR/04_finemap_pip"
-OUT_FA="$RESULTDIR/05_functional_annot"
-OUT_CC="$RESULTDIR/06_cross_conditional"
-
-mkdir -p "$OUT_PCA" "$OUT_GW" "$OUT_SIG" "$OUT_FM" "$OUT_FA" "$OUT_CC"
-mkdir -p "$FIGDIR" "$TABLEDIR"
+# one perf ledger for the whole run: $PERF_DIR/$PERF_RUN.jsonl
+source "$SCRIPT_DIR/_perf.sh"
 
 # finemap priors
 PRIOR_MULT="${PRIOR_MULT:-0.15}"
 PRIOR_MULT_LIST="${PRIOR_MULT_LIST:-0.05 0.10 0.15 0.20 0.30}"
-WIN="${WIN:-500000}"
-WINKB="${WINKB:-500}"
-
-log "01) PCA covariates"
-OUTDIR="$OUT_PCA" bash "$SCRIPTDIR/01_make_pca_covar.sh"
-
-log "02) Genome-wide eQTL"
-OUTDIR="$OUT_GW" bash "$SCRIPTDIR/02_genomewide_eqtl.sh"
-
-log "03) 5q15 signal check"
-OUTDIR="$OUT_SIG" bash "$SCRIPTDIR/03_signal_check_5q15.sh"
-
-log "04) Fine-mapping (ABF->PIP)"
-OUTDIR="$OUT_FM" bash "$SCRIPTDIR/04_finemap_pip_run.sh" \
-  "$BFILE" \
-  "$PHENO5" \
-  "$OUT_PCA/covar_pca10.tsv" \
-  "$PLINK" \
-  "$COVAR_NAMES" \
-  "$WIN" \
-  "$ERAP2_LEAD" \
-  "$LNPEP_LEAD" \
-  "$ERAP1_S1" \
-  "$ERAP1_S2" \
-  "$ERAP1_S3" \
-  "$PRIOR_MULT" \
-  "$PRIOR_MULT_LIST"
-
-log "05) Functional annotation"
-OUTDIR="$OUT_FA" \
-FINEMAP_DIR="$OUT_FM" \
-SIGNALS_TSV="$OUT_SIG/signals_summary.tsv" \
-bash "$SCRIPTDIR/05_functional_annot.sh"
-
-log "06) Cross-conditional"
-OUTDIR="$OUT_CC" \
-SIGNALS_TSV="$OUT_SIG/signals_summary.tsv" \
-COVAR="$OUT_PCA/covar_pca10.tsv" \
-bash "$SCRIPTDIR/06_cross_conditional.sh"
-
-log "07) 27-panel figure"
-CCDIR="$OUT_CC" \
-SIGNALS_TSV="$OUT_SIG/signals_summary.tsv" \
-bash "$SCRIPTDIR/07_make_crossconditional_figs.sh"
-
-log "DONE"
-log "result: $RESULTDIR"
-log "fig   : $FIGDIR"
-log "table : $TABLEDIR"
+CREDIBLE="${CREDIBLE:-0.95}"
+# functional annotation / trans scan
+R2TH="${R2TH:-0.8}"
+TOPN="${TOPN:-20}"
+PHENO_DIR="${PHENO_DIR:-$(dirname "$PHENO5")}"
+PHENO_PATTERN="${PHENO_PATTERN:-chr%d_GD462.signalGeneQuantRPKM_plink.txt}"   # %d=chr
+SCAN_ENGINE="${SCAN_ENGINE:-plink}"   # plink | numpy (06_transcis)
+
+# step scripts and the runner read these from the environment
+export ROOT SCRIPTDIR CODEDIR RESULTDIR FIGDIR TABLEDIR
+export PLINK EQTL_ENGINE LD_ENGINE LD_STORE_DIR SCAN_ENGINE
+export BFILE PHENO5 PHENO_DIR PHENO_PATTERN GTF COVAR COVAR_NAMES WIN WINKB
+export ERAP2_LEAD LNPEP_LEAD ERAP1_S1 ERAP1_S2 ERAP1_S3
+export PRIOR_MULT PRIOR_MULT_LIST CREDIBLE R2TH TOPN
+
+exec python3 "$CODEDIR/pipeline_dag.py" "$@"
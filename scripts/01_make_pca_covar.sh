@@ -2,6 +2,7 @@
 set -euo pipefail
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/_config.sh"
+source "$SCRIPT_DIR/_perf.sh"
 
 OUTDIR="${OUTDIR:-$RESULTDIR/01_pca}"
 mkdir -p "$OUTDIR"
@@ -9,8 +10,8 @@ mkdir -p "$OUTDIR"
 [[ -x "$PLINK" ]] || { echo "[ERR] PLINK not executable: $PLINK" >&2; exit 1; }
 [[ -s "${BFILE}.bed" ]] || { echo "[ERR] BFILE not found: $BFILE(.bed/.bim/.fam)" >&2; exit 1; }
 
-$PLINK --bfile "$BFILE" --indep-pairwise 50 5 0.2 --out "$OUTDIR/indepSNP"
-$PLINK --bfile "$BFILE" --extract "$OUTDIR/indepSNP.prune.in" --pca 10 --out "$OUTDIR/pca10"
+perf_run $PLINK --bfile "$BFILE" --indep-pairwise 50 5 0.2 --out "$OUTDIR/indepSNP"
+perf_run $PLINK --bfile "$BFILE" --extract "$OUTDIR/indepSNP.prune.in" --pca 10 --out "$OUTDIR/pca10"
 
 awk 'BEGIN{
   OFS="\t";
@@ -4,6 +4,7 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT="$(cd "${SCRIPT_DIR}/.." && pwd)"
+source "$SCRIPT_DIR/_perf.sh"
 
 PLINK="${PLINK:-$HOME/Software/Plink/plink}"
 PYTHON="${PYTHON:-python3}"
@@ -12,6 +13,7 @@ BFILE="${BFILE:-$ROOT/../GenotypeData/GW.E-GEUV-3.EUR.MAF005.HWE1e-06}"
 PHENO="${PHENO:-$ROOT/../PhenotypeData/chr5_GD462.signalGeneQuantRPKM_plink.txt}"
 COVAR="${COVAR:-$ROOT/result/01_pca/covar_pca10.tsv}"
 COVAR_NAMES="${COVAR_NAMES:-C1 C2 C3 C4 C5 C6 C7 C8 C9 C10}"
+REUSE_OUTPUTS="${REUSE_OUTPUTS:-1}"   # 0 = redo scans whose output exists (pipeline_dag.py)
 
 OUTDIR="$ROOT/result/02_eqtl_genomewide"
 FIGDIR="$ROOT/fig"
@@ -30,11 +32,11 @@ run_plink_gene() {
   local out_prefix="$OUTDIR/${gene}_genomewide"
   local assoc="${out_prefix}.assoc.linear"
 
-  if [[ -f "$assoc" ]]; then
+  if [[ "$REUSE_OUTPUTS" == 1 && -f "$assoc" ]]; then
     echo "[SKIP] exists: $assoc"
   else
     echo "[RUN] PLINK genome-wide: $gene"
-    "$PLINK" \
+    perf_run "$PLINK" \
       --bfile "$BFILE" \
       --pheno "$PHENO" --pheno-name "$gene" \
       --covar "$COVAR" --covar-name $COVAR_NAMES \
@@ -45,7 +47,7 @@ run_plink_gene() {
 
   local out_png="$FIGDIR/Fig_genomewide_${gene}_manhattan.png"
   echo "[RUN] plot: $out_png"
-  "$PYTHON" "$CODE_MANH" \
+  perf_run "$PYTHON" "$CODE_MANH" \
     --assoc "$assoc" \
     --out-png "$out_png" \
     --title "Genome-wide eQTL scan for ${gene} expression" \
@@ -60,7 +62,7 @@ run_plink_gene "LNPEP"
 # 3-panel combined
 COMBO_PNG="$FIGDIR/Fig_genomewide_3genes_manhattan.png"
 echo "[RUN] combined plot: $COMBO_PNG"
-"$PYTHON" "$CODE_MANH" \
+perf_run "$PYTHON" "$CODE_MANH" \
   --assoc "$OUTDIR/ERAP2_genomewide.assoc.linear,$OUTDIR/ERAP1_genomewide.assoc.linear,$OUTDIR/LNPEP_genomewide.assoc.linear" \
   --out-png "$COMBO_PNG" \
   --titles "ERAP2,ERAP1,LNPEP" \
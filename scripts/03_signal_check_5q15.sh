@@ -3,10 +3,15 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT="$(cd "${SCRIPT_DIR}/.." && pwd)"
+source "$SCRIPT_DIR/_perf.sh"
 
 # ===== paths =====
 PLINK="${PLINK:-$HOME/Software/Plink/plink}"
 PYTHON="${PYTHON:-python3}"
+EQTL_ENGINE="${EQTL_ENGINE:-plink}"   # plink | numpy
+LD_ENGINE="${LD_ENGINE:-plink}"       # plink | numpy
+LD_STORE_DIR="${LD_STORE_DIR-$ROOT/result/ld_store}"   # per-window LD stores ("" = off)
+REUSE_OUTPUTS="${REUSE_OUTPUTS:-1}"   # 0 = redo assoc/LD files that exist (pipeline_dag.py)
 
 BFILE="${BFILE:-$ROOT/../GenotypeData/GW.E-GEUV-3.EUR.MAF005.HWE1e-06}"
 PHENO="${PHENO:-$ROOT/../PhenotypeData/chr5_GD462.signalGeneQuantRPKM_plink.txt}"
@@ -18,6 +23,9 @@ WINDOW_BP="${WINDOW_BP:-500000}"
 OUTDIR="$ROOT/result/03_signal_check_5q15"
 FIGDIR="$ROOT/fig"
 CODE_LOCUS="$ROOT/code/locuszoom_manhattan.py"
+EQTL_PY="${EQTL_PY:-$ROOT/code/eqtl_linear.py}"
+BIM_INDEX_PY="${BIM_INDEX_PY:-$ROOT/code/bim_index.py}"
+LD_PY="${LD_PY:-$ROOT/code/ld_calc.py}"
 
 mkdir -p "$OUTDIR" "$FIGDIR"
 export MPLBACKEND=Agg
@@ -27,14 +35,34 @@ die(){ log "[ERR] $*"; exit 1; }
 req(){ [[ -f "$1" ]] || die "not found: $1"; }
 
 # ===== checks =====
-[[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+if [[ "$EQTL_ENGINE" == "plink" || "$LD_ENGINE" == "plink" ]]; then
+  [[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+fi
 req "${BFILE}.bed"; req "${BFILE}.bim"; req "${BFILE}.fam"
-req "$PHENO"; req "$COVAR"; req "$CODE_LOCUS"
+req "$PHENO"; req "$COVAR"; req "$CODE_LOCUS"; req "$EQTL_PY"; req "$LD_PY"
+
+# window --linear hide-covar: PLINK (default) or the in-process NumPy engine; same flags
+window_linear() {
+  if [[ "$EQTL_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@" --linear hide-covar --allow-no-sex
+  else
+    perf_run "$PYTHON" "$EQTL_PY" "$@"
+  fi
+}
+
+# window --r2/--r: PLINK (default) or in-process NumPy LD; same flags
+window_ld() {
+  if [[ "$LD_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@"
+  else
+    perf_run "$PYTHON" "$LD_PY" ${LD_STORE_DIR:+--store-dir "$LD_STORE_DIR"} "$@"
+  fi
+}
 
 get_bp() {
   local rsid="$1"
   local bp
-  bp="$(awk -v snp="$rsid" '$2==snp {print $4; exit}' "${BFILE}.bim" || true)"
+  bp="$(perf_run "$PYTHON" "$BIM_INDEX_PY" lookup "$BFILE" "$rsid" --fields bp 2>/dev/null || true)"
   [[ -n "$bp" ]] || die "SNP not in BIM: $rsid"
   echo "$bp"
 }
@@ -62,39 +90,36 @@ plink_window() {
   local ld_prefix="${out_prefix}.ld_to_${lead}"
   local ld_file="${ld_prefix}.ld"
 
-  if [[ ! -f "$assoc" ]]; then
+  if [[ "$REUSE_OUTPUTS" != 1 || ! -f "$assoc" ]]; then
     log "[RUN] PLINK assoc: $tag"
     if [[ "$cond_mode" == "none" ]]; then
-      "$PLINK" --bfile "$BFILE" \
+      window_linear --bfile "$BFILE" \
         --chr 5 --from-bp "$from_bp" --to-bp "$to_bp" \
         --pheno "$PHENO" --pheno-name "$gene" \
         --covar "$COVAR" --covar-name $COVAR_NAMES \
-        --linear hide-covar --allow-no-sex \
         --out "$out_prefix" >/dev/null
     elif [[ "$cond_mode" == "snp" ]]; then
-      "$PLINK" --bfile "$BFILE" \
+      window_linear --bfile "$BFILE" \
         --chr 5 --from-bp "$from_bp" --to-bp "$to_bp" \
         --pheno "$PHENO" --pheno-name "$gene" \
         --covar "$COVAR" --covar-name $COVAR_NAMES \
         --condition "$cond_arg" \
-        --linear hide-covar --allow-no-sex \
         --out "$out_prefix" >/dev/null
     else
-      "$PLINK" --bfile "$BFILE" \
+      window_linear --bfile "$BFILE" \
         --chr 5 --from-bp "$from_bp" --to-bp "$to_bp" \
         --pheno "$PHENO" --pheno-name "$gene" \
         --covar "$COVAR" --covar-name $COVAR_NAMES \
         --condition-list "$cond_arg" \
-        --linear hide-covar --allow-no-sex \
         --out "$out_prefix" >/dev/null
     fi
   else
     log "[SKIP] exists: $assoc"
   fi
 
-  if [[ ! -f "$ld_file" ]]; then
-    log "[RUN] PLINK LD r2 to lead: $tag (lead=$lead)"
-    "$PLINK" --bfile "$BFILE" \
+  if [[ "$REUSE_OUTPUTS" != 1 || ! -f "$ld_file" ]]; then
+    log "[RUN] LD r2 to lead: $tag (lead=$lead)"
+    window_ld --bfile "$BFILE" \
       --chr 5 --from-bp "$from_bp" --to-bp "$to_bp" \
       --r2 --ld-snp "$lead" \
       --ld-window 999999 --ld-window-kb 2000 --ld-window-r2 0 \
@@ -146,55 +171,22 @@ SUMMARY="$OUTDIR/signals_summary.tsv"
 log "[OK] wrote $SUMMARY"
 
 # ===== plots =====
-# single panels
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$ER2_ASSOC" --ld "$ER2_LD" --lead "$ERAP2_LEAD" \
-  --out-png "$FIGDIR/Fig_locus_ERAP2_sig1_pm${WINDOW_BP}.png" \
-  --title "Regional cis-eQTL association at 5q15 for ERAP2 (±500 kb)" \
-  --gw-threshold 5e-8 --test ADD
-
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$LN_ASSOC" --ld "$LN_LD" --lead "$LNPEP_LEAD" \
-  --out-png "$FIGDIR/Fig_locus_LNPEP_sig1_pm${WINDOW_BP}.png" \
-  --title "Regional cis-eQTL association at 5q15 for LNPEP (±500 kb)" \
-  --gw-threshold 5e-8 --test ADD
-
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$S1_ASSOC" --ld "$S1_LD" --lead "$ERAP1_SIG1" \
-  --out-png "$FIGDIR/Fig_locus_ERAP1_sig1_pm${WINDOW_BP}.png" \
-  --title "Regional cis-eQTL association at 5q15 for ERAP1 signal1 (±500 kb)" \
-  --gw-threshold 5e-8 --test ADD
-
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$S2_ASSOC" --ld "$S2_LD" --lead "$ERAP1_SIG2" \
-  --out-png "$FIGDIR/Fig_locus_ERAP1_sig2_pm${WINDOW_BP}.png" \
-  --title "Regional cis-eQTL association at 5q15 for ERAP1 signal2 (±500 kb)" \
-  --gw-threshold 5e-8 --test ADD
-
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$S3_ASSOC" --ld "$S3_LD" --lead "$ERAP1_SIG3" \
-  --out-png "$FIGDIR/Fig_locus_ERAP1_sig3_pm${WINDOW_BP}.png" \
-  --title "Regional cis-eQTL association at 5q15 for ERAP1 signal3 (±500 kb)" \
-  --gw-threshold 5e-8 --test ADD
-
-# 3-panel: ERAP2 + ERAP1 sig1 + LNPEP
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$ER2_ASSOC,$S1_ASSOC,$LN_ASSOC" \
-  --ld    "$ER2_LD,$S1_LD,$LN_LD" \
-  --lead  "$ERAP2_LEAD,$ERAP1_SIG1,$LNPEP_LEAD" \
-  --titles "ERAP2,ERAP1 signal1,LNPEP" \
-  --suptitle "Comparative cis-eQTL profiles at 5q15 for ERAP2, ERAP1 signal1 and LNPEP (±500 kb)" \
-  --out-png "$FIGDIR/Fig_locus_3panel_ERAP2sig1_ERAP1sig1_LNPEPsig1_pm${WINDOW_BP}.png" \
-  --gw-threshold 5e-8 --test ADD
-
-# 3-panel: ERAP1 sig1/sig2/sig3
-"$PYTHON" "$CODE_LOCUS" \
-  --assoc "$S1_ASSOC,$S2_ASSOC,$S3_ASSOC" \
-  --ld    "$S1_LD,$S2_LD,$S3_LD" \
-  --lead  "$ERAP1_SIG1,$ERAP1_SIG2,$ERAP1_SIG3" \
-  --titles "signal1,signal2 (cond S1),signal3 (cond S1+S2)" \
-  --suptitle "Independent ERAP1 cis-eQTL signals at 5q15 revealed by stepwise conditional analysis (±500 kb)" \
-  --out-png "$FIGDIR/Fig_locus_3panel_ERAP1_sig123_pm${WINDOW_BP}.png" \
-  --gw-threshold 5e-8 --test ADD
+# all figures in one process: each assoc/LD pair is parsed once (LOCUS_WORKERS>1: process pool)
+FIG_MANIFEST="$OUTDIR/locus_figures.tsv"
+{
+  echo -e "out_png\tassoc\tld\tlead\ttitle\ttitles\tsuptitle\ttest\tgw_threshold"
+  # single panels
+  echo -e "$FIGDIR/Fig_locus_ERAP2_sig1_pm${WINDOW_BP}.png\t$ER2_ASSOC\t$ER2_LD\t$ERAP2_LEAD\tRegional cis-eQTL association at 5q15 for ERAP2 (±500 kb)\t\t\tADD\t5e-8"
+  echo -e "$FIGDIR/Fig_locus_LNPEP_sig1_pm${WINDOW_BP}.png\t$LN_ASSOC\t$LN_LD\t$LNPEP_LEAD\tRegional cis-eQTL association at 5q15 for LNPEP (±500 kb)\t\t\tADD\t5e-8"
+  echo -e "$FIGDIR/Fig_locus_ERAP1_sig1_pm${WINDOW_BP}.png\t$S1_ASSOC\t$S1_LD\t$ERAP1_SIG1\tRegional cis-eQTL association at 5q15 for ERAP1 signal1 (±500 kb)\t\t\tADD\t5e-8"
+  echo -e "$FIGDIR/Fig_locus_ERAP1_sig2_pm${WINDOW_BP}.png\t$S2_ASSOC\t$S2_LD\t$ERAP1_SIG2\tRegional cis-eQTL association at 5q15 for ERAP1 signal2 (±500 kb)\t\t\tADD\t5e-8"
+  echo -e "$FIGDIR/Fig_locus_ERAP1_sig3_pm${WINDOW_BP}.png\t$S3_ASSOC\t$S3_LD\t$ERAP1_SIG3\tRegional cis-eQTL association at 5q15 for ERAP1 signal3 (±500 kb)\t\t\tADD\t5e-8"
+  # 3-panel: ERAP2 + ERAP1 sig1 + LNPEP
+  echo -e "$FIGDIR/Fig_locus_3panel_ERAP2sig1_ERAP1sig1_LNPEPsig1_pm${WINDOW_BP}.png\t$ER2_ASSOC,$S1_ASSOC,$LN_ASSOC\t$ER2_LD,$S1_LD,$LN_LD\t$ERAP2_LEAD,$ERAP1_SIG1,$LNPEP_LEAD\t\tERAP2,ERAP1 signal1,LNPEP\tComparative cis-eQTL profiles at 5q15 for ERAP2, ERAP1 signal1 and LNPEP (±500 kb)\tADD\t5e-8"
+  # 3-panel: ERAP1 sig1/sig2/sig3
+  echo -e "$FIGDIR/Fig_locus_3panel_ERAP1_sig123_pm${WINDOW_BP}.png\t$S1_ASSOC,$S2_ASSOC,$S3_ASSOC\t$S1_LD,$S2_LD,$S3_LD\t$ERAP1_SIG1,$ERAP1_SIG2,$ERAP1_SIG3\t\tsignal1,signal2 (cond S1),signal3 (cond S1+S2)\tIndependent ERAP1 cis-eQTL signals at 5q15 revealed by stepwise conditional analysis (±500 kb)\tADD\t5e-8"
+} > "$FIG_MANIFEST"
+
+perf_run "$PYTHON" "$CODE_LOCUS" --manifest "$FIG_MANIFEST" --workers "${LOCUS_WORKERS:-1}"
 
 log "[OK] 03 done."
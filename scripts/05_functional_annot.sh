@@ -4,6 +4,7 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/_config.sh"
+source "$SCRIPT_DIR/_perf.sh"
 
 # --------------------------
 # Inputs (env override OK)
@@ -17,7 +18,22 @@ R2TH="${R2TH:-0.8}"            # proxy threshold
 TOPN="${TOPN:-20}"             # top candidates to export
 
 VEP_PY="${VEP_PY:-$CODEDIR/quick_vep_grch37_v2.py}"
+GTF_VEP_PY="${GTF_VEP_PY:-$CODEDIR/gtf_consequence.py}"
 RANK_PY="${RANK_PY:-$CODEDIR/rank_candidates_from_vep37_v2.py}"
+BIM_INDEX_PY="${BIM_INDEX_PY:-$CODEDIR/bim_index.py}"
+LD_PY="${LD_PY:-$CODEDIR/ld_calc.py}"
+LD_STORE_PY="${LD_STORE_PY:-$CODEDIR/ld_store.py}"
+
+# VEP answers are cached per rsID and shared by all labels/sets (and reruns);
+# VEP_OFFLINE=1 annotates from the cache only (no network)
+VEP_CACHE="${VEP_CACHE:-$OUTDIR/vep/vep_cache.sqlite}"
+VEP_OFFLINE="${VEP_OFFLINE:-0}"
+VEP_ARGS=(--cache "$VEP_CACHE")
+[[ "$VEP_OFFLINE" == "1" ]] && VEP_ARGS+=(--offline)
+
+# consequences: rest (Ensembl REST via the cache; falls back to the GTF when
+# REST fails and $GTF exists) or gtf (offline, code/gtf_consequence.py)
+VEP_ENGINE="${VEP_ENGINE:-rest}"
 
 mkdir -p "$OUTDIR"/{credible,proxy,ld,rsids,vep,rank,logs}
 mkdir -p "$TABLEDIR"/functional_candidates
@@ -29,6 +45,15 @@ die(){ echo "[ERR] $*" 1>&2; exit 1; }
 
 need_cmd(){ command -v "$1" >/dev/null 2>&1 || die "missing command: $1"; }
 
+# window --r2/--r: PLINK (default) or in-process NumPy LD; same flags
+window_ld() {
+  if [[ "$LD_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@"
+  else
+    perf_run python3 "$LD_PY" ${LD_STORE_DIR:+--store-dir "$LD_STORE_DIR"} "$@"
+  fi
+}
+
 zcat_auto(){
   if command -v zcat >/dev/null 2>&1; then zcat "$1"; else gzip -cd "$1"; fi
 }
@@ -36,7 +61,7 @@ zcat_auto(){
 get_chr_bp(){
   # prints: chr bp
   local snp="$1"
-  awk -v s="$snp" '$2==s{print $1"\t"$4; exit}' "${BFILE}.bim"
+  perf_run python3 "$BIM_INDEX_PY" lookup "$BFILE" "$snp" --fields chr,bp 2>/dev/null
 }
 
 mk_window(){
@@ -70,34 +95,22 @@ extract_credible_rsids(){
 }
 
 make_proxy_rsids(){
+  # proxies = threshold on the lead's window LD (r2 to every SNP), no extra LD run
   local label="$1"
   local lead="$2"
-
-  local win chr from to
-  win="$(mk_window "$lead")"
-  chr="$(echo -e "$win" | cut -f1)"
-  from="$(echo -e "$win" | cut -f2)"
-  to="$(echo -e "$win" | cut -f3)"
-
-  local pref="$OUTDIR/ld/${label}_proxy_r2${R2TH}"
-  "$PLINK" \
-    --bfile "$BFILE" \
-    --chr "$chr" --from-bp "$from" --to-bp "$to" \
-    --ld-snp "$lead" \
-    --r2 gz --ld-window 99999 --ld-window-kb "$WINKB" --ld-window-r2 "$R2TH" \
-    --out "$pref" >/dev/null
+  local ld_gz="$3"
 
   local rsids="$OUTDIR/rsids/${label}_proxy_r2${R2TH}.rsids.txt"
   {
     echo "$lead"
-    zcat_auto "${pref}.ld.gz" | awk 'NR>1{print $3"\n"$6}'
+    zcat_auto "$ld_gz" | awk -v th="$R2TH" 'NR>1 && $7!="nan" && $7+0>=th+0{print $3"\n"$6}'
   } | sed '/^$/d' | sort -u > "$rsids"
 
   echo "$rsids"
 }
 
 make_ld_window(){
-  # LD (lead vs all SNPs in window): output .ld.gz
+  # LD (lead vs all SNPs in window): prints .ld.gz<TAB>LD store (empty for plink)
   local label="$1"
   local lead="$2"
   local tag="$3"
@@ -109,14 +122,20 @@ make_ld_window(){
   to="$(echo -e "$win" | cut -f3)"
 
   local pref="$OUTDIR/ld/${label}_${tag}"
-  "$PLINK" \
+  window_ld \
     --bfile "$BFILE" \
     --chr "$chr" --from-bp "$from" --to-bp "$to" \
     --ld-snp "$lead" \
     --r2 gz --ld-window 99999 --ld-window-kb "$WINKB" --ld-window-r2 0 \
     --out "$pref" >/dev/null
 
-  echo "${pref}.ld.gz"
+  local store=""
+  if [[ "$LD_ENGINE" != "plink" && -n "$LD_STORE_DIR" ]]; then
+    # already built by window_ld above; the ranker reads the lead's row from it
+    store="$(perf_run python3 "$LD_STORE_PY" build --bfile "$BFILE" \
+      --chr "$chr" --from-bp "$from" --to-bp "$to" --dir "$LD_STORE_DIR")"
+  fi
+  echo -e "${pref}.ld.gz\t${store}"
 }
 
 find_finemap_paths(){
@@ -132,6 +151,22 @@ find_finemap_paths(){
   echo -e "${cred}\t${pip}"
 }
 
+annotate_consequences(){
+  # args: rsids out_tsv log  (same TSV columns from either engine)
+  local rsids="$1" out="$2" log="$3"
+  local offline=(perf_run python3 "$GTF_VEP_PY" --gtf "$GTF" --bfile "$BFILE" --rsids "$rsids" --out "$out")
+
+  if [[ "$VEP_ENGINE" == "gtf" ]]; then
+    "${offline[@]}" >"$log" 2>&1
+    return
+  fi
+  if ! perf_run python3 "$VEP_PY" "${VEP_ARGS[@]}" "$rsids" "$out" >"$log" 2>&1; then
+    [[ -f "$GTF" ]] || die "VEP REST failed (see $log) and no GTF for offline fallback: $GTF"
+    echo "[WARN] VEP REST failed for $(basename "$rsids"); offline GTF annotation instead" 1>&2
+    "${offline[@]}" >>"$log" 2>&1
+  fi
+}
+
 run_one_set(){
   local label="$1" lead="$2" rsids="$3" ld_gz="$4" pip_tsv="$5" out_sub="$6"
 
@@ -139,32 +174,33 @@ run_one_set(){
   local ranked_tsv="$OUTDIR/rank/${label}_${out_sub}.ranked.tsv"
   local top_tsv="$OUTDIR/rank/${label}_${out_sub}.top${TOPN}.tsv"
 
-  python3 "$VEP_PY" "$rsids" "$vep_tsv" >"$OUTDIR/logs/${label}_${out_sub}.vep.log" 2>&1
-
-  python3 "$RANK_PY" \
-    --ld "$ld_gz" \
-    --vep "$vep_tsv" \
-    --lead "$lead" \
-    --pip "$pip_tsv" \
-    --out "$ranked_tsv" \
-    --top "$TOPN" \
-    --top-out "$top_tsv" \
-    >"$OUTDIR/logs/${label}_${out_sub}.rank.log" 2>&1
+  annotate_consequences "$rsids" "$vep_tsv" "$OUTDIR/logs/${label}_${out_sub}.vep.log"
 
-  cp -f "$top_tsv" "$TABLEDIR/functional_candidates/${label}_${out_sub}.top${TOPN}.tsv"
+  # ranked in one process after the loop (see RANK_JOBS)
+  printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\n" \
+    "${label}_${out_sub}" "$lead" "$ld_gz" "$vep_tsv" "$pip_tsv" "$ranked_tsv" "$top_tsv" >> "$RANK_JOBS"
 }
 
 # --------------------------
 # main checks
 # --------------------------
 need_cmd awk; need_cmd sed; need_cmd sort; need_cmd gzip
-[[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+if [[ "$LD_ENGINE" == "plink" ]]; then
+  [[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+fi
+[[ -f "$LD_PY" ]] || die "missing: $LD_PY"
 [[ -f "${BFILE}.bim" ]] || die "BFILE not found: ${BFILE}.bim"
 [[ -f "$SIGNALS_TSV" ]] || die "signals_summary.tsv not found: $SIGNALS_TSV"
 [[ -f "$VEP_PY" ]] || die "missing: $VEP_PY"
+if [[ "$VEP_ENGINE" == "gtf" ]]; then
+  [[ -f "$GTF_VEP_PY" ]] || die "missing: $GTF_VEP_PY"
+  [[ -f "$GTF" ]] || die "GTF not found: $GTF"
+fi
 [[ -f "$RANK_PY" ]] || die "missing: $RANK_PY"
 
 MANIFEST="$OUTDIR/functional_candidates_manifest.tsv"
+RANK_JOBS="$OUTDIR/rank/rank_jobs.tsv"
+printf "label\tlead\tld\tvep\tpip\tout\ttop_out\n" > "$RANK_JOBS"
 echo -e "gene\tsignal_id\tlabel\tlead_snp\tset_type\trsids_path\tpip_path\tcredible_path\tld_gz\ttop_table\toutdir" > "$MANIFEST"
 
 echo "[RUN] functional annotation => $OUTDIR"
@@ -196,20 +232,31 @@ tail -n +2 "$SIGNALS_TSV" | while IFS=$'\t' read -r gene sid lead rest; do
   extract_credible_rsids "$credible" "$rs_cred"
   { echo "$lead"; cat "$rs_cred"; } | sed '/^$/d' | sort -u > "${rs_cred}.tmp" && mv "${rs_cred}.tmp" "$rs_cred"
 
-  ld_cred="$(make_ld_window "$label" "$lead" "credible")"
-  run_one_set "$label" "$lead" "$rs_cred" "$ld_cred" "$pip" "credible"
+  # one window LD per lead serves both candidate sets
+  IFS=$'\t' read -r ld_win ld_rank < <(make_ld_window "$label" "$lead" "window") \
+    || die "window LD failed: $label"
+  ld_rank="${ld_rank:-$ld_win}"
+
+  ld_cred="$ld_win"
+  run_one_set "$label" "$lead" "$rs_cred" "$ld_rank" "$pip" "credible"
   topA="$TABLEDIR/functional_candidates/${label}_credible.top${TOPN}.tsv"
   echo -e "${gene}\t${sid}\t${label}\t${lead}\tcredible\t${rs_cred}\t${pip}\t${credible}\t${ld_cred}\t${topA}\t${OUTDIR}" >> "$MANIFEST"
 
   # ---- B) proxy(r2>=R2TH) 기반 ----
-  rs_proxy="$(make_proxy_rsids "$label" "$lead")"
-  ld_proxy="$(make_ld_window "$label" "$lead" "proxy_r2${R2TH}")"
-  run_one_set "$label" "$lead" "$rs_proxy" "$ld_proxy" "$pip" "proxy_r2${R2TH}"
+  rs_proxy="$(make_proxy_rsids "$label" "$lead" "$ld_win")"
+  ld_proxy="$ld_win"
+  run_one_set "$label" "$lead" "$rs_proxy" "$ld_rank" "$pip" "proxy_r2${R2TH}"
   topB="$TABLEDIR/functional_candidates/${label}_proxy_r2${R2TH}.top${TOPN}.tsv"
   echo -e "${gene}\t${sid}\t${label}\t${lead}\tproxy_r2${R2TH}\t${rs_proxy}\t${pip}\t${credible}\t${ld_proxy}\t${topB}\t${OUTDIR}" >> "$MANIFEST"
 
 done
 
+# rank every (label, set) in one process; LD/PIP shared by both sets are read once
+perf_run python3 "$RANK_PY" --manifest "$RANK_JOBS" --top "$TOPN" >"$OUTDIR/logs/rank.log" 2>&1
+awk -F'\t' 'NR>1{print $1"\t"$7}' "$RANK_JOBS" | while IFS=$'\t' read -r name top_tsv; do
+  cp -f "$top_tsv" "$TABLEDIR/functional_candidates/${name}.top${TOPN}.tsv"
+done
+
 cp -f "$MANIFEST" "$TABLEDIR/functional_candidates_manifest.tsv"
 echo "[OK] done."
 echo "[OK] manifest: $MANIFEST"
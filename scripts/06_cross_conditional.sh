@@ -7,6 +7,7 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
+source "$SCRIPT_DIR/_perf.sh"
 
 # optional project config
 if [[ -f "$SCRIPT_DIR/_config.sh" ]]; then
@@ -30,6 +31,13 @@ SIGNALS_RAW="${SIGNALS_RAW:-$RESULTDIR/03_signal_check_5q15/signals_summary.tsv}
 ERAP1_COND_MODE="${ERAP1_COND_MODE:-sig1}"   # sig1 | all
 
 MAKE_COVAR_EXPR_PY="${MAKE_COVAR_EXPR_PY:-$CODEDIR/make_covar_plus_expr.py}"
+EQTL_ENGINE="${EQTL_ENGINE:-plink}"   # plink | numpy
+EQTL_PY="${EQTL_PY:-$CODEDIR/eqtl_linear.py}"
+BIM_INDEX_PY="${BIM_INDEX_PY:-$CODEDIR/bim_index.py}"
+LD_ENGINE="${LD_ENGINE:-plink}"       # plink | numpy
+LD_PY="${LD_PY:-$CODEDIR/ld_calc.py}"
+COND_GRID_PY="${COND_GRID_PY:-$CODEDIR/cond_grid.py}"
+REUSE_OUTPUTS="${REUSE_OUTPUTS:-1}"   # 0 = redo assoc/LD files that exist (pipeline_dag.py)
 
 OUTDIR="${OUTDIR:-$RESULTDIR/06_cross_conditional}"
 mkdir -p "$OUTDIR"
@@ -37,11 +45,32 @@ mkdir -p "$OUTDIR"
 die(){ echo "[ERR] $*" 1>&2; exit 1; }
 need(){ [[ -e "$1" ]] || die "missing: $1"; }
 
-[[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+if [[ "$EQTL_ENGINE" == "plink" || "$LD_ENGINE" == "plink" ]]; then
+  [[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+fi
 need "${BFILE}.bed"; need "${BFILE}.bim"; need "${BFILE}.fam"
 need "$PHENO"; need "$COVAR"
 need "$SIGNALS_RAW"
 need "$MAKE_COVAR_EXPR_PY"
+need "$EQTL_PY"; need "$LD_PY"; need "$COND_GRID_PY"
+
+# window --linear hide-covar: PLINK (default) or the in-process NumPy engine; same flags
+window_linear() {
+  if [[ "$EQTL_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@" --linear hide-covar --allow-no-sex
+  else
+    perf_run python3 "$EQTL_PY" "$@"
+  fi
+}
+
+# window --r2/--r: PLINK (default) or in-process NumPy LD; same flags
+window_ld() {
+  if [[ "$LD_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@"
+  else
+    perf_run python3 "$LD_PY" ${LD_STORE_DIR:+--store-dir "$LD_STORE_DIR"} "$@"
+  fi
+}
 
 # ---- 0) normalize signals_summary.tsv -> signals_min.tsv (gene/signal_id/lead only) ----
 SIGNALS_MIN="$OUTDIR/signals_min.tsv"
@@ -85,7 +114,7 @@ fi
 # ---- 1) region: centered on ERAP2 lead (same x-range for all panels) ----
 get_chr_bp(){
   local snp="$1"
-  awk -v s="$snp" '$2==s{print $1, $4; exit}' "${BFILE}.bim"
+  perf_run python3 "$BIM_INDEX_PY" lookup "$BFILE" "$snp" --fields chr,bp 2>/dev/null
 }
 
 read -r CHR CENTER_BP < <(get_chr_bp "$ERAP2_LEAD" || true)
@@ -94,19 +123,23 @@ read -r CHR CENTER_BP < <(get_chr_bp "$ERAP2_LEAD" || true)
 FROM=$((CENTER_BP - WIN)); ((FROM<1)) && FROM=1
 TO=$((CENTER_BP + WIN))
 
-# ---- 2) covar+expr files (created once) ----
+# ---- 2) covar+expr files (created once; the numpy grid reads expression from PHENO) ----
 COVAR_E2="$OUTDIR/covar_plus_expr_ERAP2.tsv"
 COVAR_E1="$OUTDIR/covar_plus_expr_ERAP1.tsv"
 COVAR_LN="$OUTDIR/covar_plus_expr_LNPEP.tsv"
 
-python3 "$MAKE_COVAR_EXPR_PY" --covar "$COVAR" --pheno "$PHENO" --gene ERAP2 --out "$COVAR_E2"
-python3 "$MAKE_COVAR_EXPR_PY" --covar "$COVAR" --pheno "$PHENO" --gene ERAP1 --out "$COVAR_E1"
-python3 "$MAKE_COVAR_EXPR_PY" --covar "$COVAR" --pheno "$PHENO" --gene LNPEP --out "$COVAR_LN"
+if [[ "$EQTL_ENGINE" == "plink" ]]; then
+  # one parse of COVAR/PHENO -> covar_plus_expr_<GENE>.tsv for all three
+  perf_run python3 "$MAKE_COVAR_EXPR_PY" --covar "$COVAR" --pheno "$PHENO" \
+    --gene ERAP2 ERAP1 LNPEP --out-dir "$OUTDIR" --out-pattern "covar_plus_expr_{gene}.tsv"
+fi
 
 # ---- 3) ERAP1 condition list (if mode=all) ----
 ERAP1_CONDLIST="$OUTDIR/cond_ERAP1_sig123.list"
+ERAP1_COND="$ERAP1_S1"
 if [[ "$ERAP1_COND_MODE" == "all" ]]; then
   printf "%s\n%s\n%s\n" "$ERAP1_S1" "$ERAP1_S2" "$ERAP1_S3" > "$ERAP1_CONDLIST"
+  ERAP1_COND="$ERAP1_S1,$ERAP1_S2,$ERAP1_S3"
 fi
 
 run_plink(){
@@ -119,17 +152,16 @@ run_plink(){
   local pref="$od/$run_id"
   local assoc="${pref}.assoc.linear"
 
-  if [[ -s "$assoc" ]]; then
+  if [[ "$REUSE_OUTPUTS" == 1 && -s "$assoc" ]]; then
     echo "[SKIP] $outcome $run_id"
     return 0
   fi
 
-  "$PLINK" \
+  window_linear \
     --bfile "$BFILE" \
     --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
     --pheno "$PHENO" --pheno-name "$outcome" \
     "$@" \
-    --linear hide-covar --allow-no-sex \
     --out "$pref" >/dev/null
 
   [[ -s "$assoc" ]] || die "PLINK failed to produce: $assoc"
@@ -146,51 +178,77 @@ emit_run(){
   echo -e "${run_id}\t${outcome}\t${cond_gene}\t${cov_type}\t${assoc}" >> "$RUNS_TSV"
 }
 
+# numpy: runs are queued here and fitted together by cond_grid.py (one base fit,
+# low-rank update per conditioning set); plink: one --linear per run, now
+GRID_SPEC="$OUTDIR/runs_spec.tsv"
+echo -e "run_id\toutcome\tcond_gene\tcov_type\tassoc\tcondition\texpr" > "$GRID_SPEC"
+
+# add_run <outcome> <run_id> <cond_gene> <cov_type> <condition SNPs,> <expr genes,> -- <plink args>
+add_run(){
+  local outcome="$1" run_id="$2" cond_gene="$3" cov_type="$4" condition="$5" expr="$6"
+  shift 7
+  if [[ "$EQTL_ENGINE" == "plink" ]]; then
+    run_plink "$outcome" "$run_id" "$@"
+    emit_run "$run_id" "$outcome" "$cond_gene" "$cov_type"
+  else
+    local assoc="$OUTDIR/$outcome/${run_id}.assoc.linear"
+    echo -e "${run_id}\t${outcome}\t${cond_gene}\t${cov_type}\t${assoc}\t${condition}\t${expr}" >> "$GRID_SPEC"
+  fi
+}
+
 # outcomes
 OUTCOMES=(ERAP2 ERAP1 LNPEP)
 
 for outcome in "${OUTCOMES[@]}"; do
   # baseline
-  run_plink "$outcome" "baseline" --covar "$COVAR" --covar-name $COVAR_NAMES
-  emit_run "baseline" "$outcome" "NA" "baseline"
+  add_run "$outcome" "baseline" "NA" "baseline" "" "" -- --covar "$COVAR" --covar-name $COVAR_NAMES
 
   # cond on ERAP2 SNP
-  run_plink "$outcome" "cond_snp_${ERAP2_LEAD}" --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$ERAP2_LEAD"
-  emit_run "cond_snp_${ERAP2_LEAD}" "$outcome" "ERAP2" "cond_snp"
+  add_run "$outcome" "cond_snp_${ERAP2_LEAD}" "ERAP2" "cond_snp" "$ERAP2_LEAD" "" -- \
+    --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$ERAP2_LEAD"
 
   # cond on ERAP1 SNP (sig1 or sig123)
   if [[ "$ERAP1_COND_MODE" == "all" ]]; then
-    run_plink "$outcome" "cond_snp_${ERAP1_S1}" --covar "$COVAR" --covar-name $COVAR_NAMES --condition-list "$ERAP1_CONDLIST"
+    add_run "$outcome" "cond_snp_${ERAP1_S1}" "ERAP1" "cond_snp" "$ERAP1_COND" "" -- \
+      --covar "$COVAR" --covar-name $COVAR_NAMES --condition-list "$ERAP1_CONDLIST"
   else
-    run_plink "$outcome" "cond_snp_${ERAP1_S1}" --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$ERAP1_S1"
+    add_run "$outcome" "cond_snp_${ERAP1_S1}" "ERAP1" "cond_snp" "$ERAP1_COND" "" -- \
+      --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$ERAP1_S1"
   fi
-  emit_run "cond_snp_${ERAP1_S1}" "$outcome" "ERAP1" "cond_snp"
 
   # cond on LNPEP SNP
-  run_plink "$outcome" "cond_snp_${LNPEP_LEAD}" --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$LNPEP_LEAD"
-  emit_run "cond_snp_${LNPEP_LEAD}" "$outcome" "LNPEP" "cond_snp"
-
-  # covariate: ERAP2 expression
-  run_plink "$outcome" "cov_expr_ERAP2" --covar "$COVAR_E2" --covar-name $COVAR_NAMES expr_ERAP2
-  emit_run "cov_expr_ERAP2" "$outcome" "ERAP2" "cov_expr"
+  add_run "$outcome" "cond_snp_${LNPEP_LEAD}" "LNPEP" "cond_snp" "$LNPEP_LEAD" "" -- \
+    --covar "$COVAR" --covar-name $COVAR_NAMES --condition "$LNPEP_LEAD"
 
-  # covariate: ERAP1 expression
-  run_plink "$outcome" "cov_expr_ERAP1" --covar "$COVAR_E1" --covar-name $COVAR_NAMES expr_ERAP1
-  emit_run "cov_expr_ERAP1" "$outcome" "ERAP1" "cov_expr"
-
-  # covariate: LNPEP expression
-  run_plink "$outcome" "cov_expr_LNPEP" --covar "$COVAR_LN" --covar-name $COVAR_NAMES expr_LNPEP
-  emit_run "cov_expr_LNPEP" "$outcome" "LNPEP" "cov_expr"
+  # covariate: ERAP2 / ERAP1 / LNPEP expression
+  add_run "$outcome" "cov_expr_ERAP2" "ERAP2" "cov_expr" "" "ERAP2" -- \
+    --covar "$COVAR_E2" --covar-name $COVAR_NAMES expr_ERAP2
+  add_run "$outcome" "cov_expr_ERAP1" "ERAP1" "cov_expr" "" "ERAP1" -- \
+    --covar "$COVAR_E1" --covar-name $COVAR_NAMES expr_ERAP1
+  add_run "$outcome" "cov_expr_LNPEP" "LNPEP" "cov_expr" "" "LNPEP" -- \
+    --covar "$COVAR_LN" --covar-name $COVAR_NAMES expr_LNPEP
 
   # covariate: self expression (optional panel)
   case "$outcome" in
-    ERAP2) run_plink "$outcome" "cov_expr_self" --covar "$COVAR_E2" --covar-name $COVAR_NAMES expr_ERAP2 ;;
-    ERAP1) run_plink "$outcome" "cov_expr_self" --covar "$COVAR_E1" --covar-name $COVAR_NAMES expr_ERAP1 ;;
-    LNPEP) run_plink "$outcome" "cov_expr_self" --covar "$COVAR_LN" --covar-name $COVAR_NAMES expr_LNPEP ;;
+    ERAP2) self_covar="$COVAR_E2" ;;
+    ERAP1) self_covar="$COVAR_E1" ;;
+    LNPEP) self_covar="$COVAR_LN" ;;
   esac
-  emit_run "cov_expr_self" "$outcome" "$outcome" "cov_expr_self"
+  add_run "$outcome" "cov_expr_self" "$outcome" "cov_expr_self" "" "$outcome" -- \
+    --covar "$self_covar" --covar-name $COVAR_NAMES "expr_${outcome}"
 done
 
+if [[ "$EQTL_ENGINE" != "plink" ]]; then
+  perf_run python3 "$COND_GRID_PY" \
+    --bfile "$BFILE" \
+    --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
+    --pheno "$PHENO" \
+    --covar "$COVAR" --covar-name $COVAR_NAMES \
+    --runs "$GRID_SPEC" --runs-out "$RUNS_TSV" \
+    $([[ "$REUSE_OUTPUTS" == 1 ]] || echo --force) \
+    || die "cond_grid failed: $GRID_SPEC"
+fi
+
 # ---- 5) LD to ref SNPs (for coloring by column) ----
 WINKB=$((WIN/1000))
 
@@ -198,11 +256,11 @@ make_ld(){
   local tag="$1" ref="$2"
   local outpref="$OUTDIR/ld_to_${tag}"
   local outgz="${outpref}.ld.gz"
-  if [[ -s "$outgz" ]]; then
+  if [[ "$REUSE_OUTPUTS" == 1 && -s "$outgz" ]]; then
     echo "[SKIP] LD $tag"
     return 0
   fi
-  "$PLINK" \
+  window_ld \
     --bfile "$BFILE" \
     --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
     --ld-snp "$ref" \
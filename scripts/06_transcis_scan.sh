@@ -9,6 +9,7 @@ set -euo pipefail
 # ----------------------------
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
+source "$SCRIPT_DIR/_perf.sh"
 
 # ----------------------------
 # configurable inputs (env override OK)
@@ -37,6 +38,23 @@ ERAP1_MODE="${ERAP1_MODE:-sig1}"
 OUTROOT="${OUTROOT:-$ROOT/result/06_transcis_scan}"
 CODEDIR="${CODEDIR:-$ROOT/code}"
 COLLECT_PY="${COLLECT_PY:-$CODEDIR/collect_sig_genes_transcis_v2.py}"
+SCAN_PY="${SCAN_PY:-$CODEDIR/transcis_scan.py}"
+JOBS_PY="${JOBS_PY:-$CODEDIR/transcis_jobs.py}"
+
+# plink: per-chromosome --all-pheno runs + collect_sig_genes_transcis_v2.py
+# numpy: one in-process scan per target (transcis_scan.py); opt-in until it
+#        is checked against the plink + collector path
+SCAN_ENGINE="${SCAN_ENGINE:-plink}"
+
+# plink engine: (target, chr) jobs run concurrently within these budgets
+#   SCAN_CORES / SCAN_THREADS concurrent jobs, each with --threads SCAN_THREADS;
+#   SCAN_MEM_MB (0 = no limit) / SCAN_JOB_MEM_MB caps it further (--memory per job).
+# Completed jobs are recorded in $OUTROOT/plink_jobs.manifest.json; a rerun
+# only repeats jobs that are missing there or whose outputs are incomplete.
+SCAN_CORES="${SCAN_CORES:-$(nproc 2>/dev/null || echo 1)}"
+SCAN_THREADS="${SCAN_THREADS:-1}"
+SCAN_MEM_MB="${SCAN_MEM_MB:-0}"
+SCAN_JOB_MEM_MB="${SCAN_JOB_MEM_MB:-0}"
 
 # which targets to run (space-separated)
 TARGETS_RAW="${TARGETS_RAW:-ERAP2 ERAP1 LNPEP}"
@@ -45,10 +63,12 @@ TARGETS_RAW="${TARGETS_RAW:-ERAP2 ERAP1 LNPEP}"
 die(){ echo "[ERR] $*" 1>&2; exit 1; }
 need(){ [[ -e "$1" ]] || die "missing: $1"; }
 
-[[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+if [[ "$SCAN_ENGINE" == "plink" ]]; then
+  [[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+fi
 need "${BFILE}.bed"; need "${BFILE}.bim"; need "${BFILE}.fam"
 need "$COVAR"
-need "$COLLECT_PY"
+need "$COLLECT_PY"; need "$SCAN_PY"; need "$JOBS_PY"
 [[ -d "$PHENO_DIR" ]] || die "PHENO_DIR not found: $PHENO_DIR"
 [[ -d "$CAND_DIR" ]] || die "CAND_DIR not found: $CAND_DIR"
 
@@ -175,30 +195,15 @@ build_candidates() {
   die "Unknown target: $target"
 }
 
-run_plink_chr() {
-  # args: target chr rsids outprefix log
-  local target="$1" chr="$2" rsids="$3" outprefix="$4" log="$5"
-
-  local phenofile="$PHENO_DIR/$(printf "$PHENO_PATTERN" "$chr")"
-  [[ -f "$phenofile" ]] || die "PHENO not found: $phenofile"
-
-  "$PLINK" \
-    --bfile "$BFILE" \
-    --pheno "$phenofile" \
-    --all-pheno \
-    --extract "$rsids" \
-    --covar "$COVAR" --covar-name $COVAR_NAMES \
-    --linear hide-covar \
-    --allow-no-sex \
-    --out "$outprefix" \
-    >"$log" 2>&1
-}
-
 # ----------------------------
 # main
 # ----------------------------
 IFS=' ' read -r -a TARGETS <<< "$TARGETS_RAW"
 
+JOBS_TSV="$OUTROOT/plink_jobs.tsv"
+PLINK_TARGETS=()
+printf "job_id\ttarget\tchr\tpheno\trsids\toutprefix\tlog\n" > "$JOBS_TSV"
+
 for target in "${TARGETS[@]}"; do
   [[ -n "${target:-}" ]] || continue
   echo "[RUN] trans/cis scan target=$target"
@@ -213,30 +218,55 @@ for target in "${TARGETS[@]}"; do
   build_candidates "$target" "$RSIDS"
   echo "[OK] rsids: $RSIDS (n=$(wc -l < "$RSIDS" | tr -d ' '))"
 
-  # plink per chr
-  for chr in $(seq 1 22); do
-    pref="$ADIR/${target}_cand_chr${chr}"
-    # any assoc already exists?
-    if ls "$ADIR/${target}_cand_chr${chr}".*.assoc.linear >/dev/null 2>&1; then
-      echo "[SKIP] exists: $pref.*.assoc.linear"
-      continue
-    fi
-    echo "  [RUN] chr$chr"
-    run_plink_chr "$target" "$chr" "$RSIDS" "$pref" "$LDIR/${target}_chr${chr}.plink.log"
-  done
-
-  # collect + FDR
   OUT_ALL="$TDIR/${target}_all_genome.tsv"
   OUT_SIG="$TDIR/${target}_sig_genome.tsv"
 
-  python3 "$COLLECT_PY" \
-    --dir "$ADIR" \
-    --p-raw "$P_RAW" \
-    --q-fdr "$Q_FDR" \
-    --out-all "$OUT_ALL" \
-    --out-sig "$OUT_SIG"
+  if [[ "$SCAN_ENGINE" != "plink" ]]; then
+    perf_run python3 "$SCAN_PY" \
+      --bfile "$BFILE" \
+      --extract "$RSIDS" \
+      --pheno-dir "$PHENO_DIR" --pheno-pattern "$PHENO_PATTERN" --chroms 1-22 \
+      --covar "$COVAR" --covar-name $COVAR_NAMES \
+      --p-raw "$P_RAW" \
+      --q-fdr "$Q_FDR" \
+      --out-all "$OUT_ALL" \
+      --out-sig "$OUT_SIG" \
+      2>"$LDIR/${target}_scan.log"
+    echo "[OK] $target => $OUT_SIG"
+    continue
+  fi
 
-  echo "[OK] $target => $OUT_SIG"
+  # plink: queue one job per chr (run below, all targets together)
+  for chr in $(seq 1 22); do
+    phenofile="$PHENO_DIR/$(printf "$PHENO_PATTERN" "$chr")"
+    [[ -f "$phenofile" ]] || die "PHENO not found: $phenofile"
+    printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\n" \
+      "${target}_chr${chr}" "$target" "$chr" "$phenofile" "$RSIDS" \
+      "$ADIR/${target}_cand_chr${chr}" "$LDIR/${target}_chr${chr}.plink.log" >> "$JOBS_TSV"
+  done
+  PLINK_TARGETS+=("$target")
 done
 
+if (( ${#PLINK_TARGETS[@]} )); then
+  perf_run python3 "$JOBS_PY" \
+    --jobs "$JOBS_TSV" \
+    --manifest "$OUTROOT/plink_jobs.manifest.json" \
+    --plink "$PLINK" --bfile "$BFILE" \
+    --covar "$COVAR" --covar-name $COVAR_NAMES \
+    --cores "$SCAN_CORES" --threads-per-job "$SCAN_THREADS" \
+    --mem-mb "$SCAN_MEM_MB" --mem-per-job-mb "$SCAN_JOB_MEM_MB"
+
+  # collect + FDR
+  for target in "${PLINK_TARGETS[@]}"; do
+    TDIR="$OUTROOT/$target"
+    perf_run python3 "$COLLECT_PY" \
+      --dir "$TDIR/assoc_by_chr" \
+      --p-raw "$P_RAW" \
+      --q-fdr "$Q_FDR" \
+      --out-all "$TDIR/${target}_all_genome.tsv" \
+      --out-sig "$TDIR/${target}_sig_genome.tsv"
+    echo "[OK] $target => $TDIR/${target}_sig_genome.tsv"
+  done
+fi
+
 echo "[OK] done: $OUTROOT"
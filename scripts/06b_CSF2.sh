@@ -4,6 +4,7 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/_config.sh"
+source "$SCRIPT_DIR/_perf.sh"
 
 export MPLBACKEND=Agg
 export QT_QPA_PLATFORM=offscreen
@@ -15,12 +16,15 @@ GENE="${GENE:-CSF2}"
 
 CENTER_SNP="${CENTER_SNP:-rs1065407}"   # ERAP1 signal3
 WIN_BP="${WIN_BP:-500000}"              # ±500kb
+REUSE_OUTPUTS="${REUSE_OUTPUTS:-1}"     # 0 = redo the genome-wide assoc if it exists (pipeline_dag.py)
 
 PHENO="${PHENO:-${PHENO5:-$PHENODIR/chr5_GD462.signalGeneQuantRPKM_plink.txt}}"
 PLINK="${PLINK:-$HOME/Software/Plink/plink}"
 
 GW_PY="${GW_PY:-$CODEDIR/manhattan_genomewide.py}"
 LOCUS_PY="${LOCUS_PY:-$CODEDIR/locuszoom_manhattan.py}"
+BIM_INDEX_PY="${BIM_INDEX_PY:-$CODEDIR/bim_index.py}"
+LD_PY="${LD_PY:-$CODEDIR/ld_calc.py}"
 
 OUTDIR="${OUTDIR:-$RESULTDIR/06b_CSF2}"
 mkdir -p "$OUTDIR" "$FIGDIR"
@@ -33,9 +37,18 @@ need "${BFILE}.bed"; need "${BFILE}.bim"; need "${BFILE}.fam"
 need "$PHENO"; need "$COVAR"
 need "$GW_PY"; need "$LOCUS_PY"
 
+# window --r2/--r: PLINK (default) or in-process NumPy LD; same flags
+window_ld() {
+  if [[ "$LD_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@"
+  else
+    perf_run python3 "$LD_PY" ${LD_STORE_DIR:+--store-dir "$LD_STORE_DIR"} "$@"
+  fi
+}
+
 get_chr_bp(){
   local snp="$1"
-  awk -v s="$snp" '$2==s{print $1"\t"$4; exit}' "${BFILE}.bim"
+  perf_run python3 "$BIM_INDEX_PY" lookup "$BFILE" "$snp" --fields chr,bp 2>/dev/null
 }
 
 find_local_lead(){
@@ -63,9 +76,9 @@ find_local_lead(){
 GW_PREF="$OUTDIR/${GENE}_genomewide"
 GW_ASSOC="${GW_PREF}.assoc.linear"
 
-if [[ ! -s "$GW_ASSOC" ]]; then
+if [[ "$REUSE_OUTPUTS" != 1 || ! -s "$GW_ASSOC" ]]; then
   echo "[RUN] PLINK genome-wide: $GENE"
-  "$PLINK" --bfile "$BFILE" \
+  perf_run "$PLINK" --bfile "$BFILE" \
     --pheno "$PHENO" --pheno-name "$GENE" \
     --covar "$COVAR" --covar-name $COVAR_NAMES \
     --linear hide-covar --allow-no-sex \
@@ -76,7 +89,7 @@ fi
 
 GW_FIG="$FIGDIR/Fig_genomewide_${GENE}_manhattan.png"
 echo "[RUN] plot: $GW_FIG"
-python3 "$GW_PY" \
+perf_run python3 "$GW_PY" \
   --assoc "$GW_ASSOC" \
   --out-png "$GW_FIG" \
   --title "Genome-wide eQTL scan for ${GENE} expression" \
@@ -98,7 +111,7 @@ REG_PREF="$OUTDIR/${GENE}_at_5q15_center_${CENTER_SNP}_pm${WIN_BP}"
 REG_ASSOC="${REG_PREF}.assoc.linear"
 
 echo "[RUN] PLINK window baseline: $GENE (center=$CENTER_SNP ±${WIN_BP}bp)"
-"$PLINK" --bfile "$BFILE" \
+perf_run "$PLINK" --bfile "$BFILE" \
   --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
   --pheno "$PHENO" --pheno-name "$GENE" \
   --covar "$COVAR" --covar-name $COVAR_NAMES \
@@ -116,8 +129,8 @@ WINKB=$((WIN_BP/1000))
 LD_PREF="$OUTDIR/${GENE}_pm${WIN_BP}.ld_to_${LEAD}"
 LD_FILE="${LD_PREF}.ld"
 
-echo "[RUN] PLINK LD (lead=$LEAD, window=${WINKB}kb)"
-"$PLINK" --bfile "$BFILE" \
+echo "[RUN] LD (lead=$LEAD, window=${WINKB}kb)"
+window_ld --bfile "$BFILE" \
   --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
   --ld-snp "$LEAD" \
   --r2 --ld-window 99999 --ld-window-kb "$WINKB" --ld-window-r2 0 \
@@ -126,7 +139,7 @@ need "$LD_FILE"
 
 # plot baseline locus (needs --ld)
 REG_FIG="$FIGDIR/Fig_locus_${GENE}_center_${CENTER_SNP}_pm500kb.png"
-python3 "$LOCUS_PY" \
+perf_run python3 "$LOCUS_PY" \
   --assoc "$REG_ASSOC" \
   --ld "$LD_FILE" \
   --lead "$LEAD" \
@@ -146,7 +159,7 @@ REGC_PREF="$OUTDIR/${GENE}_at_5q15_center_${CENTER_SNP}_pm${WIN_BP}_cond_${LEAD}
 REGC_ASSOC="${REGC_PREF}.assoc.linear"
 
 echo "[RUN] PLINK window conditional: $GENE | cond($LEAD)"
-"$PLINK" --bfile "$BFILE" \
+perf_run "$PLINK" --bfile "$BFILE" \
   --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
   --pheno "$PHENO" --pheno-name "$GENE" \
   --covar "$COVAR" --covar-name $COVAR_NAMES \
@@ -155,7 +168,7 @@ echo "[RUN] PLINK window conditional: $GENE | cond($LEAD)"
   --out "$REGC_PREF" >/dev/null
 
 REGC_FIG="$FIGDIR/Fig_locus_${GENE}_center_${CENTER_SNP}_pm500kb_cond_${LEAD}.png"
-python3 "$LOCUS_PY" \
+perf_run python3 "$LOCUS_PY" \
   --assoc "$REGC_ASSOC" \
   --ld "$LD_FILE" \
   --lead "$LEAD" \
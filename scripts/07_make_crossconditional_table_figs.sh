@@ -31,6 +31,7 @@ ERAP1_S3="${ERAP1_S3:-rs1065407}"
 # project paths
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
+source "$SCRIPT_DIR/_perf.sh"
 CODEDIR="${CODEDIR:-$ROOT/code}"
 RESULTDIR="${RESULTDIR:-$ROOT/result}"
 FIGDIR="${FIGDIR:-$ROOT/fig}"
@@ -46,24 +47,56 @@ mkdir -p "$TMPDIR" "$ASSOCDIR" "$LOGDIR" "$FIGDIR" "$TABLEDIR"
 MAKE_COVAR_PLUS_EXPR_PY="${MAKE_COVAR_PLUS_EXPR_PY:-$CODEDIR/make_covar_plus_expr.py}"
 PLOT_R="${PLOT_R:-$CODEDIR/locus_grid_multi.R}"
 SUMMARISE_PY="${SUMMARISE_PY:-$CODEDIR/summarize_cross_conditional_v2.py}"
+EQTL_ENGINE="${EQTL_ENGINE:-plink}"   # plink | numpy
+EQTL_PY="${EQTL_PY:-$CODEDIR/eqtl_linear.py}"
+BIM_INDEX_PY="${BIM_INDEX_PY:-$CODEDIR/bim_index.py}"
+LD_ENGINE="${LD_ENGINE:-plink}"       # plink | numpy
+LD_PY="${LD_PY:-$CODEDIR/ld_calc.py}"
+LD_STORE_PY="${LD_STORE_PY:-$CODEDIR/ld_store.py}"
+LD_STORE_DIR="${LD_STORE_DIR-$RESULTDIR/ld_store}"   # per-window LD stores ("" = off)
+COND_GRID_PY="${COND_GRID_PY:-$CODEDIR/cond_grid.py}"
+REUSE_OUTPUTS="${REUSE_OUTPUTS:-1}"   # 0 = redo assoc/LD files that exist (pipeline_dag.py)
 
 # ----------------------------
 # checks
 # ----------------------------
-[[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+if [[ "$EQTL_ENGINE" == "plink" || "$LD_ENGINE" == "plink" ]]; then
+  [[ -x "$PLINK" ]] || die "PLINK not executable: $PLINK"
+fi
 [[ -f "${BFILE}.bim" ]] || die "missing: ${BFILE}.bim"
 [[ -f "$PHENO5" ]] || die "missing: $PHENO5"
 [[ -f "$COVAR" ]] || die "missing: $COVAR"
 [[ -f "$MAKE_COVAR_PLUS_EXPR_PY" ]] || die "missing: $MAKE_COVAR_PLUS_EXPR_PY"
 [[ -f "$PLOT_R" ]] || die "missing: $PLOT_R"
 [[ -f "$SUMMARISE_PY" ]] || die "missing: $SUMMARISE_PY"
+[[ -f "$EQTL_PY" ]] || die "missing: $EQTL_PY"
+[[ -f "$LD_PY" ]] || die "missing: $LD_PY"
+[[ -f "$COND_GRID_PY" ]] || die "missing: $COND_GRID_PY"
 
 # ----------------------------
 # helpers
 # ----------------------------
+# window --linear hide-covar: PLINK (default) or the in-process NumPy engine; same flags
+window_linear() {
+  if [[ "$EQTL_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@" --linear hide-covar --allow-no-sex
+  else
+    perf_run python3 "$EQTL_PY" "$@"
+  fi
+}
+
+# window --r2/--r: PLINK (default) or in-process NumPy LD; same flags
+window_ld() {
+  if [[ "$LD_ENGINE" == "plink" ]]; then
+    perf_run "$PLINK" "$@"
+  else
+    perf_run python3 "$LD_PY" ${LD_STORE_DIR:+--store-dir "$LD_STORE_DIR"} "$@"
+  fi
+}
+
 get_chr_bp() {
   local snp="$1"
-  awk -v s="$snp" '$2==s{print $1"\t"$4; exit}' "${BFILE}.bim"
+  perf_run python3 "$BIM_INDEX_PY" lookup "$BFILE" "$snp" --fields chr,bp 2>/dev/null
 }
 
 mk_window() {
@@ -91,54 +124,93 @@ get_best_snp() {
   ' "$assoc"
 }
 
+# numpy engine: the plink_window_* helpers only queue their run in GRID_SPEC and
+# run_grid fits the queue in one cond_grid.py process (one base fit on the
+# CENTER_SNP window, low-rank update per conditioning set); plink: run now
+GRID_SPEC="$TMPDIR/grid_spec.tsv"
+GRID_N=0
+echo -e "outcome\trun_id\tassoc\tcondition\texpr" > "$GRID_SPEC"
+
+grid_queue() {
+  local gene="$1" run_id="$2" outprefix="$3" condition="$4" expr="$5"
+  echo -e "${gene}\t${run_id}\t${outprefix}.assoc.linear\t${condition}\t${expr}" >> "$GRID_SPEC"
+}
+
+run_grid() {
+  [[ "$EQTL_ENGINE" == "plink" ]] && return 0
+  (( $(wc -l < "$GRID_SPEC") > 1 )) || return 0
+  GRID_N=$((GRID_N + 1))
+  [[ "$REUSE_OUTPUTS" == 1 ]] || set -- "$@" --force
+  perf_run python3 "$COND_GRID_PY" --bfile "$BFILE" \
+    --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
+    --pheno "$PHENO5" \
+    --covar "$COVAR" --covar-name $COVAR_NAMES \
+    --runs "$GRID_SPEC" "$@" >"$LOGDIR/cond_grid_${GRID_N}.log" 2>&1 \
+    || die "cond_grid failed, see $LOGDIR/cond_grid_${GRID_N}.log"
+  echo -e "outcome\trun_id\tassoc\tcondition\texpr" > "$GRID_SPEC"
+}
+
 plink_window_baseline() {
   local gene="$1" center="$2" outprefix="$3"
+  if [[ "$EQTL_ENGINE" != "plink" ]]; then
+    grid_queue "$gene" baseline "$outprefix" "" ""
+    return 0
+  fi
   local chr from to
   read -r chr from to < <(mk_window "$center")
-  "$PLINK" --bfile "$BFILE" \
+  window_linear --bfile "$BFILE" \
     --chr "$chr" --from-bp "$from" --to-bp "$to" \
     --pheno "$PHENO5" --pheno-name "$gene" \
     --covar "$COVAR" --covar-name $COVAR_NAMES \
-    --linear hide-covar --allow-no-sex \
     --out "$outprefix" >"$LOGDIR/${gene}_baseline.log" 2>&1
 }
 
 plink_window_cond_snp() {
   local gene="$1" center="$2" cond_snp="$3" outprefix="$4"
+  if [[ "$EQTL_ENGINE" != "plink" ]]; then
+    grid_queue "$gene" "cond_${cond_snp}" "$outprefix" "$cond_snp" ""
+    return 0
+  fi
   local chr from to
   read -r chr from to < <(mk_window "$center")
-  "$PLINK" --bfile "$BFILE" \
+  window_linear --bfile "$BFILE" \
     --chr "$chr" --from-bp "$from" --to-bp "$to" \
     --pheno "$PHENO5" --pheno-name "$gene" \
     --covar "$COVAR" --covar-name $COVAR_NAMES \
     --condition "$cond_snp" \
-    --linear hide-covar --allow-no-sex \
     --out "$outprefix" >"$LOGDIR/${gene}_cond_${cond_snp}.log" 2>&1
 }
 
 plink_window_cond_list() {
   local gene="$1" center="$2" cond_list="$3" tag="$4" outprefix="$5"
+  if [[ "$EQTL_ENGINE" != "plink" ]]; then
+    grid_queue "$gene" "cond_${tag}" "$outprefix" "$(awk 'NF{print $1}' "$cond_list" | paste -sd, -)" ""
+    return 0
+  fi
   local chr from to
   read -r chr from to < <(mk_window "$center")
-  "$PLINK" --bfile "$BFILE" \
+  window_linear --bfile "$BFILE" \
     --chr "$chr" --from-bp "$from" --to-bp "$to" \
     --pheno "$PHENO5" --pheno-name "$gene" \
     --covar "$COVAR" --covar-name $COVAR_NAMES \
     --condition-list "$cond_list" \
-    --linear hide-covar --allow-no-sex \
     --out "$outprefix" >"$LOGDIR/${gene}_cond_${tag}.log" 2>&1
 }
 
 plink_window_cond_expr() {
   # IMPORTANT: expr_col must match make_covar_plus_expr.py output = expr_<GENE>
   local gene="$1" center="$2" covar_tsv="$3" expr_col="$4" outprefix="$5"
+  if [[ "$EQTL_ENGINE" != "plink" ]]; then
+    # the grid reads the expression straight from PHENO5 (same samples as covar_tsv)
+    grid_queue "$gene" "condexpr_${expr_col#expr_}" "$outprefix" "" "${expr_col#expr_}"
+    return 0
+  fi
   local chr from to
   read -r chr from to < <(mk_window "$center")
-  "$PLINK" --bfile "$BFILE" \
+  window_linear --bfile "$BFILE" \
     --chr "$chr" --from-bp "$from" --to-bp "$to" \
     --pheno "$PHENO5" --pheno-name "$gene" \
     --covar "$covar_tsv" --covar-name $COVAR_NAMES "$expr_col" \
-    --linear hide-covar --allow-no-sex \
     --out "$outprefix" >"$LOGDIR/${gene}_condexpr_${expr_col}.log" 2>&1
 }
 
@@ -152,15 +224,20 @@ SNPLIST="$TMPDIR/snplist_${CENTER_SNP}_pm${WIN}.snplist"
 LDGZ="$TMPDIR/ld_${CENTER_SNP}_pm${WIN}.ld.gz"
 
 log "make snplist: $SNPLIST"
-awk -v chr="$CHR" -v from="$FROM" -v to="$TO" '$1==chr && $4>=from && $4<=to{print $2}' "${BFILE}.bim" > "$SNPLIST"
+perf_run python3 "$BIM_INDEX_PY" window "$BFILE" "$CHR" "$FROM" "$TO" > "$SNPLIST"
 [[ -s "$SNPLIST" ]] || die "SNPLIST empty: $SNPLIST"
 
-if [[ -s "$LDGZ" ]]; then
+if [[ "$LD_ENGINE" != "plink" && -n "$LD_STORE_DIR" ]]; then
+  # the plots read only their ref SNP rows from the window's LD store
+  LDGZ="$(perf_run python3 "$LD_STORE_PY" build --bfile "$BFILE" \
+    --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" --dir "$LD_STORE_DIR")"
+  log "LD store: $LDGZ"
+elif [[ "$REUSE_OUTPUTS" == 1 && -s "$LDGZ" ]]; then
   log "LD matrix exists: $LDGZ"
 else
   log "make LD matrix: $LDGZ"
   PREF_LD="$TMPDIR/_plink_ld_${CENTER_SNP}_pm${WIN}"
-  "$PLINK" --bfile "$BFILE" \
+  window_ld --bfile "$BFILE" \
     --chr "$CHR" --from-bp "$FROM" --to-bp "$TO" \
     --extract "$SNPLIST" --keep-allele-order \
     --r square gz --out "$PREF_LD" >"$LOGDIR/ld_matrix.log" 2>&1
@@ -175,14 +252,12 @@ COVAR_PLUS_ERAP1="$TMPDIR/covar_plus_ERAP1.tsv"
 COVAR_PLUS_LNPEP="$TMPDIR/covar_plus_LNPEP.tsv"
 COVAR_PLUS_CSF2="$TMPDIR/covar_plus_CSF2.tsv"
 
-log "covar+expr: ERAP2 -> $COVAR_PLUS_ERAP2"
-python3 "$MAKE_COVAR_PLUS_EXPR_PY" "$COVAR" "$PHENO5" ERAP2 "$COVAR_PLUS_ERAP2"
-log "covar+expr: ERAP1 -> $COVAR_PLUS_ERAP1"
-python3 "$MAKE_COVAR_PLUS_EXPR_PY" "$COVAR" "$PHENO5" ERAP1 "$COVAR_PLUS_ERAP1"
-log "covar+expr: LNPEP -> $COVAR_PLUS_LNPEP"
-python3 "$MAKE_COVAR_PLUS_EXPR_PY" "$COVAR" "$PHENO5" LNPEP "$COVAR_PLUS_LNPEP"
-log "covar+expr: CSF2 -> $COVAR_PLUS_CSF2"
-python3 "$MAKE_COVAR_PLUS_EXPR_PY" "$COVAR" "$PHENO5" CSF2 "$COVAR_PLUS_CSF2"
+# one parse of COVAR/PHENO5 for all four (the numpy grid reads expression from PHENO5)
+if [[ "$EQTL_ENGINE" == "plink" ]]; then
+  log "covar+expr: ERAP2 ERAP1 LNPEP CSF2 -> $TMPDIR/covar_plus_<GENE>.tsv"
+  perf_run python3 "$MAKE_COVAR_PLUS_EXPR_PY" --covar "$COVAR" --pheno "$PHENO5" \
+    --gene ERAP2 ERAP1 LNPEP CSF2 --out-dir "$TMPDIR" --out-pattern "covar_plus_{gene}.tsv"
+fi
 
 # expr column names (make_covar_plus_expr.py output)
 EXPR_ERAP2="expr_ERAP2"
@@ -200,13 +275,14 @@ printf "%s\n%s\n%s\n" "$ERAP1_S1" "$ERAP1_S2" "$ERAP1_S3" > "$COND_ERAP1_SIG123"
 # 3) baseline (5q15 window)
 # ----------------------------
 for g in ERAP2 ERAP1 LNPEP CSF2; do
-  if [[ ! -s "$ASSOCDIR/${g}_base.assoc.linear" ]]; then
+  if [[ "$REUSE_OUTPUTS" != 1 || ! -s "$ASSOCDIR/${g}_base.assoc.linear" ]]; then
     log "baseline: $g"
     plink_window_baseline "$g" "$CENTER_SNP" "$ASSOCDIR/${g}_base"
   else
     log "baseline exists: $g"
   fi
 done
+run_grid
 
 # CSF2 lead inside window (for ERAP1-CSF2 pair)
 read -r CSF2_LEAD_WIN CSF2_LEAD_BP < <(get_best_snp "$ASSOCDIR/CSF2_base.assoc.linear")
@@ -272,6 +348,10 @@ plink_window_cond_expr LNPEP "$CENTER_SNP" "$COVAR_PLUS_ERAP1" "$EXPR_ERAP1" "$A
 log "CSF2 | cond on ERAP1 expression"
 plink_window_cond_expr CSF2 "$CENTER_SNP" "$COVAR_PLUS_ERAP1" "$EXPR_ERAP1" "$ASSOCDIR/CSF2_cond_on_ERAP1expr"
 
+# numpy: every SNP- and expression-conditional above, in one process
+[[ "$EQTL_ENGINE" == "plink" ]] || log "cross-conditional grid (cond_grid.py)"
+run_grid --force
+
 # ----------------------------
 # 6) attenuation tables + plots (3x3 + 2x2 x3)
 # ----------------------------
@@ -310,10 +390,10 @@ RUNS_MAIN="$TMPDIR/runs_main.tsv"
 
 OUT_MAIN="$TABLEDIR/crossconditional_ERAP1_ERAP2_LNPEP_attenuation.tsv"
 log "summarise 3x3 => $OUT_MAIN"
-python3 "$SUMMARISE_PY" --signals "$SIG_MAIN" --runs "$RUNS_MAIN" --out "$OUT_MAIN"
+perf_run python3 "$SUMMARISE_PY" --signals "$SIG_MAIN" --runs "$RUNS_MAIN" --out "$OUT_MAIN"
 
 log "plot 3x3: ERAP2/ERAP1/LNPEP"
-( cd "$ASSOCDIR" && Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_3x3_ERAP1_ERAP2_LNPEP.png" \
+( cd "$ASSOCDIR" && perf_run Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_3x3_ERAP1_ERAP2_LNPEP.png" \
     --genes ERAP2,ERAP1,LNPEP \
     --ref-snps ERAP2=$ERAP2_LEAD,ERAP1=$ERAP1_S1,LNPEP=$LNPEP_LEAD \
     --cond-suffix ERAP1=ERAP1sig123 \
@@ -321,7 +401,7 @@ log "plot 3x3: ERAP2/ERAP1/LNPEP"
     --width 18 --height 26 --dpi 300 )
 
 log "plot 2x2: ERAP1/ERAP2"
-( cd "$ASSOCDIR" && Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP1_ERAP2.png" \
+( cd "$ASSOCDIR" && perf_run Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP1_ERAP2.png" \
     --genes ERAP1,ERAP2 \
     --ref-snps ERAP1=$ERAP1_S1,ERAP2=$ERAP2_LEAD \
     --cond-suffix ERAP1=ERAP1sig123 \
@@ -329,7 +409,7 @@ log "plot 2x2: ERAP1/ERAP2"
     --width 12 --height 18 --dpi 300 )
 
 log "plot 2x2: ERAP2/LNPEP"
-( cd "$ASSOCDIR" && Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP2_LNPEP.png" \
+( cd "$ASSOCDIR" && perf_run Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP2_LNPEP.png" \
     --genes ERAP2,LNPEP \
     --ref-snps ERAP2=$ERAP2_LEAD,LNPEP=$LNPEP_LEAD \
     --width 12 --height 18 --dpi 300 )
@@ -357,10 +437,10 @@ RUNS_CSF2="$TMPDIR/runs_ERAP1_CSF2.tsv"
 
 OUT_CSF2="$TABLEDIR/crossconditional_ERAP1_CSF2_attenuation.tsv"
 log "summarise ERAP1-CSF2 => $OUT_CSF2"
-python3 "$SUMMARISE_PY" --signals "$SIG_CSF2" --runs "$RUNS_CSF2" --out "$OUT_CSF2"
+perf_run python3 "$SUMMARISE_PY" --signals "$SIG_CSF2" --runs "$RUNS_CSF2" --out "$OUT_CSF2"
 
 log "plot 2x2: ERAP1/CSF2"
-( cd "$ASSOCDIR" && Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP1_CSF2.png" \
+( cd "$ASSOCDIR" && perf_run Rscript "$PLOT_R" "$LDGZ" "$SNPLIST" "$FIGDIR/Fig_crossconditional_2x2_ERAP1_CSF2.png" \
     --genes ERAP1,CSF2 \
     --ref-snps ERAP1=$ERAP1_S1,CSF2=$CSF2_LEAD_WIN \
     --cond-suffix ERAP1=ERAP1sig123 \
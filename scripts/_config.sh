@@ -16,10 +16,21 @@ mkdir -p "$RESULTDIR" "$FIGDIR" "$TABLEDIR"
 
 # tools / inputs (env override OK)
 PLINK="${PLINK:-$HOME/Software/Plink/plink}"
+# window --linear runs: plink or numpy (code/eqtl_linear.py; opt-in until it
+# is checked against PLINK .assoc.linear fixtures)
+EQTL_ENGINE="${EQTL_ENGINE:-plink}"
+# window LD (--r2/--r square): plink or numpy (code/ld_calc.py; opt-in until
+# it is checked against PLINK .ld fixtures)
+LD_ENGINE="${LD_ENGINE:-plink}"
+# numpy LD reads per-window binary stores (code/ld_store.py) kept here and
+# shared by every step, plot and ranking; LD_STORE_DIR= turns them off
+LD_STORE_DIR="${LD_STORE_DIR-$RESULTDIR/ld_store}"
 
 # adjust these if your project layout differs
 BFILE="${BFILE:-$ROOT/../GenotypeData/GW.E-GEUV-3.EUR.MAF005.HWE1e-06}"
 PHENO5="${PHENO5:-$ROOT/../PhenotypeData/chr5_GD462.signalGeneQuantRPKM_plink.txt}"
+# GRCh37 gene models (offline consequence annotation, TSS distances)
+GTF="${GTF:-$ROOT/../Annotation/Homo_sapiens.GRCh37.75.gtf.gz}"
 
 # default covar output from step01
 COVAR="${COVAR:-$RESULTDIR/01_pca/covar_pca10.tsv}"
@@ -0,0 +1,24 @@
+#!/usr/bin/env bash
+# scripts/_perf.sh (sourced by the step scripts)
+# perf_run CMD ...: run CMD and append its wall/CPU/peak RSS/IO and input/output
+# sizes to the run's ledger (code/perf_ledger.py). One ledger per pipeline run:
+#   $PERF_DIR/$PERF_RUN.jsonl   (PERF_DIR default result/perf, PERF_DIR= turns it off)
+# 00_pipeline.sh sets PERF_RUN once for all steps; a step run on its own gets its own.
+#   python3 code/perf_ledger.py summary <run>
+#   python3 code/perf_ledger.py compare <old_run> <new_run> --max-ratio 1.5
+
+_PERF_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+PERF_PY="${PERF_PY:-$_PERF_ROOT/code/perf_ledger.py}"
+PERF_DIR="${PERF_DIR-$_PERF_ROOT/result/perf}"
+PERF_RUN="${PERF_RUN:-$(date +%Y%m%d_%H%M%S)_$$}"
+PERF_STEP="${PERF_STEP:-$(basename "$0" .sh)}"
+PERF_LEDGER="${PERF_LEDGER-${PERF_DIR:+$PERF_DIR/$PERF_RUN.jsonl}}"
+export PERF_DIR PERF_RUN PERF_STEP PERF_LEDGER
+
+perf_run() {
+  if [[ -z "$PERF_LEDGER" ]]; then
+    "$@"
+  else
+    python3 "$PERF_PY" run --ledger "$PERF_LEDGER" --step "$PERF_STEP" -- "$@"
+  fi
+}